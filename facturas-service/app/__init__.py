@@ -1,4 +1,4 @@
-"""
-Facturas Service Application Package.
-"""
-
+"""
+Facturas Service Application Package.
+"""
+
@@ -1,22 +1,28 @@
-"""
-Database package for facturas service.
-"""
-
-from app.database.connection import (
-    get_db,
-    SessionLocal,
-    Base,
-    engine,
-    test_db_connection,
-    init_db
-)
-
-__all__ = [
-    "get_db",
-    "SessionLocal",
-    "Base",
-    "engine",
-    "test_db_connection",
-    "init_db"
-]
-
+"""
+Database package for facturas service.
+"""
+
+from app.database.connection import (
+    get_db,
+    get_db_ro,
+    get_session_factory_ro,
+    SessionLocal,
+    SessionLocalRO,
+    Base,
+    engine,
+    test_db_connection,
+    init_db
+)
+
+__all__ = [
+    "get_db",
+    "get_db_ro",
+    "get_session_factory_ro",
+    "SessionLocal",
+    "SessionLocalRO",
+    "Base",
+    "engine",
+    "test_db_connection",
+    "init_db"
+]
+
@@ -1,177 +1,460 @@
-"""
-Database connection module with SQLAlchemy engine and session management.
-
-This module implements:
-- Connection pooling with optimization
-- Database existence verification
-- Health checks
-- Dependency injection for FastAPI
-- MySQL/MariaDB specific configuration
-"""
-
-import os
-import logging
-from typing import Generator
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker, Session, declarative_base
-from sqlalchemy.pool import QueuePool
-from sqlalchemy.exc import OperationalError
-
-# Configure logging
-logger = logging.getLogger("uvicorn")
-
-# ============================================
-# DATABASE CONFIGURATION
-# ============================================
-
-# Get DATABASE_URL from environment, with fallback
-# Handle case where docker-compose passes empty string instead of None
-DATABASE_URL = os.getenv("DATABASE_URL") or None
-if not DATABASE_URL:
-    # Fallback: construct from individual environment variables
-    mysql_user = os.getenv("MYSQL_USER", "appuser")
-    mysql_password = os.getenv("MYSQL_PASSWORD", "AppPass123!")
-    mysql_host = os.getenv("MYSQL_HOST", "mysql-db")
-    mysql_port = os.getenv("MYSQL_PORT", "3306")
-    mysql_database = os.getenv("MYSQL_DATABASE", "colombia_green_travel")
-    DATABASE_URL = f"mysql+pymysql://{mysql_user}:{mysql_password}@{mysql_host}:{mysql_port}/{mysql_database}?charset=utf8mb4"
-
-SERVICE_NAME = os.getenv("SERVICE_NAME", "facturas-service")
-
-# ============================================
-# DATABASE ENGINE WITH CONNECTION POOLING
-# ============================================
-
-engine = create_engine(
-    DATABASE_URL,
-    echo=False,  # Set to True for SQL query logging during development
-    poolclass=QueuePool,
-    pool_size=int(os.getenv("DB_POOL_SIZE", "20")),        # Base connections
-    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "40")),  # Additional connections
-    pool_pre_ping=True,                                     # Verify connections before use
-    pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),# Recycle every 30 min
-    pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),  # Connection timeout
-    connect_args={
-        "connect_timeout": 10,
-        "charset": "utf8mb4"
-    }
-)
-
-# ============================================
-# SESSION FACTORY
-# ============================================
-
-SessionLocal = sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=engine,
-    expire_on_commit=False  # Avoid additional queries after commit
-)
-
-# ============================================
-# DECLARATIVE BASE FOR MODELS
-# ============================================
-
-Base = declarative_base()
-
-# ============================================
-# DATABASE UTILITIES
-# ============================================
-
-def ensure_database_exists() -> bool:
-    """
-    Ensure database exists, verify connection.
-    
-    Returns:
-        bool: True if database connection successful
-    """
-    try:
-        # Test connection
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        logger.info("✅ Database connection verified")
-        return True
-        
-    except Exception as e:
-        logger.error(f"❌ Error verifying database connection: {str(e)}")
-        return False
-
-
-def test_db_connection() -> bool:
-    """
-    Test database connection.
-    
-    Returns:
-        bool: True if connection successful
-    """
-    try:
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        logger.info("✅ Database connection test successful")
-        return True
-    except OperationalError as e:
-        logger.error(f"❌ Database connection failed: {str(e)}")
-        return False
-    except Exception as e:
-        logger.error(f"❌ Unexpected error testing connection: {str(e)}")
-        return False
-
-
-def init_db() -> None:
-    """
-    Initialize database tables.
-    Creates all tables defined in SQLAlchemy models.
-    Note: For existing databases, this will only create tables that don't exist.
-    """
-    try:
-        # Import all models here to ensure they're registered
-        from app.models.invoice import Base as ModelBase
-        from app.models.invoice_item import Base as ItemModelBase
-        
-        # Create all tables (only if they don't exist)
-        Base.metadata.create_all(bind=engine)
-        logger.info("✅ Database tables created/verified successfully")
-        
-    except Exception as e:
-        logger.error(f"❌ Error initializing database: {str(e)}")
-        raise
-
-
-# ============================================
-# DEPENDENCY INJECTION
-# ============================================
-
-def get_db() -> Generator[Session, None, None]:
-    """
-    Dependency to get database session.
-    
-    Yields:
-        Session: SQLAlchemy database session
-        
-    Usage:
-        @app.get("/items")
-        def get_items(db: Session = Depends(get_db)):
-            return db.query(Item).all()
-    """
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-# ============================================
-# REDIS CACHE (Disabled for development)
-# ============================================
-# Redis caching has been disabled for this development stage.
-# To enable Redis in the future, uncomment and configure below.
-
-def get_redis_client():
-    """
-    Redis client function (disabled).
-    
-    Returns:
-        None: Redis is disabled for development
-    """
-    return None
-
+"""
+Database connection module with SQLAlchemy engine and session management.
+
+This module implements:
+- Async engine (aiomysql) with connection pooling
+- Database existence verification
+- Health checks
+- Dependency injection for FastAPI
+- MySQL/MariaDB specific configuration
+
+Pool modes:
+- Pooled (default): each worker process keeps its own pool. When
+  DB_POOL_SIZE / DB_MAX_OVERFLOW are not set, the pool is sized from
+  MYSQL_MAX_CONNECTIONS split across GUNICORN_WORKERS (or UVICORN_WORKERS):
+  pool_size = max(5, min(25, max_connections // (workers * 2))) and
+  max_overflow = pool_size, so all workers together stay within the
+  server's max_connections.
+- External pooler (USE_EXTERNAL_POOLER=1): when running behind ProxySQL
+  or a similar pooler, NullPool is used and every session opens/closes
+  its own connection; all DB_POOL_* settings are ignored.
+
+New connections get per-session tuning (isolation level, lock wait
+timeout, sql_mode) from DB_ISOLATION_LEVEL, DB_LOCK_WAIT_TIMEOUT and
+DB_SQL_MODE, and a UTC time_zone.
+
+Read replica: when RO_DATABASE_URL is set, get_db_ro sessions use a
+separate read-only engine (engine_ro); otherwise they share the primary.
+
+Stale connections are handled with TCP keepalive on every MySQL socket
+plus pool_recycle kept below the server's wait_timeout (checked in
+init_db). The per-checkout SELECT 1 probe (pool_pre_ping) is opt-in via
+DB_POOL_PRE_PING=1.
+
+Pool warm-up: at startup, warm_up_pool opens DB_POOL_WARMUP connections
+per pool concurrently, so the first requests don't pay the TCP connect,
+handshake and session SETs.
+"""
+
+import os
+import socket
+import asyncio
+import logging
+from typing import AsyncGenerator
+from sqlalchemy import text, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import NullPool
+from sqlalchemy.exc import OperationalError
+
+# Configure logging
+logger = logging.getLogger("uvicorn")
+
+# ============================================
+# DATABASE CONFIGURATION
+# ============================================
+
+# Get DATABASE_URL from environment, with fallback
+# Handle case where docker-compose passes empty string instead of None
+DATABASE_URL = os.getenv("DATABASE_URL") or None
+if not DATABASE_URL:
+    # Fallback: construct from individual environment variables
+    mysql_user = os.getenv("MYSQL_USER", "appuser")
+    mysql_password = os.getenv("MYSQL_PASSWORD", "AppPass123!")
+    mysql_host = os.getenv("MYSQL_HOST", "mysql-db")
+    mysql_port = os.getenv("MYSQL_PORT", "3306")
+    mysql_database = os.getenv("MYSQL_DATABASE", "colombia_green_travel")
+    DATABASE_URL = f"mysql+aiomysql://{mysql_user}:{mysql_password}@{mysql_host}:{mysql_port}/{mysql_database}?charset=utf8mb4"
+
+def _to_async_url(url: str) -> str:
+    """Switch a MySQL URL to the async aiomysql driver (env files may still say pymysql)."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "mysql" and parsed.get_driver_name() != "aiomysql":
+        return parsed.set(drivername="mysql+aiomysql").render_as_string(hide_password=False)
+    return url
+
+
+DATABASE_URL = _to_async_url(DATABASE_URL)
+
+# Optional read replica for SELECT-only endpoints; unset means reads use the primary
+RO_DATABASE_URL = os.getenv("RO_DATABASE_URL") or None
+if RO_DATABASE_URL:
+    RO_DATABASE_URL = _to_async_url(RO_DATABASE_URL)
+
+SERVICE_NAME = os.getenv("SERVICE_NAME", "facturas-service")
+
+# ============================================
+# ASYNC DATABASE ENGINE WITH CONNECTION POOLING
+# ============================================
+
+# Connection budget shared by all worker processes (Factor VIII: Concurrency)
+WORKERS = int(os.getenv("GUNICORN_WORKERS") or os.getenv("UVICORN_WORKERS") or "1")
+MYSQL_MAX_CONNECTIONS = int(os.getenv("MYSQL_MAX_CONNECTIONS") or "150")
+USE_EXTERNAL_POOLER = os.getenv("USE_EXTERNAL_POOLER") == "1"
+
+# Explicit DB_POOL_SIZE / DB_MAX_OVERFLOW take precedence over the computed size
+POOL_SIZE = int(
+    os.getenv("DB_POOL_SIZE") or max(5, min(25, MYSQL_MAX_CONNECTIONS // (WORKERS * 2)))
+)
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW") or POOL_SIZE)
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# SELECT 1 on every checkout doubles round trips; keepalive + pool_recycle
+# cover dead connections in the common case
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "0") == "1"
+# Connections opened per pool at startup (never more than pool_size; none with NullPool)
+POOL_WARMUP = 0 if USE_EXTERNAL_POOLER else min(POOL_SIZE, int(os.getenv("DB_POOL_WARMUP") or "5"))
+
+# TCP keepalive: first probe after 60s idle, then every 20s, drop after 3 misses
+TCP_KEEPIDLE = 60
+TCP_KEEPINTVL = 20
+TCP_KEEPCNT = 3
+
+# Per-session MySQL/MariaDB tuning applied on every new connection.
+# READ COMMITTED avoids gap locks on INSERT-heavy tables; a short lock wait
+# fails fast instead of holding a pooled connection.
+# The isolation level is interpolated into SQL (SET SESSION TRANSACTION can't
+# take a parameter), so it must be one of the whitelisted keywords: checked
+# here, at import, to fail fast on startup rather than on the first connection.
+DB_ISOLATION_LEVEL = " ".join((os.getenv("DB_ISOLATION_LEVEL") or "READ COMMITTED").upper().split())
+DB_LOCK_WAIT_TIMEOUT = int(os.getenv("DB_LOCK_WAIT_TIMEOUT") or "5")
+DB_SQL_MODE = os.getenv("DB_SQL_MODE") or "STRICT_ALL_TABLES,NO_ENGINE_SUBSTITUTION"
+_ISOLATION_LEVELS = ("READ UNCOMMITTED", "READ COMMITTED", "REPEATABLE READ", "SERIALIZABLE")
+if DB_ISOLATION_LEVEL not in _ISOLATION_LEVELS:
+    raise ValueError(
+        f"Invalid DB_ISOLATION_LEVEL: {DB_ISOLATION_LEVEL!r} (expected one of {', '.join(_ISOLATION_LEVELS)})"
+    )
+
+if USE_EXTERNAL_POOLER:
+    # The external pooler owns connection reuse; don't hold idle sockets here
+    pool_options = {"poolclass": NullPool}
+else:
+    # Async engines use AsyncAdaptedQueuePool by default
+    pool_options = {
+        "pool_size": POOL_SIZE,                                  # Base connections
+        "max_overflow": MAX_OVERFLOW,                            # Additional connections
+        "pool_pre_ping": POOL_PRE_PING,                          # Opt-in checkout probe
+        "pool_recycle": POOL_RECYCLE,                            # Recycle every 30 min
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),    # Connection timeout
+    }
+
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,  # Set to True for SQL query logging during development
+    connect_args={
+        "connect_timeout": 10,
+        "charset": "utf8mb4"
+    },
+    **pool_options
+)
+
+# Read-only engine: a separate pool against the replica when RO_DATABASE_URL
+# is set, otherwise the primary engine itself (no second pool)
+if RO_DATABASE_URL:
+    engine_ro = create_async_engine(
+        RO_DATABASE_URL,
+        echo=False,
+        connect_args={
+            "connect_timeout": 10,
+            "charset": "utf8mb4"
+        },
+        **pool_options
+    )
+else:
+    engine_ro = engine
+
+
+_KEEPALIVE_WARNED = False
+
+
+def _enable_tcp_keepalive(dbapi_connection, connection_record) -> None:
+    """
+    Turn on TCP keepalive for a new MySQL connection.
+    
+    aiomysql has no keepalive/read_timeout options, so the socket is
+    reached through the adapted connection's stream writer (private
+    aiomysql attributes). If a driver change hides it, a warning is
+    logged once: with pool_pre_ping off, nothing else detects dead
+    connections.
+    """
+    global _KEEPALIVE_WARNED
+    writer = getattr(getattr(dbapi_connection, "_connection", None), "_writer", None)
+    sock = writer.get_extra_info("socket") if writer is not None else None
+    if sock is None:
+        if not _KEEPALIVE_WARNED:
+            _KEEPALIVE_WARNED = True
+            logger.warning(
+                "⚠️ TCP keepalive not enabled: MySQL socket not found on the aiomysql "
+                "connection (pool_pre_ping=%s)", POOL_PRE_PING
+            )
+        return
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # TCP_KEEP* constants are platform specific (Linux has all three)
+    for option, value in (
+        ("TCP_KEEPIDLE", TCP_KEEPIDLE),
+        ("TCP_KEEPINTVL", TCP_KEEPINTVL),
+        ("TCP_KEEPCNT", TCP_KEEPCNT),
+    ):
+        if hasattr(socket, option):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+
+def _set_session_variables(dbapi_connection, connection_record) -> None:
+    """
+    Apply per-session tuning to a new MySQL/MariaDB connection.
+    
+    SET SESSION TRANSACTION ISOLATION LEVEL is used instead of the
+    transaction_isolation variable, whose name differs across MySQL
+    and MariaDB versions (tx_isolation on older servers).
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"SET SESSION TRANSACTION ISOLATION LEVEL {DB_ISOLATION_LEVEL}")
+        # time_zone UTC: CURRENT_TIMESTAMP server defaults store UTC like
+        # the previous datetime.utcnow Python defaults
+        cursor.execute(
+            "SET SESSION innodb_lock_wait_timeout = %s, sql_mode = %s, time_zone = '+00:00'",
+            (DB_LOCK_WAIT_TIMEOUT, DB_SQL_MODE)
+        )
+    finally:
+        cursor.close()
+
+
+def _set_read_only(dbapi_connection, connection_record) -> None:
+    """Mark replica sessions read-only so MySQL can skip write bookkeeping."""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("SET SESSION TRANSACTION READ ONLY")
+    finally:
+        cursor.close()
+
+
+for _engine in {engine, engine_ro}:
+    if _engine.dialect.name == "mysql":
+        event.listen(_engine.sync_engine, "connect", _enable_tcp_keepalive)
+        event.listen(_engine.sync_engine, "connect", _set_session_variables)
+if engine_ro is not engine and engine_ro.dialect.name == "mysql":
+    event.listen(engine_ro.sync_engine, "connect", _set_read_only)
+
+# ============================================
+# SESSION FACTORY
+# ============================================
+
+SessionLocal = async_sessionmaker(
+    bind=engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False  # Avoid additional queries after commit
+)
+
+# Sessions for SELECT-only endpoints (replica when configured)
+SessionLocalRO = async_sessionmaker(
+    bind=engine_ro,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+# ============================================
+# DECLARATIVE BASE FOR MODELS
+# ============================================
+
+class Base(DeclarativeBase):
+    """Typed declarative base (SQLAlchemy 2.0 Mapped[...] mappings)."""
+    pass
+
+# ============================================
+# DATABASE UTILITIES
+# ============================================
+
+async def ensure_database_exists() -> bool:
+    """
+    Ensure database exists, verify connection.
+    
+    Returns:
+        bool: True if database connection successful
+    """
+    try:
+        # Test connection
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        logger.info("✅ Database connection verified")
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ Error verifying database connection: {str(e)}")
+        return False
+
+
+async def test_db_connection() -> bool:
+    """
+    Test database connection.
+    
+    Returns:
+        bool: True if connection successful
+    """
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        logger.info("✅ Database connection test successful")
+        return True
+    except OperationalError as e:
+        logger.error(f"❌ Database connection failed: {str(e)}")
+        return False
+    except Exception as e:
+        logger.error(f"❌ Unexpected error testing connection: {str(e)}")
+        return False
+
+
+async def check_wait_timeout() -> None:
+    """
+    Warn when pool_recycle is not safely below MySQL's wait_timeout.
+    
+    Without pool_pre_ping, a pooled connection idle longer than
+    wait_timeout is closed by the server and fails on next use.
+    """
+    if engine.dialect.name != "mysql" or USE_EXTERNAL_POOLER:
+        return
+    async with engine.connect() as conn:
+        result = await conn.execute(text("SHOW VARIABLES LIKE 'wait_timeout'"))
+        row = result.first()
+    if row is None:
+        return
+    wait_timeout = int(row[1])
+    if POOL_RECYCLE >= wait_timeout - 60:
+        logger.warning(
+            f"⚠️ DB_POOL_RECYCLE={POOL_RECYCLE}s is not below MySQL wait_timeout "
+            f"({wait_timeout}s) minus 60s; lower it or set DB_POOL_PRE_PING=1"
+        )
+    else:
+        logger.info(f"✅ pool_recycle={POOL_RECYCLE}s below wait_timeout={wait_timeout}s")
+
+
+async def warm_up_pool() -> None:
+    """
+    Open POOL_WARMUP connections per pool concurrently and return them to it.
+    
+    Checking them out together makes the pool create them in parallel
+    (connect events included); closing them leaves them idle in the pool.
+    """
+    if not POOL_WARMUP:
+        return
+    for pool_engine in {engine, engine_ro}:
+        results = await asyncio.gather(
+            *(pool_engine.connect() for _ in range(POOL_WARMUP)),
+            return_exceptions=True
+        )
+        opened = [conn for conn in results if not isinstance(conn, BaseException)]
+        for conn in opened:
+            await conn.close()
+        if len(opened) < len(results):
+            logger.warning("⚠️ Pool warm-up opened %s/%s connections", len(opened), len(results))
+        else:
+            logger.info("✅ Pool warmed up with %s connections", len(opened))
+
+
+_DB_INITIALIZED = False
+
+
+async def init_db() -> None:
+    """
+    Initialize database tables.
+    Creates all tables defined in SQLAlchemy models.
+    Note: For existing databases, this will only create tables that don't exist.
+    
+    Called once from the application lifespan; later calls in the same
+    process are no-ops, so create_all's per-table probes run only once.
+    """
+    global _DB_INITIALIZED
+    if _DB_INITIALIZED:
+        return
+    
+    try:
+        # Register all models on Base.metadata. The import can't live at module
+        # top (the models import Base from here); after the first call it is a
+        # sys.modules lookup.
+        import app.models  # noqa: F401
+        
+        # Create all tables (only if they don't exist)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        logger.info("✅ Database tables created/verified successfully")
+        
+        await check_wait_timeout()
+        _DB_INITIALIZED = True
+        
+    except Exception as e:
+        logger.error(f"❌ Error initializing database: {str(e)}")
+        raise
+
+
+# ============================================
+# DEPENDENCY INJECTION
+# ============================================
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency to get async database session.
+
+    FastAPI caches dependencies per request, so every Depends(get_db) in one
+    request (route + sub-dependencies) shares this single session; no scoped
+    session registry is needed on top.
+
+    Yields:
+        AsyncSession: SQLAlchemy async database session
+        
+    Usage:
+        @app.get("/items")
+        async def get_items(db: AsyncSession = Depends(get_db)):
+            result = await db.execute(select(Item))
+            return result.scalars().all()
+    """
+    async with SessionLocal() as db:
+        yield db
+
+
+async def get_db_ro() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency to get a read-only async database session.
+    
+    Uses the read replica when RO_DATABASE_URL is set (replica sessions are
+    SET SESSION TRANSACTION READ ONLY), otherwise the primary. Only for
+    endpoints that never write; anything that adds/updates/deletes must
+    use get_db.
+    
+    Yields:
+        AsyncSession: SQLAlchemy async database session
+    """
+    async with SessionLocalRO() as db:
+        yield db
+
+
+def get_session_factory_ro() -> async_sessionmaker[AsyncSession]:
+    """
+    Dependency to get the read-only session factory itself.
+    
+    For StreamingResponse endpoints: FastAPI closes yield dependencies
+    (get_db_ro) before the body is streamed, so the response generator
+    opens and closes its own session from this factory.
+    
+    Returns:
+        async_sessionmaker: SessionLocalRO
+    """
+    return SessionLocalRO
+
+
+# ============================================
+# REDIS CACHE (Disabled for development)
+# ============================================
+# Redis caching has been disabled for this development stage.
+# To enable Redis in the future, uncomment and configure below.
+
+def get_redis_client():
+    """
+    Redis client function (disabled).
+    
+    Returns:
+        None: Redis is disabled for development
+    """
+    return None
+
@@ -1,99 +1,292 @@
-"""
-Optional database migration module.
-
-This module handles schema migrations and updates.
-Use for production environments or complex schema changes.
-
-For simple projects, you can delete this file and use init_db() instead.
-For advanced migrations, consider using Alembic.
-"""
-
-import logging
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-
-logger = logging.getLogger("uvicorn")
-
-
-def run_migrations(db: Session) -> None:
-    """
-    Run database migrations.
-    
-    Args:
-        db: SQLAlchemy session
-        
-    Example migrations:
-        - Add new columns
-        - Create indexes
-        - Update data
-        - Schema modifications
-    """
-    try:
-        logger.info("🔄 Running database migrations...")
-        
-        # Example migration: Add index
-        # db.execute(text("""
-        #     CREATE INDEX IF NOT EXISTS idx_invoice_issue_date 
-        #     ON invoices(issue_date)
-        # """))
-        
-        # Commit migrations
-        db.commit()
-        logger.info("✅ Migrations completed successfully")
-        
-    except Exception as e:
-        db.rollback()
-        logger.error(f"❌ Migration error: {str(e)}")
-        # Don't raise - allow service to start even if migrations fail
-
-
-def get_migration_version(db: Session) -> int:
-    """
-    Get current migration version.
-    
-    Args:
-        db: SQLAlchemy session
-        
-    Returns:
-        int: Current migration version
-    """
-    try:
-        # Create migrations table if not exists
-        db.execute(text("""
-            CREATE TABLE IF NOT EXISTS schema_migrations (
-                version INTEGER PRIMARY KEY,
-                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """))
-        db.commit()
-        
-        # Get latest version
-        result = db.execute(text(
-            "SELECT COALESCE(MAX(version), 0) as version FROM schema_migrations"
-        ))
-        version = result.fetchone()[0]
-        return version
-        
-    except Exception as e:
-        logger.error(f"Error getting migration version: {str(e)}")
-        return 0
-
-
-def set_migration_version(db: Session, version: int) -> None:
-    """
-    Set current migration version.
-    
-    Args:
-        db: SQLAlchemy session
-        version: Migration version to set
-    """
-    try:
-        db.execute(text(
-            "INSERT INTO schema_migrations (version) VALUES (:version)"
-        ), {"version": version})
-        db.commit()
-        logger.info(f"✅ Migration version set to {version}")
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Error setting migration version: {str(e)}")
-
+"""
+Optional database migration module.
+
+This module handles schema migrations and updates.
+Use for production environments or complex schema changes.
+
+For simple projects, you can delete this file and use init_db() instead.
+For advanced migrations, consider using Alembic.
+"""
+
+import logging
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+
+logger = logging.getLogger("uvicorn")
+
+# ============================================
+# MIGRATIONS
+# ============================================
+
+# Version 1: single-column invoice indexes -> composite indexes
+# (the cufe index is made UNIQUE separately, in version 7)
+INVOICE_INDEXES_DROPPED = [
+    "idx_invoice_provider_nit",
+    "idx_invoice_client_nit",
+    "idx_invoice_paid",
+    "idx_invoice_loaded_liquidation",
+]
+INVOICE_INDEXES_CREATED = {
+    "idx_invoice_provider_issue": "CREATE INDEX idx_invoice_provider_issue ON invoices (provider_nit, issue_date)",
+    "idx_invoice_client_issue": "CREATE INDEX idx_invoice_client_issue ON invoices (client_nit, issue_date)",
+    "idx_invoice_paid_issue": "CREATE INDEX idx_invoice_paid_issue ON invoices (paid, issue_date)",
+    "idx_invoice_liq_paid": "CREATE INDEX idx_invoice_liq_paid ON invoices (loaded_in_liquidation, paid, total_amount)",
+}
+
+
+async def _migrate_invoice_indexes(db: AsyncSession) -> None:
+    """
+    Replace the single-column invoice indexes with composite ones.
+    
+    Idempotent: fresh databases already get the new indexes from init_db,
+    so only indexes that are actually present/missing are touched. The
+    new indexes are created before any drop: MySQL DDL auto-commits, so a
+    failure part-way must never leave the table with fewer indexes.
+    """
+    rows = (await db.execute(text("SHOW INDEX FROM invoices"))).mappings().all()
+    existing = {row["Key_name"] for row in rows}
+    
+    for name, ddl in INVOICE_INDEXES_CREATED.items():
+        if name not in existing:
+            await db.execute(text(ddl))
+            logger.info(f"✅ Created index {name}")
+    
+    for name in INVOICE_INDEXES_DROPPED:
+        if name in existing:
+            await db.execute(text(f"DROP INDEX {name} ON invoices"))
+            logger.info(f"🗑️  Dropped index {name}")
+
+
+async def _migrate_invoice_timestamps(db: AsyncSession) -> None:
+    """
+    Move created_at/updated_at defaults from Python to the database.
+    
+    MODIFY is idempotent, so re-running on a fresh table is harmless.
+    """
+    from app.models.invoice import INVOICE_UPDATED_AT_DDL
+    
+    await db.execute(text(
+        "ALTER TABLE invoices MODIFY created_at DATETIME NOT NULL "
+        "DEFAULT CURRENT_TIMESTAMP COMMENT 'Fecha de creación'"
+    ))
+    await db.execute(text(INVOICE_UPDATED_AT_DDL))
+    logger.info("✅ invoices.created_at/updated_at now use server defaults")
+
+
+async def _migrate_invoice_item_total_index(db: AsyncSession) -> None:
+    """
+    Replace idx_invoice_item_invoice_id with the covering (invoice_id, total_amount) index.
+    
+    The new index is created first: MySQL refuses to drop the only index
+    backing the invoice_id foreign key.
+    """
+    rows = (await db.execute(text("SHOW INDEX FROM invoice_items"))).mappings().all()
+    existing = {row["Key_name"] for row in rows}
+    
+    if "idx_invoice_item_invoice_total" not in existing:
+        await db.execute(text(
+            "CREATE INDEX idx_invoice_item_invoice_total ON invoice_items (invoice_id, total_amount)"
+        ))
+        logger.info("✅ Created index idx_invoice_item_invoice_total")
+    if "idx_invoice_item_invoice_id" in existing:
+        await db.execute(text("DROP INDEX idx_invoice_item_invoice_id ON invoice_items"))
+        logger.info("🗑️  Dropped index idx_invoice_item_invoice_id")
+
+
+async def _migrate_invoice_item_checks(db: AsyncSession) -> None:
+    """
+    Add the invoice_items CHECK constraints (quantity, unit_price, tax_rate bounds).
+    
+    Enforced from MySQL 8.0.16; fails (and is retried on the next start)
+    if existing rows break a bound.
+    """
+    from app.models.invoice_item import INVOICE_ITEM_CHECKS
+    
+    rows = await db.execute(text(
+        "SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'invoice_items' "
+        "AND CONSTRAINT_TYPE = 'CHECK'"
+    ))
+    existing = set(rows.scalars())
+    
+    for name, condition in INVOICE_ITEM_CHECKS.items():
+        if name not in existing:
+            await db.execute(text(f"ALTER TABLE invoice_items ADD CONSTRAINT {name} CHECK ({condition})"))
+            logger.info(f"✅ Created check constraint {name}")
+
+
+async def _migrate_invoice_liquidation_index(db: AsyncSession) -> None:
+    """Add (loaded_in_liquidation, issue_date) for the list filtered by liquidation status."""
+    rows = (await db.execute(text("SHOW INDEX FROM invoices"))).mappings().all()
+    if "idx_invoice_liq_issue" not in {row["Key_name"] for row in rows}:
+        await db.execute(text(
+            "CREATE INDEX idx_invoice_liq_issue ON invoices (loaded_in_liquidation, issue_date)"
+        ))
+        logger.info("✅ Created index idx_invoice_liq_issue")
+
+
+async def _migrate_invoice_search_index(db: AsyncSession) -> None:
+    """
+    Add the FULLTEXT index behind the invoice list search.
+    
+    The first FULLTEXT index on an InnoDB table rebuilds it (hidden
+    FTS_DOC_ID column), so this can take a while on a large table.
+    """
+    rows = (await db.execute(text("SHOW INDEX FROM invoices"))).mappings().all()
+    if "idx_invoice_search" not in {row["Key_name"] for row in rows}:
+        await db.execute(text(
+            "CREATE FULLTEXT INDEX idx_invoice_search ON invoices (invoice_number, provider_name, client_name)"
+        ))
+        logger.info("✅ Created index idx_invoice_search")
+
+
+async def _migrate_invoice_cufe_unique(db: AsyncSession) -> None:
+    """
+    Make idx_invoice_cufe UNIQUE.
+    
+    Checks for duplicate cufes first and fails with the offending values
+    (retried on the next start) without touching any index. The swap is
+    one ALTER TABLE, so the old index stays if the new one can't be built.
+    """
+    rows = (await db.execute(text("SHOW INDEX FROM invoices"))).mappings().all()
+    existing = {row["Key_name"]: row["Non_unique"] for row in rows}
+    if existing.get("idx_invoice_cufe") == 0:
+        return
+    
+    duplicates = (await db.execute(text(
+        "SELECT cufe FROM invoices GROUP BY cufe HAVING COUNT(*) > 1 LIMIT 10"
+    ))).scalars().all()
+    if duplicates:
+        # An earlier version of migration 1 could have dropped the index
+        # before failing: keep cufe lookups indexed meanwhile
+        if "idx_invoice_cufe" not in existing:
+            await db.execute(text("CREATE INDEX idx_invoice_cufe ON invoices (cufe)"))
+        raise RuntimeError(
+            f"idx_invoice_cufe left non-unique: duplicate cufe values {duplicates}; "
+            "resolve them and restart to apply the migration"
+        )
+    
+    if "idx_invoice_cufe" in existing:
+        await db.execute(text(
+            "ALTER TABLE invoices DROP INDEX idx_invoice_cufe, ADD UNIQUE INDEX idx_invoice_cufe (cufe)"
+        ))
+    else:
+        await db.execute(text("CREATE UNIQUE INDEX idx_invoice_cufe ON invoices (cufe)"))
+    logger.info("✅ idx_invoice_cufe is now UNIQUE")
+
+
+async def _migrate_invoice_updated_at_precision(db: AsyncSession) -> None:
+    """
+    Store invoices.updated_at with microseconds (DATETIME(6)).
+    
+    updated_at is the ETag source of GET /invoices/{id}; at second precision
+    two writes within the same second left the ETag unchanged and a client
+    could get a 304 for a stale copy.
+    """
+    from app.models.invoice import INVOICE_UPDATED_AT_DDL
+    
+    await db.execute(text(INVOICE_UPDATED_AT_DDL))
+    logger.info("✅ invoices.updated_at now stores microseconds")
+
+
+MIGRATIONS = [
+    (1, _migrate_invoice_indexes),
+    (2, _migrate_invoice_timestamps),
+    (3, _migrate_invoice_item_total_index),
+    (4, _migrate_invoice_item_checks),
+    (5, _migrate_invoice_liquidation_index),
+    (6, _migrate_invoice_search_index),
+    (7, _migrate_invoice_cufe_unique),
+    (8, _migrate_invoice_updated_at_precision),
+]
+
+
+async def run_migrations(db: AsyncSession) -> None:
+    """
+    Run database migrations.
+    
+    Args:
+        db: SQLAlchemy async session
+        
+    Example migrations:
+        - Add new columns
+        - Create indexes
+        - Update data
+        - Schema modifications
+    """
+    try:
+        logger.info("🔄 Running database migrations...")
+        
+        # Migrations use MySQL-specific DDL (SHOW INDEX, DROP INDEX ... ON)
+        if db.bind.dialect.name != "mysql":
+            logger.info("ℹ️  Skipping migrations (non-MySQL database)")
+            return
+        
+        current_version = await get_migration_version(db)
+        for version, migration in MIGRATIONS:
+            if version <= current_version:
+                continue
+            logger.info(f"🔄 Applying migration {version}: {migration.__name__}")
+            await migration(db)
+            await set_migration_version(db, version)
+        
+        # Commit migrations
+        await db.commit()
+        logger.info("✅ Migrations completed successfully")
+        
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"❌ Migration error: {str(e)}")
+        # Don't raise - allow service to start even if migrations fail
+
+
+async def get_migration_version(db: AsyncSession) -> int:
+    """
+    Get current migration version.
+    
+    Args:
+        db: SQLAlchemy async session
+        
+    Returns:
+        int: Current migration version
+    """
+    try:
+        # Create migrations table if not exists
+        await db.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        await db.commit()
+        
+        # Get latest version
+        result = await db.execute(text(
+            "SELECT COALESCE(MAX(version), 0) as version FROM schema_migrations"
+        ))
+        version = result.fetchone()[0]
+        return version
+        
+    except Exception as e:
+        logger.error(f"Error getting migration version: {str(e)}")
+        return 0
+
+
+async def set_migration_version(db: AsyncSession, version: int) -> None:
+    """
+    Set current migration version.
+    
+    Args:
+        db: SQLAlchemy async session
+        version: Migration version to set
+    """
+    try:
+        await db.execute(text(
+            "INSERT INTO schema_migrations (version) VALUES (:version)"
+        ), {"version": version})
+        await db.commit()
+        logger.info(f"✅ Migration version set to {version}")
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error setting migration version: {str(e)}")
+
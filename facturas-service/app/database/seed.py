@@ -1,84 +1,115 @@
-"""
-Optional database seeding module.
-
-This module populates the database with initial or test data.
-Useful for:
-- Development environments
-- Testing
-- Demo data
-- Initial configuration
-
-Delete this file if not needed.
-"""
-
-import logging
-from sqlalchemy.orm import Session
-
-logger = logging.getLogger("uvicorn")
-
-
-def run_seeds(db: Session) -> None:
-    """
-    Run database seeds.
-    
-    Args:
-        db: SQLAlchemy session
-    """
-    try:
-        logger.info("🌱 Running database seeds...")
-        
-        # Check if data already exists
-        from app.models.invoice import Invoice
-        existing_count = db.query(Invoice).count()
-        if existing_count > 0:
-            logger.info(f"ℹ️  Database already seeded ({existing_count} invoices exist)")
-            return
-        
-        # Add seed data if needed
-        # Example:
-        # sample_data = [
-        #     Invoice(
-        #         invoice_number="FAC-001",
-        #         cufe="TEST123",
-        #         provider_name="Test Provider",
-        #         provider_nit="900123456-7",
-        #         client_name="Test Client",
-        #         client_nit="800123456-7",
-        #         total_amount=100000.00,
-        #         paid=False
-        #     ),
-        # ]
-        # db.add_all(sample_data)
-        # db.commit()
-        # logger.info(f"✅ Seeded {len(sample_data)} invoice records")
-        
-        logger.info("✅ Seeding completed (no seed data configured)")
-        
-    except Exception as e:
-        db.rollback()
-        logger.error(f"❌ Seeding error: {str(e)}")
-        # Don't raise - allow service to start even if seeding fails
-
-
-def clear_seeds(db: Session) -> None:
-    """
-    Clear all seeded data (for testing).
-    
-    Args:
-        db: SQLAlchemy session
-    """
-    try:
-        logger.warning("🗑️  Clearing all data...")
-        
-        from app.models.invoice import Invoice
-        # Delete all invoices (use with caution!)
-        # db.query(Invoice).delete()
-        # db.commit()
-        
-        logger.info("✅ All data cleared")
-        
-    except Exception as e:
-        db.rollback()
-        logger.error(f"❌ Error clearing data: {str(e)}")
-        raise
-
+"""
+Optional database seeding module.
+
+This module populates the database with initial or test data.
+Useful for:
+- Development environments
+- Testing
+- Demo data
+- Initial configuration
+
+Delete this file if not needed.
+"""
+
+import logging
+from typing import Any, Dict, List
+from sqlalchemy import select, func, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger("uvicorn")
+
+# Rows per multi-row INSERT; keeps each statement under max_allowed_packet
+SEED_BATCH_SIZE = 1000
+
+
+async def bulk_insert(db: AsyncSession, model, rows: List[Dict[str, Any]], batch_size: int = SEED_BATCH_SIZE) -> int:
+    """
+    Insert plain-dict rows with multi-row INSERT ... VALUES statements.
+    
+    Unlike db.add_all(), no ORM objects are created and flushed one by one;
+    each batch is sent as a single statement.
+    
+    Args:
+        db: SQLAlchemy async session
+        model: Mapped class (e.g. Invoice, InvoiceItem)
+        rows: Column values for each row
+        batch_size: Rows per INSERT statement
+        
+    Returns:
+        int: Number of rows inserted (caller commits)
+    """
+    for start in range(0, len(rows), batch_size):
+        await db.execute(insert(model), rows[start:start + batch_size])
+    return len(rows)
+
+
+async def run_seeds(db: AsyncSession) -> None:
+    """
+    Run database seeds.
+    
+    Args:
+        db: SQLAlchemy async session
+    """
+    try:
+        logger.info("🌱 Running database seeds...")
+        
+        # Check if data already exists (first-row probe, no COUNT(*) scan)
+        from app.models.invoice import Invoice
+        exists_row = (await db.execute(select(Invoice.id).limit(1))).first()
+        if exists_row is not None:
+            if logger.isEnabledFor(logging.DEBUG):
+                existing_count = (await db.execute(select(func.count()).select_from(Invoice))).scalar_one()
+                logger.debug(f"ℹ️  Database already seeded ({existing_count} invoices exist)")
+            else:
+                logger.info("ℹ️  Database already seeded")
+            return
+        
+        # Add seed data if needed (plain dicts + bulk_insert, not db.add_all)
+        # Example:
+        # sample_data = [
+        #     {
+        #         "invoice_number": "FAC-001",
+        #         "cufe": "TEST123",
+        #         "provider_name": "Test Provider",
+        #         "provider_nit": "900123456-7",
+        #         "client_name": "Test Client",
+        #         "client_nit": "800123456-7",
+        #         "issue_date": datetime(2024, 1, 15, 10, 30),
+        #         "total_amount": Decimal("100000.00"),
+        #         "paid": False
+        #     },
+        # ]
+        # inserted = await bulk_insert(db, Invoice, sample_data)
+        # await db.commit()
+        # logger.info(f"✅ Seeded {inserted} invoice records")
+        
+        logger.info("✅ Seeding completed (no seed data configured)")
+        
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"❌ Seeding error: {str(e)}")
+        # Don't raise - allow service to start even if seeding fails
+
+
+async def clear_seeds(db: AsyncSession) -> None:
+    """
+    Clear all seeded data (for testing).
+    
+    Args:
+        db: SQLAlchemy async session
+    """
+    try:
+        logger.warning("🗑️  Clearing all data...")
+        
+        from app.models.invoice import Invoice
+        # Delete all invoices (use with caution!)
+        # await db.execute(delete(Invoice))
+        # await db.commit()
+        
+        logger.info("✅ All data cleared")
+        
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"❌ Error clearing data: {str(e)}")
+        raise
+
@@ -1,36 +1,54 @@
-"""
-Models package for facturas service.
-"""
-
-from app.models.invoice import (
-    Invoice,
-    InvoiceCreateRequest,
-    InvoiceUpdateRequest,
-    InvoiceResponse,
-    InvoiceListResponse,
-    InvoiceStatsResponse,
-    InvoiceCreateWithItemsRequest
-)
-from app.models.invoice_item import (
-    InvoiceItem,
-    InvoiceItemCreateRequest,
-    InvoiceItemUpdateRequest,
-    InvoiceItemResponse,
-    InvoiceItemListResponse
-)
-
-__all__ = [
-    "Invoice",
-    "InvoiceCreateRequest",
-    "InvoiceUpdateRequest",
-    "InvoiceResponse",
-    "InvoiceListResponse",
-    "InvoiceStatsResponse",
-    "InvoiceCreateWithItemsRequest",
-    "InvoiceItem",
-    "InvoiceItemCreateRequest",
-    "InvoiceItemUpdateRequest",
-    "InvoiceItemResponse",
-    "InvoiceItemListResponse"
-]
-
+"""
+Models package for facturas service.
+"""
+
+from app.models.invoice import (
+    Invoice,
+    InvoiceCreateRequest,
+    InvoiceUpdateRequest,
+    InvoiceResponse,
+    InvoiceListResponse,
+    InvoiceStatsResponse,
+    InvoiceCreateWithItemsRequest,
+    InvoiceListQuery,
+    invoice_response_from_row,
+    invoice_responses_from_orm
+)
+from app.models.invoice_item import (
+    InvoiceItem,
+    InvoiceItemCreateRequest,
+    InvoiceItemBatchCreateRequest,
+    InvoiceItemBatchDeleteRequest,
+    InvoiceItemUpdateRequest,
+    InvoiceItemResponse,
+    InvoiceItemListResponse,
+    InvoiceItemBatchDeleteResponse,
+    item_response_from_row,
+    item_responses_from_rows,
+    ITEM_RESPONSE_COLUMNS
+)
+
+__all__ = [
+    "Invoice",
+    "InvoiceCreateRequest",
+    "InvoiceUpdateRequest",
+    "InvoiceResponse",
+    "InvoiceListResponse",
+    "InvoiceStatsResponse",
+    "InvoiceCreateWithItemsRequest",
+    "InvoiceListQuery",
+    "invoice_response_from_row",
+    "invoice_responses_from_orm",
+    "InvoiceItem",
+    "InvoiceItemCreateRequest",
+    "InvoiceItemBatchCreateRequest",
+    "InvoiceItemBatchDeleteRequest",
+    "InvoiceItemUpdateRequest",
+    "InvoiceItemResponse",
+    "InvoiceItemListResponse",
+    "InvoiceItemBatchDeleteResponse",
+    "item_response_from_row",
+    "item_responses_from_rows",
+    "ITEM_RESPONSE_COLUMNS"
+]
+
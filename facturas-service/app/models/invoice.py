@@ -1,353 +1,416 @@
-"""
-Invoice model demonstrating best practices for SQLAlchemy + Pydantic models.
-
-This module shows:
-- SQLAlchemy ORM models with proper types and indexes
-- Pydantic models for request/response validation
-- Model configuration
-- Relationship with InvoiceItem
-"""
-
-from sqlalchemy import Column, BigInteger, String, Text, DateTime, Date, Numeric, Boolean, Index
-from sqlalchemy.orm import relationship
-from datetime import datetime, date
-from pydantic import BaseModel, Field, EmailStr, ConfigDict
-from typing import Optional, List
-from decimal import Decimal
-
-# Import base from database connection
-from app.database.connection import Base
-
-
-# ============================================
-# SQLAlchemy ORM MODEL
-# ============================================
-
-class Invoice(Base):
-    """
-    Invoice entity model.
-    
-    Maps to the invoices table (adapted from PostgreSQL to MySQL).
-    """
-    __tablename__ = "invoices"
-
-    # Primary key
-    id = Column(BigInteger, primary_key=True, autoincrement=True, nullable=False)
-    
-    # Invoice identification
-    invoice_number = Column(String(255), nullable=False, comment="Número de factura")
-    cufe = Column(String(255), nullable=False, comment="CUFE (Código Único de Factura Electrónica)")
-    
-    # Provider information
-    provider_name = Column(String(255), nullable=False, comment="Nombre del proveedor")
-    provider_nit = Column(String(50), nullable=False, comment="NIT del proveedor")
-    
-    # Client information
-    client_name = Column(String(255), nullable=False, comment="Nombre del cliente")
-    client_nit = Column(String(50), nullable=False, comment="NIT del cliente")
-    client_address = Column(Text, nullable=True, comment="Dirección del cliente")
-    client_email = Column(String(255), nullable=True, comment="Email del cliente")
-    
-    # Dates
-    issue_date = Column(DateTime, nullable=False, comment="Fecha de emisión")
-    authorization_date = Column(DateTime, nullable=True, comment="Fecha de autorización")
-    arrival_date = Column(Date, nullable=True, comment="Fecha de llegada")
-    departure_date = Column(Date, nullable=True, comment="Fecha de salida")
-    
-    # Additional information
-    guest_name = Column(String(255), nullable=True, comment="Nombre del huésped")
-    cashier_id = Column(String(100), nullable=True, comment="ID del cajero")
-    reservation_number = Column(String(100), nullable=True, comment="Número de reserva")
-    
-    # Financial information
-    total_amount = Column(Numeric(19, 2), nullable=False, comment="Monto total")
-    payment_method = Column(String(100), nullable=True, comment="Método de pago")
-    payment_terms = Column(Text, nullable=True, comment="Términos de pago")
-    bank_account = Column(String(100), nullable=True, comment="Cuenta bancaria")
-    
-    # Additional info
-    additional_info = Column(Text, nullable=True, comment="Información adicional")
-    
-    # Status flags
-    loaded_in_liquidation = Column(Boolean, nullable=False, default=False, comment="Cargado en liquidación")
-    paid = Column(Boolean, nullable=False, default=False, comment="Pagado")
-    
-    # Audit fields
-    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, comment="Fecha de creación")
-    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, comment="Fecha de actualización")
-    reviewed_by = Column(String(255), nullable=True, comment="Revisado por")
-    
-    # Relationship with invoice items
-    items = relationship("InvoiceItem", back_populates="invoice", cascade="all, delete-orphan")
-    
-    # Database indexes for performance
-    __table_args__ = (
-        Index('idx_invoice_number', 'invoice_number'),
-        Index('idx_invoice_cufe', 'cufe'),
-        Index('idx_invoice_provider_nit', 'provider_nit'),
-        Index('idx_invoice_client_nit', 'client_nit'),
-        Index('idx_invoice_issue_date', 'issue_date'),
-        Index('idx_invoice_paid', 'paid'),
-        Index('idx_invoice_loaded_liquidation', 'loaded_in_liquidation'),
-        Index('idx_invoice_reservation', 'reservation_number'),
-        {'comment': 'Tabla de facturas'}
-    )
-
-    def __repr__(self):
-        return f"<Invoice(id={self.id}, invoice_number='{self.invoice_number}', total_amount={self.total_amount})>"
-
-
-# ============================================
-# PYDANTIC REQUEST MODELS
-# ============================================
-
-class InvoiceCreateRequest(BaseModel):
-    """Request model for creating an invoice (without items)."""
-    
-    invoice_number: str = Field(..., max_length=255, description="Número de factura")
-    cufe: str = Field(..., max_length=255, description="CUFE")
-    provider_name: str = Field(..., max_length=255, description="Nombre del proveedor")
-    provider_nit: str = Field(..., max_length=50, description="NIT del proveedor")
-    client_name: str = Field(..., max_length=255, description="Nombre del cliente")
-    client_nit: str = Field(..., max_length=50, description="NIT del cliente")
-    client_address: Optional[str] = Field(None, description="Dirección del cliente")
-    client_email: Optional[EmailStr] = Field(None, description="Email del cliente")
-    issue_date: datetime = Field(..., description="Fecha de emisión")
-    authorization_date: Optional[datetime] = Field(None, description="Fecha de autorización")
-    guest_name: Optional[str] = Field(None, max_length=255, description="Nombre del huésped")
-    cashier_id: Optional[str] = Field(None, max_length=100, description="ID del cajero")
-    arrival_date: Optional[date] = Field(None, description="Fecha de llegada")
-    departure_date: Optional[date] = Field(None, description="Fecha de salida")
-    reservation_number: Optional[str] = Field(None, max_length=100, description="Número de reserva")
-    total_amount: Decimal = Field(..., ge=0, description="Monto total")
-    payment_method: Optional[str] = Field(None, max_length=100, description="Método de pago")
-    payment_terms: Optional[str] = Field(None, description="Términos de pago")
-    bank_account: Optional[str] = Field(None, max_length=100, description="Cuenta bancaria")
-    additional_info: Optional[str] = Field(None, description="Información adicional")
-    loaded_in_liquidation: bool = Field(False, description="Cargado en liquidación")
-    paid: bool = Field(False, description="Pagado")
-    reviewed_by: Optional[str] = Field(None, max_length=255, description="Revisado por")
-
-    model_config = ConfigDict(
-        json_schema_extra={
-            "example": {
-                "invoice_number": "FAC-001",
-                "cufe": "CUFE123456789",
-                "provider_name": "Hotel Ejemplo",
-                "provider_nit": "900123456-7",
-                "client_name": "Cliente Ejemplo",
-                "client_nit": "800123456-7",
-                "client_address": "Calle 123 #45-67",
-                "client_email": "cliente@ejemplo.com",
-                "issue_date": "2025-01-15T10:00:00Z",
-                "total_amount": 500000.00,
-                "paid": False
-            }
-        }
-    )
-
-
-class InvoiceItemCreateNested(BaseModel):
-    """Nested model for creating invoice items within invoice creation."""
-    description: str = Field(..., description="Descripción del item")
-    unit: Optional[str] = Field(None, max_length=50, description="Unidad")
-    quantity: Optional[Decimal] = Field(None, ge=0, description="Cantidad")
-    unit_price: Optional[Decimal] = Field(None, ge=0, description="Precio unitario")
-    subtotal: Optional[Decimal] = Field(None, ge=0, description="Subtotal")
-    tax_rate: Optional[Decimal] = Field(None, ge=0, le=100, description="Tasa de impuesto (%)")
-    tax_amount: Optional[Decimal] = Field(None, ge=0, description="Monto de impuesto")
-    total_amount: Decimal = Field(..., ge=0, description="Monto total del item")
-
-
-class InvoiceCreateWithItemsRequest(BaseModel):
-    """Request model for creating an invoice with nested items."""
-    
-    invoice_number: str = Field(..., max_length=255, description="Número de factura")
-    cufe: str = Field(..., max_length=255, description="CUFE")
-    provider_name: str = Field(..., max_length=255, description="Nombre del proveedor")
-    provider_nit: str = Field(..., max_length=50, description="NIT del proveedor")
-    client_name: str = Field(..., max_length=255, description="Nombre del cliente")
-    client_nit: str = Field(..., max_length=50, description="NIT del cliente")
-    client_address: Optional[str] = Field(None, description="Dirección del cliente")
-    client_email: Optional[EmailStr] = Field(None, description="Email del cliente")
-    issue_date: datetime = Field(..., description="Fecha de emisión")
-    authorization_date: Optional[datetime] = Field(None, description="Fecha de autorización")
-    guest_name: Optional[str] = Field(None, max_length=255, description="Nombre del huésped")
-    cashier_id: Optional[str] = Field(None, max_length=100, description="ID del cajero")
-    arrival_date: Optional[date] = Field(None, description="Fecha de llegada")
-    departure_date: Optional[date] = Field(None, description="Fecha de salida")
-    reservation_number: Optional[str] = Field(None, max_length=100, description="Número de reserva")
-    total_amount: Optional[Decimal] = Field(None, ge=0, description="Monto total (se calculará automáticamente si no se proporciona)")
-    payment_method: Optional[str] = Field(None, max_length=100, description="Método de pago")
-    payment_terms: Optional[str] = Field(None, description="Términos de pago")
-    bank_account: Optional[str] = Field(None, max_length=100, description="Cuenta bancaria")
-    additional_info: Optional[str] = Field(None, description="Información adicional")
-    loaded_in_liquidation: bool = Field(False, description="Cargado en liquidación")
-    paid: bool = Field(False, description="Pagado")
-    reviewed_by: Optional[str] = Field(None, max_length=255, description="Revisado por")
-    items: List[InvoiceItemCreateNested] = Field(..., min_length=1, description="Items de la factura")
-
-    model_config = ConfigDict(
-        json_schema_extra={
-            "example": {
-                "invoice_number": "FAC-001",
-                "cufe": "CUFE123456789",
-                "provider_name": "Hotel Ejemplo",
-                "provider_nit": "900123456-7",
-                "client_name": "Cliente Ejemplo",
-                "client_nit": "800123456-7",
-                "issue_date": "2025-01-15T10:00:00Z",
-                "items": [
-                    {
-                        "description": "Habitación estándar",
-                        "quantity": 2,
-                        "unit_price": 150000.00,
-                        "tax_rate": 19,
-                        "total_amount": 357000.00
-                    }
-                ]
-            }
-        }
-    )
-
-
-class InvoiceUpdateRequest(BaseModel):
-    """Request model for updating an invoice."""
-    
-    invoice_number: Optional[str] = Field(None, max_length=255, description="Número de factura")
-    cufe: Optional[str] = Field(None, max_length=255, description="CUFE")
-    provider_name: Optional[str] = Field(None, max_length=255, description="Nombre del proveedor")
-    provider_nit: Optional[str] = Field(None, max_length=50, description="NIT del proveedor")
-    client_name: Optional[str] = Field(None, max_length=255, description="Nombre del cliente")
-    client_nit: Optional[str] = Field(None, max_length=50, description="NIT del cliente")
-    client_address: Optional[str] = Field(None, description="Dirección del cliente")
-    client_email: Optional[EmailStr] = Field(None, description="Email del cliente")
-    issue_date: Optional[datetime] = Field(None, description="Fecha de emisión")
-    authorization_date: Optional[datetime] = Field(None, description="Fecha de autorización")
-    guest_name: Optional[str] = Field(None, max_length=255, description="Nombre del huésped")
-    cashier_id: Optional[str] = Field(None, max_length=100, description="ID del cajero")
-    arrival_date: Optional[date] = Field(None, description="Fecha de llegada")
-    departure_date: Optional[date] = Field(None, description="Fecha de salida")
-    reservation_number: Optional[str] = Field(None, max_length=100, description="Número de reserva")
-    total_amount: Optional[Decimal] = Field(None, ge=0, description="Monto total")
-    payment_method: Optional[str] = Field(None, max_length=100, description="Método de pago")
-    payment_terms: Optional[str] = Field(None, description="Términos de pago")
-    bank_account: Optional[str] = Field(None, max_length=100, description="Cuenta bancaria")
-    additional_info: Optional[str] = Field(None, description="Información adicional")
-    loaded_in_liquidation: Optional[bool] = Field(None, description="Cargado en liquidación")
-    paid: Optional[bool] = Field(None, description="Pagado")
-    reviewed_by: Optional[str] = Field(None, max_length=255, description="Revisado por")
-
-    model_config = ConfigDict(
-        json_schema_extra={
-            "example": {
-                "paid": True,
-                "reviewed_by": "admin@example.com"
-            }
-        }
-    )
-
-
-# ============================================
-# PYDANTIC RESPONSE MODELS
-# ============================================
-
-class InvoiceResponse(BaseModel):
-    """Response model for a single invoice."""
-    
-    id: int = Field(..., description="ID único")
-    invoice_number: str = Field(..., description="Número de factura")
-    cufe: str = Field(..., description="CUFE")
-    provider_name: str = Field(..., description="Nombre del proveedor")
-    provider_nit: str = Field(..., description="NIT del proveedor")
-    client_name: str = Field(..., description="Nombre del cliente")
-    client_nit: str = Field(..., description="NIT del cliente")
-    client_address: Optional[str] = Field(None, description="Dirección del cliente")
-    client_email: Optional[str] = Field(None, description="Email del cliente")
-    issue_date: datetime = Field(..., description="Fecha de emisión")
-    authorization_date: Optional[datetime] = Field(None, description="Fecha de autorización")
-    guest_name: Optional[str] = Field(None, description="Nombre del huésped")
-    cashier_id: Optional[str] = Field(None, description="ID del cajero")
-    arrival_date: Optional[date] = Field(None, description="Fecha de llegada")
-    departure_date: Optional[date] = Field(None, description="Fecha de salida")
-    reservation_number: Optional[str] = Field(None, description="Número de reserva")
-    total_amount: Decimal = Field(..., description="Monto total")
-    payment_method: Optional[str] = Field(None, description="Método de pago")
-    payment_terms: Optional[str] = Field(None, description="Términos de pago")
-    bank_account: Optional[str] = Field(None, description="Cuenta bancaria")
-    additional_info: Optional[str] = Field(None, description="Información adicional")
-    loaded_in_liquidation: bool = Field(..., description="Cargado en liquidación")
-    paid: bool = Field(..., description="Pagado")
-    created_at: datetime = Field(..., description="Fecha de creación")
-    updated_at: datetime = Field(..., description="Fecha de actualización")
-    reviewed_by: Optional[str] = Field(None, description="Revisado por")
-    items: Optional[List] = Field(None, description="Items de la factura (si se incluyen)")
-
-    model_config = ConfigDict(
-        from_attributes=True,  # Enable ORM mode
-        json_schema_extra={
-            "example": {
-                "id": 1,
-                "invoice_number": "FAC-001",
-                "cufe": "CUFE123456789",
-                "provider_name": "Hotel Ejemplo",
-                "total_amount": 500000.00,
-                "paid": False
-            }
-        }
-    )
-
-
-class InvoiceListResponse(BaseModel):
-    """Response model for paginated list of invoices."""
-    
-    invoices: List[InvoiceResponse] = Field(..., description="Lista de facturas")
-    total: int = Field(..., description="Total de facturas")
-    page: int = Field(..., description="Página actual")
-    limit: int = Field(..., description="Elementos por página")
-    pages: int = Field(..., description="Total de páginas")
-
-    model_config = ConfigDict(
-        json_schema_extra={
-            "example": {
-                "invoices": [
-                    {
-                        "id": 1,
-                        "invoice_number": "FAC-001",
-                        "total_amount": 500000.00
-                    }
-                ],
-                "total": 100,
-                "page": 1,
-                "limit": 50,
-                "pages": 2
-            }
-        }
-    )
-
-
-class InvoiceStatsResponse(BaseModel):
-    """Response model for invoice statistics."""
-    
-    total: int = Field(..., description="Total de facturas")
-    paid: int = Field(..., description="Facturas pagadas")
-    unpaid: int = Field(..., description="Facturas sin pagar")
-    loaded_in_liquidation: int = Field(..., description="Facturas cargadas en liquidación")
-    total_amount: Decimal = Field(..., description="Monto total de todas las facturas")
-    paid_amount: Decimal = Field(..., description="Monto total de facturas pagadas")
-    unpaid_amount: Decimal = Field(..., description="Monto total de facturas sin pagar")
-
-    model_config = ConfigDict(
-        json_schema_extra={
-            "example": {
-                "total": 150,
-                "paid": 120,
-                "unpaid": 30,
-                "loaded_in_liquidation": 100,
-                "total_amount": 75000000.00,
-                "paid_amount": 60000000.00,
-                "unpaid_amount": 15000000.00
-            }
-        }
-    )
-
+"""
+Invoice model demonstrating best practices for SQLAlchemy + Pydantic models.
+
+This module shows:
+- SQLAlchemy ORM models with proper types and indexes
+- Pydantic models for request/response validation
+- Model configuration
+- Relationship with InvoiceItem
+"""
+
+import re
+from sqlalchemy import BigInteger, Integer, String, Text, DateTime, Date, Boolean, Index, DDL, FetchedValue, event, func, literal_column, text
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from datetime import datetime, date
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter, create_model
+from pydantic.fields import FieldInfo
+from typing import Optional, List
+from decimal import Decimal
+
+# Import base from database connection
+from app.database.connection import Base
+from app.database.types import FastMoney, MoneyOut
+from app.models.invoice_item import InvoiceItemResponse
+
+
+# ============================================
+# SQLAlchemy ORM MODEL
+# ============================================
+
+class Invoice(Base):
+    """
+    Invoice entity model.
+    
+    Maps to the invoices table (adapted from PostgreSQL to MySQL).
+    """
+    __tablename__ = "invoices"
+
+    # Primary key
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True, nullable=False)
+    
+    # Invoice identification
+    invoice_number: Mapped[str] = mapped_column(String(255), nullable=False, comment="Número de factura")
+    cufe: Mapped[str] = mapped_column(String(255), nullable=False, comment="CUFE (Código Único de Factura Electrónica)")
+    
+    # Provider information
+    provider_name: Mapped[str] = mapped_column(String(255), nullable=False, comment="Nombre del proveedor")
+    provider_nit: Mapped[str] = mapped_column(String(50), nullable=False, comment="NIT del proveedor")
+    
+    # Client information
+    client_name: Mapped[str] = mapped_column(String(255), nullable=False, comment="Nombre del cliente")
+    client_nit: Mapped[str] = mapped_column(String(50), nullable=False, comment="NIT del cliente")
+    client_address: Mapped[Optional[str]] = mapped_column(Text, nullable=True, comment="Dirección del cliente")
+    client_email: Mapped[Optional[str]] = mapped_column(String(255), nullable=True, comment="Email del cliente")
+    
+    # Dates
+    issue_date: Mapped[datetime] = mapped_column(DateTime, nullable=False, comment="Fecha de emisión")
+    authorization_date: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True, comment="Fecha de autorización")
+    arrival_date: Mapped[Optional[date]] = mapped_column(Date, nullable=True, comment="Fecha de llegada")
+    departure_date: Mapped[Optional[date]] = mapped_column(Date, nullable=True, comment="Fecha de salida")
+    
+    # Additional information
+    guest_name: Mapped[Optional[str]] = mapped_column(String(255), nullable=True, comment="Nombre del huésped")
+    cashier_id: Mapped[Optional[str]] = mapped_column(String(100), nullable=True, comment="ID del cajero")
+    reservation_number: Mapped[Optional[str]] = mapped_column(String(100), nullable=True, comment="Número de reserva")
+    
+    # Financial information
+    total_amount: Mapped[Decimal] = mapped_column(FastMoney(), nullable=False, comment="Monto total")
+    payment_method: Mapped[Optional[str]] = mapped_column(String(100), nullable=True, comment="Método de pago")
+    payment_terms: Mapped[Optional[str]] = mapped_column(Text, nullable=True, comment="Términos de pago")
+    bank_account: Mapped[Optional[str]] = mapped_column(String(100), nullable=True, comment="Cuenta bancaria")
+    
+    # Additional info
+    additional_info: Mapped[Optional[str]] = mapped_column(Text, nullable=True, comment="Información adicional")
+    
+    # Status flags
+    loaded_in_liquidation: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False, comment="Cargado en liquidación")
+    paid: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False, comment="Pagado")
+    
+    # Audit fields
+    # Filled by the database (session time_zone is UTC, see connection.py);
+    # MySQL's ON UPDATE clause for updated_at is added by the DDL hook below.
+    # updated_at keeps microseconds on MySQL: it is the ETag source, and two
+    # writes within the same second must not share a validator
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP"), comment="Fecha de creación")
+    updated_at: Mapped[datetime] = mapped_column(DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql"), nullable=False, server_default=func.now(literal_column("6")), server_onupdate=FetchedValue(), comment="Fecha de actualización")
+    reviewed_by: Mapped[Optional[str]] = mapped_column(String(255), nullable=True, comment="Revisado por")
+    
+    # Relationship with invoice items
+    # selectin: a list of N invoices loads all items in one extra query (no N+1)
+    items: Mapped[List["InvoiceItem"]] = relationship("InvoiceItem", back_populates="invoice", cascade="all, delete-orphan", lazy="selectin")
+    
+    # Database indexes for performance
+    # Composite indexes follow the list filters (equality column first, then the
+    # issue_date sort/range); idx_invoice_liq_paid covers the stats aggregates.
+    # Existing databases are migrated in app/database/migration.py.
+    __table_args__ = (
+        Index('idx_invoice_number', 'invoice_number'),
+        Index('idx_invoice_cufe', 'cufe', unique=True),
+        Index('idx_invoice_provider_issue', 'provider_nit', 'issue_date'),
+        Index('idx_invoice_client_issue', 'client_nit', 'issue_date'),
+        Index('idx_invoice_paid_issue', 'paid', 'issue_date'),
+        Index('idx_invoice_liq_issue', 'loaded_in_liquidation', 'issue_date'),
+        Index('idx_invoice_liq_paid', 'loaded_in_liquidation', 'paid', 'total_amount'),
+        Index('idx_invoice_issue_date', 'issue_date'),
+        Index('idx_invoice_reservation', 'reservation_number'),
+        # Free-text search (MATCH ... AGAINST); a plain index on other databases
+        Index('idx_invoice_search', 'invoice_number', 'provider_name', 'client_name', mysql_prefix='FULLTEXT'),
+        {'comment': 'Tabla de facturas'}
+    )
+
+    def __repr__(self):
+        return f"<Invoice(id={self.id}, invoice_number='{self.invoice_number}', total_amount={self.total_amount})>"
+
+
+# SQLAlchemy can't render MySQL's "ON UPDATE CURRENT_TIMESTAMP" from
+# server_onupdate; add it right after CREATE TABLE (existing tables are
+# altered in app/database/migration.py)
+INVOICE_UPDATED_AT_DDL = (
+    "ALTER TABLE invoices MODIFY updated_at DATETIME(6) NOT NULL "
+    "DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6) "
+    "COMMENT 'Fecha de actualización'"
+)
+event.listen(
+    Invoice.__table__,
+    "after_create",
+    DDL(INVOICE_UPDATED_AT_DDL).execute_if(dialect="mysql")
+)
+
+# Value for explicit "updated_at = now" writes: NOW(6) on MySQL (plain NOW()
+# would truncate to the second), CURRENT_TIMESTAMP on SQLite
+INVOICE_UPDATED_AT_NOW = func.now(literal_column("6"))
+
+
+# ============================================
+# PYDANTIC REQUEST MODELS
+# ============================================
+
+# Cheap shape check for client_email (x@y.z); avoids the email-validator/idna pass per request
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+class _InvoiceCommon(BaseModel):
+    """Invoice header fields shared by the create/update request models."""
+    
+    invoice_number: str = Field(..., max_length=255, description="Número de factura")
+    cufe: str = Field(..., max_length=255, description="CUFE")
+    provider_name: str = Field(..., max_length=255, description="Nombre del proveedor")
+    provider_nit: str = Field(..., max_length=50, description="NIT del proveedor")
+    client_name: str = Field(..., max_length=255, description="Nombre del cliente")
+    client_nit: str = Field(..., max_length=50, description="NIT del cliente")
+    client_address: Optional[str] = Field(None, description="Dirección del cliente")
+    client_email: Optional[str] = Field(None, max_length=255, pattern=_EMAIL_RE.pattern, description="Email del cliente")
+    issue_date: datetime = Field(..., description="Fecha de emisión")
+    authorization_date: Optional[datetime] = Field(None, description="Fecha de autorización")
+    guest_name: Optional[str] = Field(None, max_length=255, description="Nombre del huésped")
+    cashier_id: Optional[str] = Field(None, max_length=100, description="ID del cajero")
+    arrival_date: Optional[date] = Field(None, description="Fecha de llegada")
+    departure_date: Optional[date] = Field(None, description="Fecha de salida")
+    reservation_number: Optional[str] = Field(None, max_length=100, description="Número de reserva")
+    total_amount: Decimal = Field(..., ge=0, description="Monto total")
+    payment_method: Optional[str] = Field(None, max_length=100, description="Método de pago")
+    payment_terms: Optional[str] = Field(None, description="Términos de pago")
+    bank_account: Optional[str] = Field(None, max_length=100, description="Cuenta bancaria")
+    additional_info: Optional[str] = Field(None, description="Información adicional")
+    loaded_in_liquidation: bool = Field(False, description="Cargado en liquidación")
+    paid: bool = Field(False, description="Pagado")
+    reviewed_by: Optional[str] = Field(None, max_length=255, description="Revisado por")
+
+
+_INVOICE_CREATE_REQUEST_EXAMPLE = {
+    "invoice_number": "FAC-001",
+    "cufe": "CUFE123456789",
+    "provider_name": "Hotel Ejemplo",
+    "provider_nit": "900123456-7",
+    "client_name": "Cliente Ejemplo",
+    "client_nit": "800123456-7",
+    "client_address": "Calle 123 #45-67",
+    "client_email": "cliente@ejemplo.com",
+    "issue_date": "2025-01-15T10:00:00Z",
+    "total_amount": 500000.00,
+    "paid": False
+}
+
+
+class InvoiceCreateRequest(_InvoiceCommon):
+    """Request model for creating an invoice (without items)."""
+
+    model_config = ConfigDict(
+        json_schema_extra={"example": _INVOICE_CREATE_REQUEST_EXAMPLE}
+    )
+
+
+class InvoiceItemCreateNested(BaseModel):
+    """Nested model for creating invoice items within invoice creation."""
+    description: str = Field(..., description="Descripción del item")
+    unit: Optional[str] = Field(None, max_length=50, description="Unidad")
+    quantity: Optional[Decimal] = Field(None, ge=0, description="Cantidad")
+    unit_price: Optional[Decimal] = Field(None, ge=0, description="Precio unitario")
+    subtotal: Optional[Decimal] = Field(None, ge=0, description="Subtotal")
+    tax_rate: Optional[Decimal] = Field(None, ge=0, le=100, description="Tasa de impuesto (%)")
+    tax_amount: Optional[Decimal] = Field(None, ge=0, description="Monto de impuesto")
+    total_amount: Decimal = Field(..., ge=0, description="Monto total del item")
+
+
+_INVOICE_CREATE_WITH_ITEMS_REQUEST_EXAMPLE = {
+    "invoice_number": "FAC-001",
+    "cufe": "CUFE123456789",
+    "provider_name": "Hotel Ejemplo",
+    "provider_nit": "900123456-7",
+    "client_name": "Cliente Ejemplo",
+    "client_nit": "800123456-7",
+    "issue_date": "2025-01-15T10:00:00Z",
+    "items": [
+        {
+            "description": "Habitación estándar",
+            "quantity": 2,
+            "unit_price": 150000.00,
+            "tax_rate": 19,
+            "total_amount": 357000.00
+        }
+    ]
+}
+
+
+class InvoiceCreateWithItemsRequest(_InvoiceCommon):
+    """Request model for creating an invoice with nested items."""
+    
+    # Overrides keep their position from _InvoiceCommon
+    total_amount: Optional[Decimal] = Field(None, ge=0, description="Monto total (se calculará automáticamente si no se proporciona)")
+    items: List[InvoiceItemCreateNested] = Field(..., min_length=1, description="Items de la factura")
+
+    model_config = ConfigDict(
+        json_schema_extra={"example": _INVOICE_CREATE_WITH_ITEMS_REQUEST_EXAMPLE}
+    )
+
+
+_INVOICE_UPDATE_REQUEST_EXAMPLE = {
+    "paid": True,
+    "reviewed_by": "admin@example.com"
+}
+
+
+# Every field can be omitted (default None), same constraints/descriptions as
+# _InvoiceCommon. Annotations are kept as they are: an explicit null for a
+# NOT NULL column (paid, invoice_number, ...) fails validation with a 422
+# instead of reaching the database; unset defaults aren't validated.
+InvoiceUpdateRequest = create_model(
+    "InvoiceUpdateRequest",
+    __config__=ConfigDict(
+        json_schema_extra={"example": _INVOICE_UPDATE_REQUEST_EXAMPLE}
+    ),
+    __doc__="Request model for updating an invoice.",
+    __module__=__name__,
+    **{
+        name: (field.annotation, FieldInfo.merge_field_infos(field, default=None))
+        for name, field in _InvoiceCommon.model_fields.items()
+    }
+)
+
+
+class InvoiceListQuery(BaseModel):
+    """Query parameters for listing invoices (validated in a single pass)."""
+    
+    page: int = Field(1, ge=1, description="Número de página (inicia en 1)")
+    limit: int = Field(50, ge=1, le=100, description="Elementos por página (máximo 100)")
+    cursor: Optional[str] = Field(None, description="Cursor de la página siguiente (next_cursor de la respuesta anterior); si se envía, se ignora page")
+    include_total: Optional[bool] = Field(None, description="Calcular total y pages (consulta COUNT adicional). Por defecto: sí con page, no con cursor")
+    search: Optional[str] = Field(None, description="Búsqueda en número de factura, proveedor, cliente, CUFE")
+    paid: Optional[bool] = Field(None, description="Filtrar por estado de pago")
+    loaded_in_liquidation: Optional[bool] = Field(None, description="Filtrar por cargado en liquidación")
+    provider_nit: Optional[str] = Field(None, description="Filtrar por NIT del proveedor")
+    client_nit: Optional[str] = Field(None, description="Filtrar por NIT del cliente")
+    reservation_number: Optional[str] = Field(None, description="Filtrar por número de reserva")
+    issue_date_from: Optional[datetime] = Field(None, description="Filtrar desde fecha de emisión")
+    issue_date_to: Optional[datetime] = Field(None, description="Filtrar hasta fecha de emisión")
+
+
+# ============================================
+# PYDANTIC RESPONSE MODELS
+# ============================================
+
+_INVOICE_RESPONSE_EXAMPLE = {
+    "id": 1,
+    "invoice_number": "FAC-001",
+    "cufe": "CUFE123456789",
+    "provider_name": "Hotel Ejemplo",
+    "total_amount": 500000.00,
+    "paid": False
+}
+
+
+class InvoiceResponse(BaseModel):
+    """Response model for a single invoice."""
+    
+    id: int = Field(..., description="ID único")
+    invoice_number: str = Field(..., description="Número de factura")
+    cufe: str = Field(..., description="CUFE")
+    provider_name: str = Field(..., description="Nombre del proveedor")
+    provider_nit: str = Field(..., description="NIT del proveedor")
+    client_name: str = Field(..., description="Nombre del cliente")
+    client_nit: str = Field(..., description="NIT del cliente")
+    client_address: Optional[str] = Field(None, description="Dirección del cliente")
+    client_email: Optional[str] = Field(None, description="Email del cliente")
+    issue_date: datetime = Field(..., description="Fecha de emisión")
+    authorization_date: Optional[datetime] = Field(None, description="Fecha de autorización")
+    guest_name: Optional[str] = Field(None, description="Nombre del huésped")
+    cashier_id: Optional[str] = Field(None, description="ID del cajero")
+    arrival_date: Optional[date] = Field(None, description="Fecha de llegada")
+    departure_date: Optional[date] = Field(None, description="Fecha de salida")
+    reservation_number: Optional[str] = Field(None, description="Número de reserva")
+    total_amount: MoneyOut = Field(..., description="Monto total")
+    payment_method: Optional[str] = Field(None, description="Método de pago")
+    payment_terms: Optional[str] = Field(None, description="Términos de pago")
+    bank_account: Optional[str] = Field(None, description="Cuenta bancaria")
+    additional_info: Optional[str] = Field(None, description="Información adicional")
+    loaded_in_liquidation: bool = Field(..., description="Cargado en liquidación")
+    paid: bool = Field(..., description="Pagado")
+    created_at: datetime = Field(..., description="Fecha de creación")
+    updated_at: datetime = Field(..., description="Fecha de actualización")
+    reviewed_by: Optional[str] = Field(None, description="Revisado por")
+    items: Optional[List[InvoiceItemResponse]] = Field(None, description="Items de la factura (si se incluyen)")
+
+    model_config = ConfigDict(
+        from_attributes=True,  # Enable ORM mode
+        extra="ignore",
+        validate_assignment=False,  # Services set fields after validation; don't re-validate
+        json_schema_extra={"example": _INVOICE_RESPONSE_EXAMPLE}
+    )
+
+
+_INVOICE_LIST_RESPONSE_EXAMPLE = {
+    "invoices": [
+        {
+            "id": 1,
+            "invoice_number": "FAC-001",
+            "total_amount": 500000.00
+        }
+    ],
+    "total": 100,
+    "page": 1,
+    "limit": 50,
+    "pages": 2,
+    "next_cursor": "MjAyNS0wMS0xNVQxMDowMDowMHwx"
+}
+
+
+class InvoiceListResponse(BaseModel):
+    """Response model for paginated list of invoices."""
+    
+    invoices: List[InvoiceResponse] = Field(..., description="Lista de facturas")
+    total: Optional[int] = Field(None, description="Total de facturas (null si no se pidió include_total)")
+    page: Optional[int] = Field(None, description="Página actual (null al paginar con cursor)")
+    limit: int = Field(..., description="Elementos por página")
+    pages: Optional[int] = Field(None, description="Total de páginas (null si no se pidió include_total)")
+    next_cursor: Optional[str] = Field(None, description="Cursor para pedir la página siguiente (null si es la última)")
+
+    model_config = ConfigDict(
+        json_schema_extra={"example": _INVOICE_LIST_RESPONSE_EXAMPLE}
+    )
+
+
+_INVOICE_STATS_RESPONSE_EXAMPLE = {
+    "total": 150,
+    "paid": 120,
+    "unpaid": 30,
+    "loaded_in_liquidation": 100,
+    "total_amount": 75000000.00,
+    "paid_amount": 60000000.00,
+    "unpaid_amount": 15000000.00
+}
+
+
+class InvoiceStatsResponse(BaseModel):
+    """Response model for invoice statistics."""
+    
+    total: int = Field(..., description="Total de facturas")
+    paid: int = Field(..., description="Facturas pagadas")
+    unpaid: int = Field(..., description="Facturas sin pagar")
+    loaded_in_liquidation: int = Field(..., description="Facturas cargadas en liquidación")
+    total_amount: MoneyOut = Field(..., description="Monto total de todas las facturas")
+    paid_amount: MoneyOut = Field(..., description="Monto total de facturas pagadas")
+    unpaid_amount: MoneyOut = Field(..., description="Monto total de facturas sin pagar")
+
+    model_config = ConfigDict(
+        json_schema_extra={"example": _INVOICE_STATS_RESPONSE_EXAMPLE}
+    )
+
+
+# ============================================
+# TRUSTED READ BUILDERS
+# ============================================
+# Read paths build responses straight from ORM rows with the compiled
+# pydantic-core validators (from_attributes): measured faster than
+# model_construct over a dict of getattr()s, and one TypeAdapter call
+# validates a whole page. Create/update paths keep model_validate.
+
+_INVOICE_RESPONSE_FIELDS = tuple(f for f in InvoiceResponse.model_fields if f != "items")
+_INVOICE_VALIDATOR = InvoiceResponse.__pydantic_validator__
+_INVOICE_LIST_ADAPTER = TypeAdapter(List[InvoiceResponse])
+
+
+def invoice_response_from_row(invoice: Invoice, include_items: bool = True) -> InvoiceResponse:
+    """Build an InvoiceResponse (and its items) from a trusted ORM row."""
+    if include_items:
+        return _INVOICE_VALIDATOR.validate_python(invoice, from_attributes=True)
+    # Items may not be loaded (lazyload): copy the columns only
+    return InvoiceResponse.model_construct(
+        **{field: getattr(invoice, field) for field in _INVOICE_RESPONSE_FIELDS},
+        items=None
+    )
+
+
+def invoice_responses_from_orm(invoices: List[Invoice]) -> List[InvoiceResponse]:
+    """Build a page of InvoiceResponses (items loaded) in a single validator call."""
+    return _INVOICE_LIST_ADAPTER.validate_python(invoices, from_attributes=True)
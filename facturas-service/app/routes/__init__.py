@@ -1,9 +1,16 @@
-"""
-Routes package for facturas service.
-"""
-
-from app.routes.invoice import router as invoice_router
-from app.routes.invoice_item import router as invoice_item_router
-
-__all__ = ["invoice_router", "invoice_item_router"]
-
+"""
+Routes package for facturas service.
+"""
+
+__all__ = ["invoice_router", "invoice_item_router"]
+
+
+def __getattr__(name):
+    # Lazy (PEP 562): importing one router module doesn't build the other's models
+    if name == "invoice_router":
+        from app.routes.invoice import router
+        return router
+    if name == "invoice_item_router":
+        from app.routes.invoice_item import router
+        return router
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
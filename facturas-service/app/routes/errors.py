@@ -0,0 +1,57 @@
+"""
+Route classes that map service exceptions to HTTP errors.
+
+This module implements:
+- ServiceErrorRoute: APIRoute that turns ValueError into 400 and any
+  unexpected exception into a logged 500, once for every route
+- NotFoundErrorRoute: same, but ValueError means a missing parent (404)
+
+Handlers stay straight-line code: call the service, raise HTTPException
+for their own 404s, return the response.
+"""
+
+import logging
+from typing import Any, Callable, Coroutine
+from fastapi import Request, Response, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from starlette.exceptions import HTTPException
+
+logger = logging.getLogger("uvicorn")
+
+
+class ServiceErrorRoute(APIRoute):
+    """
+    APIRoute with the service-layer error mapping.
+
+    - HTTPException / RequestValidationError: passed through untouched
+    - ValueError: business rule violation -> value_error_status (400)
+    - Anything else: logged, 500 with a generic message
+    """
+    value_error_status = status.HTTP_400_BAD_REQUEST
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        route_handler = super().get_route_handler()
+        value_error_status = self.value_error_status
+        name = self.name
+
+        async def error_mapping_handler(request: Request) -> Response:
+            try:
+                return await route_handler(request)
+            except (HTTPException, RequestValidationError):
+                raise
+            except ValueError as e:
+                raise HTTPException(status_code=value_error_status, detail=str(e))
+            except Exception as e:
+                logger.error("Error in %s: %s", name, e)
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Error interno del servidor"
+                )
+
+        return error_mapping_handler
+
+
+class NotFoundErrorRoute(ServiceErrorRoute):
+    """ServiceErrorRoute for nested resources: ValueError means the parent wasn't found."""
+    value_error_status = status.HTTP_404_NOT_FOUND
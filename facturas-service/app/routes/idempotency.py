@@ -0,0 +1,161 @@
+"""
+Idempotency-Key replay for POST routes.
+
+This module implements:
+- IdempotencyCache: in-process TTL + LRU map of Idempotency-Key to the
+  stored response, plus the keys whose first request is still running
+- IdempotentRoute: ServiceErrorRoute that replays the stored response for
+  a retried POST (same key, same body) without validating the body or
+  calling the service again; a retry sent while the first request is
+  still running waits for it instead of running the handler twice
+
+The cache lives in each worker process, so a retry that lands on another
+worker runs normally. Only the invoice cufe is unique (invoice_number is
+not), so there a repeated invoice is rejected by the cufe check and any
+other repeated POST is applied again.
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Coroutine, Dict, NamedTuple, Optional, Tuple
+from fastapi import Request, Response, status
+from fastapi.responses import JSONResponse
+from app.routes.errors import ServiceErrorRoute
+
+# Seconds a stored response can be replayed, and max keys kept per worker
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS") or "300")
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE") or "1024")
+
+
+class StoredResponse(NamedTuple):
+    """Response captured for an Idempotency-Key."""
+    expires_at: float
+    body_hash: bytes
+    status_code: int
+    body: bytes
+    media_type: Optional[str]
+
+
+class IdempotencyCache:
+    """
+    TTL + LRU map (Idempotency-Key -> StoredResponse).
+
+    Keys being handled are kept apart (key -> (body hash, Future)) until
+    their response is stored or dropped. Single event loop per worker, so
+    no locking is needed.
+    """
+    __slots__ = ("ttl", "maxsize", "_entries", "_pending")
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL_SECONDS, maxsize: int = IDEMPOTENCY_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._pending: Dict[str, Tuple[bytes, asyncio.Future]] = {}
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, body_hash: bytes, response: Response) -> None:
+        self._entries[key] = StoredResponse(
+            expires_at=time.monotonic() + self.ttl,
+            body_hash=body_hash,
+            status_code=response.status_code,
+            body=bytes(response.body),
+            media_type=response.media_type
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get_pending(self, key: str) -> Optional[Tuple[bytes, asyncio.Future]]:
+        return self._pending.get(key)
+
+    def start(self, key: str, body_hash: bytes) -> None:
+        self._pending[key] = (body_hash, asyncio.get_running_loop().create_future())
+
+    def finish(self, key: str) -> None:
+        """Drop the in-flight mark and wake the requests waiting on it."""
+        _, future = self._pending.pop(key)
+        if not future.done():
+            future.set_result(None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._pending.clear()
+
+
+idempotency_cache = IdempotencyCache()
+
+
+class IdempotentRoute(ServiceErrorRoute):
+    """
+    ServiceErrorRoute with Idempotency-Key replay for POST requests.
+
+    - No header (or not a POST): handled normally
+    - Known key, same body: stored response replayed (Idempotent-Replayed: true)
+    - Known key, different body: 422
+    - Key in flight, same body: waits for the first request, then replays
+      its response (or, if it failed, is handled normally)
+    - New key: handled normally; 2xx responses are stored for replay
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        route_handler = super().get_route_handler()
+        path = self.path
+
+        async def idempotent_handler(request: Request) -> Response:
+            key = request.headers.get("idempotency-key")
+            if not key or request.method != "POST":
+                return await route_handler(request)
+            key = f"{path} {key}"  # Same key on two endpoints = two operations
+
+            # Request caches the body, so the handler's validation reads it again for free
+            body_hash = hashlib.blake2b(await request.body(), digest_size=16).digest()
+            while True:
+                stored = idempotency_cache.get(key)
+                if stored is not None:
+                    if stored.body_hash != body_hash:
+                        return _key_reused_response()
+                    return Response(
+                        content=stored.body,
+                        status_code=stored.status_code,
+                        media_type=stored.media_type,
+                        headers={"Idempotent-Replayed": "true"}
+                    )
+                pending = idempotency_cache.get_pending(key)
+                if pending is None:
+                    break
+                if pending[0] != body_hash:
+                    return _key_reused_response()
+                # shield: a disconnecting waiter must not cancel the shared Future
+                await asyncio.shield(pending[1])
+
+            # No await between the checks above and start(): exactly one
+            # request per key runs the handler
+            idempotency_cache.start(key, body_hash)
+            try:
+                response = await route_handler(request)
+                if 200 <= response.status_code < 300:
+                    idempotency_cache.set(key, body_hash, response)
+            finally:
+                idempotency_cache.finish(key)
+            return response
+
+        return idempotent_handler
+
+
+def _key_reused_response() -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        content={"detail": "Idempotency-Key ya usada con otro cuerpo de solicitud"}
+    )
@@ -1,412 +1,414 @@
-"""
-Invoice routes module with FastAPI endpoints.
-
-This module demonstrates:
-- RESTful API design
-- Proper HTTP methods and status codes
-- Request/response validation
-- Error handling
-- Documentation with OpenAPI
-- Dependency injection
-- Nested resource creation
-"""
-
-import logging
-from typing import Optional
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Query, Path, status
-from sqlalchemy.orm import Session
-from app.database.connection import get_db
-from app.services.invoice_service import InvoiceService
-from app.models.invoice import (
-    InvoiceCreateRequest,
-    InvoiceUpdateRequest,
-    InvoiceCreateWithItemsRequest,
-    InvoiceResponse,
-    InvoiceListResponse,
-    InvoiceStatsResponse
-)
-
-logger = logging.getLogger("uvicorn")
-
-# Create router
-router = APIRouter()
-
-
-# ============================================
-# LIST INVOICES (with pagination & filtering)
-# ============================================
-
-@router.get(
-    "/invoices",
-    response_model=InvoiceListResponse,
-    status_code=status.HTTP_200_OK,
-    summary="Listar todas las facturas",
-    description="Obtener lista paginada de facturas con filtros opcionales",
-    response_description="Lista paginada de facturas con metadatos"
-)
-async def get_invoices(
-    page: int = Query(1, ge=1, description="Número de página (inicia en 1)"),
-    limit: int = Query(50, ge=1, le=100, description="Elementos por página (máximo 100)"),
-    search: Optional[str] = Query(None, description="Búsqueda en número de factura, proveedor, cliente, CUFE"),
-    paid: Optional[bool] = Query(None, description="Filtrar por estado de pago"),
-    loaded_in_liquidation: Optional[bool] = Query(None, description="Filtrar por cargado en liquidación"),
-    provider_nit: Optional[str] = Query(None, description="Filtrar por NIT del proveedor"),
-    client_nit: Optional[str] = Query(None, description="Filtrar por NIT del cliente"),
-    reservation_number: Optional[str] = Query(None, description="Filtrar por número de reserva"),
-    issue_date_from: Optional[datetime] = Query(None, description="Filtrar desde fecha de emisión"),
-    issue_date_to: Optional[datetime] = Query(None, description="Filtrar hasta fecha de emisión"),
-    db: Session = Depends(get_db)
-):
-    """
-    Obtener lista paginada de facturas.
-    
-    **Parámetros de consulta:**
-    - **page**: Número de página (inicia en 1)
-    - **limit**: Número de elementos por página (1-100)
-    - **search**: Término de búsqueda opcional
-    - **paid**: Filtro por estado de pago
-    - **loaded_in_liquidation**: Filtro por cargado en liquidación
-    - **provider_nit**: Filtro por NIT del proveedor
-    - **client_nit**: Filtro por NIT del cliente
-    - **reservation_number**: Filtro por número de reserva
-    - **issue_date_from**: Filtro desde fecha de emisión
-    - **issue_date_to**: Filtro hasta fecha de emisión
-    
-    **Retorna:**
-    - Lista de facturas con metadatos de paginación
-    """
-    try:
-        service = InvoiceService(db)
-        result = service.get_all(
-            page=page,
-            limit=limit,
-            search=search,
-            paid=paid,
-            loaded_in_liquidation=loaded_in_liquidation,
-            provider_nit=provider_nit,
-            client_nit=client_nit,
-            reservation_number=reservation_number,
-            issue_date_from=issue_date_from,
-            issue_date_to=issue_date_to
-        )
-        return result
-    except Exception as e:
-        logger.error(f"Error in get_invoices: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor al obtener facturas"
-        )
-
-
-# ============================================
-# GET SINGLE INVOICE
-# ============================================
-
-@router.get(
-    "/invoices/{invoice_id}",
-    response_model=InvoiceResponse,
-    status_code=status.HTTP_200_OK,
-    summary="Obtener factura por ID",
-    description="Obtener una factura específica por su identificador único (incluye items)",
-    responses={
-        200: {"description": "Factura encontrada"},
-        404: {"description": "Factura no encontrada"},
-        500: {"description": "Error interno del servidor"}
-    }
-)
-async def get_invoice(
-    invoice_id: int = Path(..., ge=1, description="Identificador único de la factura"),
-    include_items: bool = Query(True, description="Incluir items de la factura"),
-    db: Session = Depends(get_db)
-):
-    """
-    Obtener una factura específica por ID.
-    
-    **Parámetros de ruta:**
-    - **invoice_id**: Identificador único de la factura
-    
-    **Parámetros de consulta:**
-    - **include_items**: Incluir items de la factura en la respuesta (default: true)
-    
-    **Retorna:**
-    - Detalles de la factura (con items si include_items=true)
-    
-    **Errores:**
-    - **404**: Factura no encontrada
-    """
-    try:
-        service = InvoiceService(db)
-        invoice = service.get_by_id(invoice_id, include_items=include_items)
-        
-        if not invoice:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Factura con id {invoice_id} no encontrada"
-            )
-        
-        return invoice
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in get_invoice({invoice_id}): {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor al obtener factura"
-        )
-
-
-# ============================================
-# CREATE INVOICE (without items)
-# ============================================
-
-@router.post(
-    "/invoices",
-    response_model=InvoiceResponse,
-    status_code=status.HTTP_201_CREATED,
-    summary="Crear nueva factura",
-    description="Crear una nueva factura sin items",
-    responses={
-        201: {"description": "Factura creada exitosamente"},
-        400: {"description": "Datos de solicitud inválidos"},
-        500: {"description": "Error interno del servidor"}
-    }
-)
-async def create_invoice(
-    request: InvoiceCreateRequest,
-    db: Session = Depends(get_db)
-):
-    """
-    Crear una nueva factura (sin items).
-    
-    **Cuerpo de la solicitud:**
-    - Todos los campos de la factura (ver modelo)
-    
-    **Retorna:**
-    - Factura creada con ID generado
-    
-    **Nota:**
-    - Para crear factura con items, usar el endpoint `/invoices/with-items`
-    """
-    try:
-        service = InvoiceService(db)
-        invoice = service.create(request)
-        return invoice
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
-        )
-    except Exception as e:
-        logger.error(f"Error in create_invoice: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor al crear factura"
-        )
-
-
-# ============================================
-# CREATE INVOICE WITH ITEMS
-# ============================================
-
-@router.post(
-    "/invoices/with-items",
-    response_model=InvoiceResponse,
-    status_code=status.HTTP_201_CREATED,
-    summary="Crear factura con items",
-    description="Crear una nueva factura con items anidados. El total se calculará automáticamente si no se proporciona",
-    responses={
-        201: {"description": "Factura creada exitosamente con items"},
-        400: {"description": "Datos de solicitud inválidos o total no coincide con items"},
-        500: {"description": "Error interno del servidor"}
-    }
-)
-async def create_invoice_with_items(
-    request: InvoiceCreateWithItemsRequest,
-    db: Session = Depends(get_db)
-):
-    """
-    Crear una nueva factura con items anidados.
-    
-    **Cuerpo de la solicitud:**
-    - Todos los campos de la factura
-    - **items**: Lista de items de la factura (mínimo 1)
-    
-    **Cálculos automáticos:**
-    - Si `total_amount` no se proporciona, se calculará sumando los totales de los items
-    - Si se proporciona `total_amount`, debe coincidir con la suma de items (tolerancia 0.01)
-    - Los items calcularán automáticamente `subtotal`, `tax_amount` y `total_amount` si no se proporcionan
-    
-    **Retorna:**
-    - Factura creada con items incluidos
-    """
-    try:
-        service = InvoiceService(db)
-        invoice = service.create_with_items(request)
-        return invoice
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
-        )
-    except Exception as e:
-        logger.error(f"Error in create_invoice_with_items: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor al crear factura con items"
-        )
-
-
-# ============================================
-# UPDATE INVOICE
-# ============================================
-
-@router.put(
-    "/invoices/{invoice_id}",
-    response_model=InvoiceResponse,
-    status_code=status.HTTP_200_OK,
-    summary="Actualizar factura",
-    description="Actualizar una factura existente con nuevos datos",
-    responses={
-        200: {"description": "Factura actualizada exitosamente"},
-        400: {"description": "Datos de solicitud inválidos"},
-        404: {"description": "Factura no encontrada"},
-        500: {"description": "Error interno del servidor"}
-    }
-)
-async def update_invoice(
-    invoice_id: int = Path(..., ge=1, description="Identificador único de la factura"),
-    request: InvoiceUpdateRequest = ...,
-    db: Session = Depends(get_db)
-):
-    """
-    Actualizar una factura existente.
-    
-    **Parámetros de ruta:**
-    - **invoice_id**: Identificador único de la factura a actualizar
-    
-    **Cuerpo de la solicitud:**
-    - Todos los campos son opcionales
-    - Solo los campos proporcionados serán actualizados
-    
-    **Retorna:**
-    - Datos actualizados de la factura
-    
-    **Errores:**
-    - **404**: Factura no encontrada
-    - **400**: Datos inválidos (ej: departure_date < arrival_date)
-    """
-    try:
-        service = InvoiceService(db)
-        invoice = service.update(invoice_id, request)
-        
-        if not invoice:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Factura con id {invoice_id} no encontrada"
-            )
-        
-        return invoice
-    except HTTPException:
-        raise
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
-        )
-    except Exception as e:
-        logger.error(f"Error in update_invoice({invoice_id}): {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor al actualizar factura"
-        )
-
-
-# ============================================
-# DELETE INVOICE
-# ============================================
-
-@router.delete(
-    "/invoices/{invoice_id}",
-    status_code=status.HTTP_204_NO_CONTENT,
-    summary="Eliminar factura",
-    description="Eliminar una factura (hard delete - también elimina sus items)",
-    responses={
-        204: {"description": "Factura eliminada exitosamente"},
-        404: {"description": "Factura no encontrada"},
-        500: {"description": "Error interno del servidor"}
-    }
-)
-async def delete_invoice(
-    invoice_id: int = Path(..., ge=1, description="Identificador único de la factura"),
-    db: Session = Depends(get_db)
-):
-    """
-    Eliminar una factura (hard delete).
-    
-    **Parámetros de ruta:**
-    - **invoice_id**: Identificador único de la factura a eliminar
-    
-    **Nota:**
-    - Esto realiza un hard delete (elimina permanentemente)
-    - Los items asociados se eliminarán automáticamente (CASCADE)
-    
-    **Errores:**
-    - **404**: Factura no encontrada
-    """
-    try:
-        service = InvoiceService(db)
-        deleted = service.delete(invoice_id)
-        
-        if not deleted:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Factura con id {invoice_id} no encontrada"
-            )
-        
-        return None  # 204 No Content
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in delete_invoice({invoice_id}): {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor al eliminar factura"
-        )
-
-
-# ============================================
-# GET STATISTICS
-# ============================================
-
-@router.get(
-    "/invoices/stats",
-    response_model=InvoiceStatsResponse,
-    status_code=status.HTTP_200_OK,
-    summary="Obtener estadísticas de facturas",
-    description="Obtener estadísticas agregadas sobre las facturas",
-    response_description="Estadísticas incluyendo conteos y montos totales"
-)
-async def get_invoice_stats(
-    db: Session = Depends(get_db)
-):
-    """
-    Obtener estadísticas sobre facturas.
-    
-    **Retorna:**
-    - Conteo total
-    - Conteos pagadas/sin pagar
-    - Conteo cargadas en liquidación
-    - Montos totales (total, pagado, sin pagar)
-    """
-    try:
-        service = InvoiceService(db)
-        stats = service.get_stats()
-        return stats
-    except Exception as e:
-        logger.error(f"Error in get_invoice_stats: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor al obtener estadísticas"
-        )
-
+"""
+Invoice routes module with FastAPI endpoints.
+
+This module demonstrates:
+- RESTful API design
+- Proper HTTP methods and status codes
+- Request/response validation
+- Error handling
+- Documentation with OpenAPI
+- Dependency injection
+- Nested resource creation
+"""
+
+from datetime import datetime
+from typing import Annotated, AsyncIterator, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Path, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.routes.idempotency import IdempotentRoute
+from app.routes.responses import model_response, make_etag, etag_matches
+from app.database.connection import get_db, get_db_ro, get_session_factory_ro
+from app.services.invoice_service import InvoiceService
+from app.models.invoice import (
+    InvoiceCreateRequest,
+    InvoiceUpdateRequest,
+    InvoiceCreateWithItemsRequest,
+    InvoiceResponse,
+    InvoiceListResponse,
+    InvoiceStatsResponse,
+    InvoiceListQuery,
+    invoice_response_from_row
+)
+
+# Create router (ServiceErrorRoute maps ValueError -> 400, other errors -> 500;
+# IdempotentRoute adds Idempotency-Key replay for the POSTs)
+router = APIRouter(route_class=IdempotentRoute)
+
+
+# ============================================
+# DEPENDENCIES
+# ============================================
+
+async def get_invoice_service(db: AsyncSession = Depends(get_db)) -> InvoiceService:
+    """Dependency: InvoiceService bound to the request's session."""
+    return InvoiceService(db)
+
+
+async def get_invoice_service_ro(db: AsyncSession = Depends(get_db_ro)) -> InvoiceService:
+    """Dependency: InvoiceService on the read-only session (replica when configured)."""
+    return InvoiceService(db)
+
+
+# ============================================
+# LIST INVOICES (with pagination & filtering)
+# ============================================
+
+@router.get(
+    "/invoices",
+    response_model=InvoiceListResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Listar todas las facturas",
+    description="Obtener lista paginada de facturas con filtros opcionales",
+    response_description="Lista paginada de facturas con metadatos"
+)
+async def get_invoices(
+    filters: Annotated[InvoiceListQuery, Query()],
+    service: InvoiceService = Depends(get_invoice_service_ro)  # Heavy read: replica when configured
+):
+    """
+    Obtener lista paginada de facturas.
+    
+    **Parámetros de consulta:**
+    - **page**: Número de página (inicia en 1)
+    - **limit**: Número de elementos por página (1-100)
+    - **cursor**: `next_cursor` de la respuesta anterior; recorre las páginas
+      sin OFFSET (mismo costo en cualquier profundidad) e ignora `page` (la respuesta trae `page: null`)
+    - **include_total**: Calcular `total` y `pages` con un COUNT adicional
+      (por defecto: sí con `page`, no con `cursor`; `next_cursor` ya indica
+      si hay página siguiente)
+    - **search**: Término de búsqueda opcional. En MySQL busca palabras (o su
+      inicio) de número de factura, proveedor y cliente con el índice FULLTEXT;
+      un CUFE completo o su inicio busca por CUFE
+    - **paid**: Filtro por estado de pago
+    - **loaded_in_liquidation**: Filtro por cargado en liquidación
+    - **provider_nit**: Filtro por NIT del proveedor
+    - **client_nit**: Filtro por NIT del cliente
+    - **reservation_number**: Filtro por número de reserva
+    - **issue_date_from**: Filtro desde fecha de emisión
+    - **issue_date_to**: Filtro hasta fecha de emisión
+    
+    **Retorna:**
+    - Lista de facturas con metadatos de paginación
+    """
+    result = await service.get_all(**filters.model_dump())
+    return model_response(result)
+
+
+# ============================================
+# GET STATISTICS
+# ============================================
+# Declarada antes de /invoices/{invoice_id} para que "stats" no se
+# interprete como un ID
+
+@router.get(
+    "/invoices/stats",
+    response_model=InvoiceStatsResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Obtener estadísticas de facturas",
+    description="Obtener estadísticas agregadas sobre las facturas",
+    response_description="Estadísticas incluyendo conteos y montos totales"
+)
+async def get_invoice_stats(
+    service: InvoiceService = Depends(get_invoice_service_ro)  # Heavy read: replica when configured
+):
+    """
+    Obtener estadísticas sobre facturas.
+    
+    **Retorna:**
+    - Conteo total
+    - Conteos pagadas/sin pagar
+    - Conteo cargadas en liquidación
+    - Montos totales (total, pagado, sin pagar)
+    """
+    stats = await service.get_stats()
+    return model_response(stats)
+
+
+# ============================================
+# EXPORT INVOICES (NDJSON stream)
+# ============================================
+# Declarada antes de /invoices/{invoice_id} para que "export" no se
+# interprete como un ID
+
+@router.get(
+    "/invoices/export",
+    response_class=StreamingResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Exportar facturas",
+    description="Exportar facturas (con ítems) como NDJSON, una factura por línea",
+    response_description="Flujo application/x-ndjson de facturas"
+)
+async def export_invoices(
+    issue_date_from: Optional[datetime] = Query(None, description="Filtro desde fecha de emisión"),
+    issue_date_to: Optional[datetime] = Query(None, description="Filtro hasta fecha de emisión"),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory_ro)
+):
+    """
+    Exportar facturas en streaming (p. ej. el volcado de un periodo contable).
+    
+    **Parámetros de consulta:**
+    - **issue_date_from**: Filtro desde fecha de emisión
+    - **issue_date_to**: Filtro hasta fecha de emisión
+    
+    **Retorna:**
+    - Una factura JSON por línea, de la más antigua a la más reciente
+    
+    Las filas se leen por lotes (paginación keyset, con los ítems de cada
+    lote) y cada línea se envía al serializarse: la memoria no crece con el
+    tamaño de la exportación.
+    """
+    async def ndjson_lines() -> AsyncIterator[bytes]:
+        # Sesión propia: get_db_ro se cierra antes de enviar el cuerpo
+        async with session_factory() as db:
+            async for invoice in InvoiceService(db).iter_invoices(issue_date_from, issue_date_to):
+                row = invoice_response_from_row(invoice)
+                yield row.__pydantic_serializer__.to_json(row) + b"\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
+# ============================================
+# GET SINGLE INVOICE
+# ============================================
+
+@router.get(
+    "/invoices/{invoice_id}",
+    response_model=InvoiceResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Obtener factura por ID",
+    description="Obtener una factura específica por su identificador único (incluye items)",
+    responses={
+        200: {"description": "Factura encontrada"},
+        304: {"description": "Factura sin cambios (If-None-Match coincide con el ETag)"},
+        404: {"description": "Factura no encontrada"},
+        500: {"description": "Error interno del servidor"}
+    }
+)
+async def get_invoice(
+    invoice_id: int = Path(..., ge=1, description="Identificador único de la factura"),
+    include_items: bool = Query(True, description="Incluir items de la factura"),
+    if_none_match: Optional[str] = Header(None, description="ETag de una respuesta anterior"),
+    service: InvoiceService = Depends(get_invoice_service)
+):
+    """
+    Obtener una factura específica por ID.
+    
+    **Parámetros de ruta:**
+    - **invoice_id**: Identificador único de la factura
+    
+    **Parámetros de consulta:**
+    - **include_items**: Incluir items de la factura en la respuesta (default: true)
+    
+    **Encabezados:**
+    - **If-None-Match**: ETag recibido antes; si la factura no cambió se
+      responde 304 sin cuerpo
+    
+    **Retorna:**
+    - Detalles de la factura (con items si include_items=true) y su ETag
+    
+    **Errores:**
+    - **404**: Factura no encontrada
+    """
+    # Solo updated_at: un cliente con la versión vigente no paga la carga
+    # completa (items + serialización)
+    updated_at = await service.get_updated_at(invoice_id)
+    
+    if updated_at is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Factura con id {invoice_id} no encontrada"
+        )
+    
+    etag = make_etag(invoice_id, updated_at.isoformat(), include_items)
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=60"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    invoice = await service.get_by_id(invoice_id, include_items=include_items)
+    
+    if not invoice:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Factura con id {invoice_id} no encontrada"
+        )
+    
+    response = model_response(invoice)
+    response.headers.update(headers)
+    return response
+
+
+# ============================================
+# CREATE INVOICE (without items)
+# ============================================
+
+@router.post(
+    "/invoices",
+    response_model=InvoiceResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Crear nueva factura",
+    description="Crear una nueva factura sin items",
+    responses={
+        201: {"description": "Factura creada exitosamente"},
+        400: {"description": "Datos de solicitud inválidos"},
+        500: {"description": "Error interno del servidor"}
+    }
+)
+async def create_invoice(
+    request: InvoiceCreateRequest,
+    service: InvoiceService = Depends(get_invoice_service)
+):
+    """
+    Crear una nueva factura (sin items).
+    
+    **Cuerpo de la solicitud:**
+    - Todos los campos de la factura (ver modelo)
+    
+    **Retorna:**
+    - Factura creada con ID generado
+    
+    **Nota:**
+    - Para crear factura con items, usar el endpoint `/invoices/with-items`
+    - Acepta `Idempotency-Key` para reintentos seguros (ver `/invoices/with-items`)
+    """
+    invoice = await service.create(request)
+    return model_response(invoice, status.HTTP_201_CREATED)
+
+
+# ============================================
+# CREATE INVOICE WITH ITEMS
+# ============================================
+
+@router.post(
+    "/invoices/with-items",
+    response_model=InvoiceResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Crear factura con items",
+    description="Crear una nueva factura con items anidados. El total se calculará automáticamente si no se proporciona",
+    responses={
+        201: {"description": "Factura creada exitosamente con items"},
+        400: {"description": "Datos de solicitud inválidos o total no coincide con items"},
+        500: {"description": "Error interno del servidor"}
+    }
+)
+async def create_invoice_with_items(
+    request: InvoiceCreateWithItemsRequest,
+    service: InvoiceService = Depends(get_invoice_service)
+):
+    """
+    Crear una nueva factura con items anidados.
+    
+    **Cuerpo de la solicitud:**
+    - Todos los campos de la factura
+    - **items**: Lista de items de la factura (mínimo 1)
+    
+    **Cálculos automáticos:**
+    - Si `total_amount` no se proporciona, se calculará sumando los totales de los items
+    - Si se proporciona `total_amount`, debe coincidir con la suma de items (tolerancia 0.01)
+    - Los items calcularán automáticamente `subtotal`, `tax_amount` y `total_amount` si no se proporcionan
+    
+    **Idempotencia:**
+    - Con el encabezado `Idempotency-Key`, un reintento con la misma clave y
+      el mismo cuerpo (dentro de 5 minutos) devuelve la respuesta original
+      sin crear otra factura (`Idempotent-Replayed: true`)
+    - La misma clave con un cuerpo distinto responde 422
+    
+    **Retorna:**
+    - Factura creada con items incluidos
+    """
+    invoice = await service.create_with_items(request)
+    return model_response(invoice, status.HTTP_201_CREATED)
+
+
+# ============================================
+# UPDATE INVOICE
+# ============================================
+
+@router.put(
+    "/invoices/{invoice_id}",
+    response_model=InvoiceResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Actualizar factura",
+    description="Actualizar una factura existente con nuevos datos",
+    responses={
+        200: {"description": "Factura actualizada exitosamente"},
+        400: {"description": "Datos de solicitud inválidos"},
+        404: {"description": "Factura no encontrada"},
+        500: {"description": "Error interno del servidor"}
+    }
+)
+async def update_invoice(
+    invoice_id: int = Path(..., ge=1, description="Identificador único de la factura"),
+    request: InvoiceUpdateRequest = ...,
+    service: InvoiceService = Depends(get_invoice_service)
+):
+    """
+    Actualizar una factura existente.
+    
+    **Parámetros de ruta:**
+    - **invoice_id**: Identificador único de la factura a actualizar
+    
+    **Cuerpo de la solicitud:**
+    - Todos los campos son opcionales
+    - Solo los campos proporcionados serán actualizados
+    
+    **Retorna:**
+    - Datos actualizados de la factura
+    
+    **Errores:**
+    - **404**: Factura no encontrada
+    - **400**: Datos inválidos (ej: departure_date < arrival_date)
+    """
+    invoice = await service.update(invoice_id, request)
+    
+    if not invoice:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Factura con id {invoice_id} no encontrada"
+        )
+    
+    return model_response(invoice)
+
+
+# ============================================
+# DELETE INVOICE
+# ============================================
+
+@router.delete(
+    "/invoices/{invoice_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    response_class=Response,
+    summary="Eliminar factura",
+    description="Eliminar una factura (hard delete - también elimina sus items)",
+    responses={
+        204: {"description": "Factura eliminada exitosamente"},
+        404: {"description": "Factura no encontrada"},
+        500: {"description": "Error interno del servidor"}
+    }
+)
+async def delete_invoice(
+    invoice_id: int = Path(..., ge=1, description="Identificador único de la factura"),
+    service: InvoiceService = Depends(get_invoice_service)
+):
+    """
+    Eliminar una factura (hard delete).
+    
+    **Parámetros de ruta:**
+    - **invoice_id**: Identificador único de la factura a eliminar
+    
+    **Nota:**
+    - Esto realiza un hard delete (elimina permanentemente)
+    - Los items asociados se eliminarán automáticamente (CASCADE)
+    
+    **Errores:**
+    - **404**: Factura no encontrada
+    """
+    deleted = await service.delete(invoice_id)
+    
+    if not deleted:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Factura con id {invoice_id} no encontrada"
+        )
+    
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,300 +1,396 @@
-"""
-InvoiceItem routes module with FastAPI endpoints.
-
-This module demonstrates:
-- RESTful API design for nested resources
-- Proper HTTP methods and status codes
-- Request/response validation
-- Error handling
-- Documentation with OpenAPI
-- Dependency injection
-"""
-
-import logging
-from fastapi import APIRouter, Depends, HTTPException, Path, status
-from sqlalchemy.orm import Session
-from app.database.connection import get_db
-from app.services.invoice_item_service import InvoiceItemService
-from app.models.invoice_item import (
-    InvoiceItemCreateRequest,
-    InvoiceItemUpdateRequest,
-    InvoiceItemResponse,
-    InvoiceItemListResponse
-)
-
-logger = logging.getLogger("uvicorn")
-
-# Create router
-router = APIRouter()
-
-
-# ============================================
-# LIST INVOICE ITEMS BY INVOICE ID
-# ============================================
-
-@router.get(
-    "/invoices/{invoice_id}/items",
-    response_model=InvoiceItemListResponse,
-    status_code=status.HTTP_200_OK,
-    summary="Listar items de una factura",
-    description="Obtener todos los items asociados a una factura específica",
-    responses={
-        200: {"description": "Items encontrados"},
-        404: {"description": "Factura no encontrada"},
-        500: {"description": "Error interno del servidor"}
-    }
-)
-async def get_invoice_items(
-    invoice_id: int = Path(..., ge=1, description="Identificador único de la factura"),
-    db: Session = Depends(get_db)
-):
-    """
-    Obtener todos los items de una factura.
-    
-    **Parámetros de ruta:**
-    - **invoice_id**: Identificador único de la factura
-    
-    **Retorna:**
-    - Lista de items de la factura
-    
-    **Errores:**
-    - **404**: Factura no encontrada
-    """
-    try:
-        service = InvoiceItemService(db)
-        result = service.get_by_invoice_id(invoice_id)
-        return result
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=str(e)
-        )
-    except Exception as e:
-        logger.error(f"Error in get_invoice_items({invoice_id}): {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor al obtener items"
-        )
-
-
-# ============================================
-# GET SINGLE INVOICE ITEM
-# ============================================
-
-@router.get(
-    "/invoice-items/{item_id}",
-    response_model=InvoiceItemResponse,
-    status_code=status.HTTP_200_OK,
-    summary="Obtener item por ID",
-    description="Obtener un item específico por su identificador único",
-    responses={
-        200: {"description": "Item encontrado"},
-        404: {"description": "Item no encontrado"},
-        500: {"description": "Error interno del servidor"}
-    }
-)
-async def get_invoice_item(
-    item_id: int = Path(..., ge=1, description="Identificador único del item"),
-    db: Session = Depends(get_db)
-):
-    """
-    Obtener un item específico por ID.
-    
-    **Parámetros de ruta:**
-    - **item_id**: Identificador único del item
-    
-    **Retorna:**
-    - Detalles del item
-    
-    **Errores:**
-    - **404**: Item no encontrado
-    """
-    try:
-        service = InvoiceItemService(db)
-        item = service.get_by_id(item_id)
-        
-        if not item:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Item con id {item_id} no encontrado"
-            )
-        
-        return item
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in get_invoice_item({item_id}): {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor al obtener item"
-        )
-
-
-# ============================================
-# CREATE INVOICE ITEM
-# ============================================
-
-@router.post(
-    "/invoices/{invoice_id}/items",
-    response_model=InvoiceItemResponse,
-    status_code=status.HTTP_201_CREATED,
-    summary="Crear item para una factura",
-    description="Crear un nuevo item para una factura específica. El total de la factura se recalculará automáticamente",
-    responses={
-        201: {"description": "Item creado exitosamente"},
-        400: {"description": "Datos de solicitud inválidos"},
-        404: {"description": "Factura no encontrada"},
-        500: {"description": "Error interno del servidor"}
-    }
-)
-async def create_invoice_item(
-    invoice_id: int = Path(..., ge=1, description="Identificador único de la factura"),
-    request: InvoiceItemCreateRequest = ...,
-    db: Session = Depends(get_db)
-):
-    """
-    Crear un nuevo item para una factura.
-    
-    **Parámetros de ruta:**
-    - **invoice_id**: Identificador único de la factura
-    
-    **Cuerpo de la solicitud:**
-    - Todos los campos del item (ver modelo)
-    
-    **Cálculos automáticos:**
-    - Si no se proporcionan `subtotal`, `tax_amount` o `total_amount`, se calcularán automáticamente
-    - El `total_amount` de la factura se recalculará automáticamente
-    
-    **Retorna:**
-    - Item creado con ID generado
-    """
-    try:
-        service = InvoiceItemService(db)
-        item = service.create(invoice_id, request)
-        return item
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=str(e)
-        )
-    except Exception as e:
-        logger.error(f"Error in create_invoice_item: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor al crear item"
-        )
-
-
-# ============================================
-# UPDATE INVOICE ITEM
-# ============================================
-
-@router.put(
-    "/invoice-items/{item_id}",
-    response_model=InvoiceItemResponse,
-    status_code=status.HTTP_200_OK,
-    summary="Actualizar item",
-    description="Actualizar un item existente. El total de la factura se recalculará automáticamente",
-    responses={
-        200: {"description": "Item actualizado exitosamente"},
-        404: {"description": "Item no encontrado"},
-        500: {"description": "Error interno del servidor"}
-    }
-)
-async def update_invoice_item(
-    item_id: int = Path(..., ge=1, description="Identificador único del item"),
-    request: InvoiceItemUpdateRequest = ...,
-    db: Session = Depends(get_db)
-):
-    """
-    Actualizar un item existente.
-    
-    **Parámetros de ruta:**
-    - **item_id**: Identificador único del item a actualizar
-    
-    **Cuerpo de la solicitud:**
-    - Todos los campos son opcionales
-    - Solo los campos proporcionados serán actualizados
-    
-    **Cálculos automáticos:**
-    - Si se actualizan `quantity`, `unit_price`, `subtotal` o `tax_rate`, se recalcularán los totales
-    - El `total_amount` de la factura se recalculará automáticamente
-    
-    **Retorna:**
-    - Datos actualizados del item
-    
-    **Errores:**
-    - **404**: Item no encontrado
-    """
-    try:
-        service = InvoiceItemService(db)
-        item = service.update(item_id, request)
-        
-        if not item:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Item con id {item_id} no encontrado"
-            )
-        
-        return item
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in update_invoice_item({item_id}): {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor al actualizar item"
-        )
-
-
-# ============================================
-# DELETE INVOICE ITEM
-# ============================================
-
-@router.delete(
-    "/invoice-items/{item_id}",
-    status_code=status.HTTP_204_NO_CONTENT,
-    summary="Eliminar item",
-    description="Eliminar un item. El total de la factura se recalculará automáticamente",
-    responses={
-        204: {"description": "Item eliminado exitosamente"},
-        404: {"description": "Item no encontrado"},
-        500: {"description": "Error interno del servidor"}
-    }
-)
-async def delete_invoice_item(
-    item_id: int = Path(..., ge=1, description="Identificador único del item"),
-    db: Session = Depends(get_db)
-):
-    """
-    Eliminar un item.
-    
-    **Parámetros de ruta:**
-    - **item_id**: Identificador único del item a eliminar
-    
-    **Nota:**
-    - El `total_amount` de la factura se recalculará automáticamente después de eliminar el item
-    
-    **Errores:**
-    - **404**: Item no encontrado
-    """
-    try:
-        service = InvoiceItemService(db)
-        deleted = service.delete(item_id)
-        
-        if not deleted:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Item con id {item_id} no encontrado"
-            )
-        
-        return None  # 204 No Content
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in delete_invoice_item({item_id}): {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor al eliminar item"
-        )
-
+"""
+InvoiceItem routes module with FastAPI endpoints.
+
+This module demonstrates:
+- RESTful API design for nested resources
+- Proper HTTP methods and status codes
+- Request/response validation
+- Error handling
+- Documentation with OpenAPI
+- Dependency injection
+"""
+
+from typing import AsyncIterator
+from fastapi import APIRouter, Depends, HTTPException, Path, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.routes.errors import NotFoundErrorRoute
+from app.routes.responses import model_response
+from app.database.connection import get_db, get_session_factory_ro
+from app.services.invoice_item_service import InvoiceItemService, InvoiceItemCheckError
+from app.models.invoice_item import (
+    InvoiceItemCreateRequest,
+    InvoiceItemBatchCreateRequest,
+    InvoiceItemBatchDeleteRequest,
+    InvoiceItemUpdateRequest,
+    InvoiceItemResponse,
+    InvoiceItemListResponse,
+    InvoiceItemBatchDeleteResponse
+)
+
+# Create router (ValueError from the service means the invoice was not found -> 404;
+# the create handlers turn InvoiceItemCheckError into a 400 first)
+router = APIRouter(route_class=NotFoundErrorRoute)
+
+
+# ============================================
+# DEPENDENCIES
+# ============================================
+
+async def get_invoice_item_service(db: AsyncSession = Depends(get_db)) -> InvoiceItemService:
+    """Dependency: InvoiceItemService bound to the request's session."""
+    return InvoiceItemService(db)
+
+
+# ============================================
+# LIST INVOICE ITEMS BY INVOICE ID
+# ============================================
+
+@router.get(
+    "/invoices/{invoice_id}/items",
+    response_model=InvoiceItemListResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Listar items de una factura",
+    description="Obtener todos los items asociados a una factura específica",
+    responses={
+        200: {"description": "Items encontrados"},
+        404: {"description": "Factura no encontrada"},
+        500: {"description": "Error interno del servidor"}
+    }
+)
+async def get_invoice_items(
+    invoice_id: int = Path(..., ge=1, description="Identificador único de la factura"),
+    service: InvoiceItemService = Depends(get_invoice_item_service)
+):
+    """
+    Obtener todos los items de una factura.
+    
+    **Parámetros de ruta:**
+    - **invoice_id**: Identificador único de la factura
+    
+    **Retorna:**
+    - Lista de items de la factura
+    
+    **Errores:**
+    - **404**: Factura no encontrada
+    """
+    result = await service.get_by_invoice_id(invoice_id)
+    return model_response(result)
+
+
+# ============================================
+# EXPORT INVOICE ITEMS (NDJSON stream)
+# ============================================
+
+@router.get(
+    "/invoices/{invoice_id}/items/export",
+    response_class=StreamingResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Exportar items de una factura",
+    description="Exportar los items de una factura como NDJSON, un item por línea (para facturas grandes)",
+    responses={
+        200: {"description": "Flujo application/x-ndjson de items"},
+        404: {"description": "Factura no encontrada"},
+        500: {"description": "Error interno del servidor"}
+    }
+)
+async def export_invoice_items(
+    invoice_id: int = Path(..., ge=1, description="Identificador único de la factura"),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory_ro)
+):
+    """
+    Exportar en streaming los items de una factura.
+    
+    **Parámetros de ruta:**
+    - **invoice_id**: Identificador único de la factura
+    
+    **Retorna:**
+    - Un item JSON por línea, en orden de ID
+    
+    Las filas se leen por lotes (yield_per) y cada línea se envía al
+    serializarse: la memoria no crece con el número de items.
+    
+    **Errores:**
+    - **404**: Factura no encontrada
+    """
+    # El 404 se decide antes de empezar a enviar el cuerpo
+    async with session_factory() as db:
+        if not await InvoiceItemService(db).invoice_exists(invoice_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Factura con id {invoice_id} no encontrada"
+            )
+    
+    async def ndjson_lines() -> AsyncIterator[bytes]:
+        # Sesión propia: las dependencias se cierran antes de enviar el cuerpo
+        async with session_factory() as db:
+            async for item in InvoiceItemService(db).iter_by_invoice_id(invoice_id):
+                yield item.__pydantic_serializer__.to_json(item) + b"\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
+# ============================================
+# GET SINGLE INVOICE ITEM
+# ============================================
+
+@router.get(
+    "/invoice-items/{item_id}",
+    response_model=InvoiceItemResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Obtener item por ID",
+    description="Obtener un item específico por su identificador único",
+    responses={
+        200: {"description": "Item encontrado"},
+        404: {"description": "Item no encontrado"},
+        500: {"description": "Error interno del servidor"}
+    }
+)
+async def get_invoice_item(
+    item_id: int = Path(..., ge=1, description="Identificador único del item"),
+    service: InvoiceItemService = Depends(get_invoice_item_service)
+):
+    """
+    Obtener un item específico por ID.
+    
+    **Parámetros de ruta:**
+    - **item_id**: Identificador único del item
+    
+    **Retorna:**
+    - Detalles del item
+    
+    **Errores:**
+    - **404**: Item no encontrado
+    """
+    item = await service.get_by_id(item_id)
+    
+    if not item:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Item con id {item_id} no encontrado"
+        )
+    
+    return model_response(item)
+
+
+# ============================================
+# CREATE INVOICE ITEM
+# ============================================
+
+@router.post(
+    "/invoices/{invoice_id}/items",
+    response_model=InvoiceItemResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Crear item para una factura",
+    description="Crear un nuevo item para una factura específica. El total de la factura se recalculará automáticamente",
+    responses={
+        201: {"description": "Item creado exitosamente"},
+        400: {"description": "Datos de solicitud inválidos"},
+        404: {"description": "Factura no encontrada"},
+        500: {"description": "Error interno del servidor"}
+    }
+)
+async def create_invoice_item(
+    invoice_id: int = Path(..., ge=1, description="Identificador único de la factura"),
+    request: InvoiceItemCreateRequest = ...,
+    service: InvoiceItemService = Depends(get_invoice_item_service)
+):
+    """
+    Crear un nuevo item para una factura.
+    
+    **Parámetros de ruta:**
+    - **invoice_id**: Identificador único de la factura
+    
+    **Cuerpo de la solicitud:**
+    - Todos los campos del item (ver modelo)
+    
+    **Cálculos automáticos:**
+    - Si no se proporcionan `subtotal`, `tax_amount` o `total_amount`, se calcularán automáticamente
+    - El `total_amount` de la factura se recalculará automáticamente
+    
+    **Retorna:**
+    - Item creado con ID generado
+    """
+    try:
+        item = await service.create(invoice_id, request)
+    except InvoiceItemCheckError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return model_response(item, status.HTTP_201_CREATED)
+
+
+# ============================================
+# CREATE INVOICE ITEMS (batch)
+# ============================================
+
+@router.post(
+    "/invoices/{invoice_id}/items/batch",
+    response_model=InvoiceItemListResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Crear varios items para una factura",
+    description="Crear varios items de una factura en una sola operación. El total de la factura se recalculará una sola vez",
+    responses={
+        201: {"description": "Items creados exitosamente"},
+        400: {"description": "Datos de solicitud inválidos"},
+        404: {"description": "Factura no encontrada"},
+        500: {"description": "Error interno del servidor"}
+    }
+)
+async def create_invoice_items_batch(
+    invoice_id: int = Path(..., ge=1, description="Identificador único de la factura"),
+    request: InvoiceItemBatchCreateRequest = ...,
+    service: InvoiceItemService = Depends(get_invoice_item_service)
+):
+    """
+    Crear varios items para una factura.
+    
+    **Parámetros de ruta:**
+    - **invoice_id**: Identificador único de la factura
+    
+    **Cuerpo de la solicitud:**
+    - **items**: Lista de items (mínimo 1), mismos campos que al crear un item
+    
+    **Cálculos automáticos:**
+    - Igual que al crear un item; el `total_amount` de la factura se
+      recalcula una vez para todo el lote
+    - Todos los items se crean o ninguno
+    
+    **Retorna:**
+    - Todos los items de la factura, incluidos los creados
+    """
+    try:
+        result = await service.create_many(invoice_id, request.items)
+    except InvoiceItemCheckError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return model_response(result, status.HTTP_201_CREATED)
+
+
+# ============================================
+# UPDATE INVOICE ITEM
+# ============================================
+
+@router.put(
+    "/invoice-items/{item_id}",
+    response_model=InvoiceItemResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Actualizar item",
+    description="Actualizar un item existente. El total de la factura se recalculará automáticamente",
+    responses={
+        200: {"description": "Item actualizado exitosamente"},
+        404: {"description": "Item no encontrado"},
+        500: {"description": "Error interno del servidor"}
+    }
+)
+async def update_invoice_item(
+    item_id: int = Path(..., ge=1, description="Identificador único del item"),
+    request: InvoiceItemUpdateRequest = ...,
+    service: InvoiceItemService = Depends(get_invoice_item_service)
+):
+    """
+    Actualizar un item existente.
+    
+    **Parámetros de ruta:**
+    - **item_id**: Identificador único del item a actualizar
+    
+    **Cuerpo de la solicitud:**
+    - Todos los campos son opcionales
+    - Solo los campos proporcionados serán actualizados
+    
+    **Cálculos automáticos:**
+    - Si se actualizan `quantity`, `unit_price`, `subtotal` o `tax_rate`, se recalcularán los totales
+    - El `total_amount` de la factura se recalculará automáticamente
+    
+    **Retorna:**
+    - Datos actualizados del item
+    
+    **Errores:**
+    - **404**: Item no encontrado
+    """
+    item = await service.update(item_id, request)
+    
+    if not item:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Item con id {item_id} no encontrado"
+        )
+    
+    return model_response(item)
+
+
+# ============================================
+# DELETE INVOICE ITEM
+# ============================================
+
+@router.delete(
+    "/invoice-items/{item_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    response_class=Response,
+    summary="Eliminar item",
+    description="Eliminar un item. El total de la factura se recalculará automáticamente",
+    responses={
+        204: {"description": "Item eliminado exitosamente"},
+        404: {"description": "Item no encontrado"},
+        500: {"description": "Error interno del servidor"}
+    }
+)
+async def delete_invoice_item(
+    item_id: int = Path(..., ge=1, description="Identificador único del item"),
+    service: InvoiceItemService = Depends(get_invoice_item_service)
+):
+    """
+    Eliminar un item.
+    
+    **Parámetros de ruta:**
+    - **item_id**: Identificador único del item a eliminar
+    
+    **Nota:**
+    - El `total_amount` de la factura se recalculará automáticamente después de eliminar el item
+    
+    **Errores:**
+    - **404**: Item no encontrado
+    """
+    deleted = await service.delete(item_id)
+    
+    if not deleted:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Item con id {item_id} no encontrado"
+        )
+    
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+# ============================================
+# DELETE INVOICE ITEMS (batch)
+# ============================================
+
+@router.post(
+    "/invoice-items/batch-delete",
+    response_model=InvoiceItemBatchDeleteResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Eliminar varios items",
+    description="Eliminar varios items en una sola operación. Los totales de las facturas afectadas se recalcularán una sola vez",
+    responses={
+        200: {"description": "Items eliminados"},
+        500: {"description": "Error interno del servidor"}
+    }
+)
+async def delete_invoice_items_batch(
+    request: InvoiceItemBatchDeleteRequest,
+    service: InvoiceItemService = Depends(get_invoice_item_service)
+):
+    """
+    Eliminar varios items.
+    
+    **Cuerpo de la solicitud:**
+    - **ids**: IDs de los items a eliminar (mínimo 1); pueden ser de facturas distintas
+    
+    **Nota:**
+    - Los IDs inexistentes se ignoran
+    - El `total_amount` de cada factura afectada se recalcula una vez para todo el lote
+    - Todos los items se eliminan o ninguno
+    
+    **Retorna:**
+    - Número de items eliminados
+    """
+    deleted = await service.delete_many(request.ids)
+    return model_response(InvoiceItemBatchDeleteResponse(deleted=deleted))
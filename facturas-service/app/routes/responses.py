@@ -0,0 +1,66 @@
+"""
+Response helpers shared by the route modules.
+
+This module implements:
+- model_response: JSON Response rendered by the model's compiled serializer
+- make_etag / etag_matches: validators for conditional GETs (304)
+"""
+
+import hashlib
+from typing import Optional
+from fastapi import Response, status
+from pydantic import BaseModel
+
+
+def model_response(model: BaseModel, status_code: int = status.HTTP_200_OK) -> Response:
+    """
+    Render an already-validated model as a JSON Response.
+
+    Calls the model's pydantic-core SchemaSerializer directly: it returns
+    bytes, where model_dump_json() decodes to str only for the Response to
+    encode it back. FastAPI's response_model validation is skipped too.
+
+    Args:
+        model: Response model built by the service layer
+        status_code: HTTP status code (e.g. 201 for creates)
+
+    Returns:
+        Response: application/json body
+    """
+    return Response(
+        content=model.__pydantic_serializer__.to_json(model),
+        media_type="application/json",
+        status_code=status_code
+    )
+
+
+def make_etag(*parts: object) -> str:
+    """
+    Build a strong ETag (quoted) from the values that identify a representation.
+
+    Args:
+        parts: e.g. the resource id, its updated_at and any query option
+            that changes the body
+
+    Returns:
+        str: quoted 16-hex-digit blake2b digest
+    """
+    key = ":".join(str(part) for part in parts).encode()
+    return f'"{hashlib.blake2b(key, digest_size=8).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against the current ETag.
+
+    Accepts "*", comma-separated lists and weak (W/) validators, which
+    compare equal for GET per RFC 9110.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
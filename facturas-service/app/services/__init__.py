@@ -1,9 +1,9 @@
-"""
-Services package for facturas service.
-"""
-
-from app.services.invoice_service import InvoiceService
-from app.services.invoice_item_service import InvoiceItemService
-
-__all__ = ["InvoiceService", "InvoiceItemService"]
-
+"""
+Services package for facturas service.
+"""
+
+from app.services.invoice_service import InvoiceService
+from app.services.invoice_item_service import InvoiceItemService, InvoiceItemCheckError
+
+__all__ = ["InvoiceService", "InvoiceItemService", "InvoiceItemCheckError"]
+
@@ -1,331 +1,599 @@
-"""
-InvoiceItem service layer with business logic.
-
-This module demonstrates:
-- Service layer pattern (separation of concerns)
-- CRUD operations for invoice items
-- Automatic recalculation of invoice totals
-- Relationship validation
-"""
-
-import logging
-from typing import Optional, List
-from decimal import Decimal
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.models.invoice import Invoice
-from app.models.invoice_item import (
-    InvoiceItem,
-    InvoiceItemCreateRequest,
-    InvoiceItemUpdateRequest,
-    InvoiceItemResponse,
-    InvoiceItemListResponse
-)
-from app.services.invoice_service import InvoiceService
-
-logger = logging.getLogger("uvicorn")
-
-
-class InvoiceItemService:
-    """
-    Business logic layer for InvoiceItem entity operations.
-    
-    This service handles:
-    - CRUD operations for invoice items
-    - Automatic recalculation of invoice totals
-    - Relationship validation
-    """
-
-    def __init__(self, db: Session):
-        """
-        Initialize service with database session.
-        
-        Args:
-            db: SQLAlchemy database session
-        """
-        self.db = db
-        self.invoice_service = InvoiceService(db)
-
-    def _calculate_totals(
-        self,
-        quantity: Optional[Decimal],
-        unit_price: Optional[Decimal],
-        subtotal: Optional[Decimal],
-        tax_rate: Optional[Decimal],
-        tax_amount: Optional[Decimal],
-        total_amount: Optional[Decimal]
-    ) -> tuple[Decimal, Decimal, Decimal]:
-        """
-        Calculate subtotal, tax_amount, and total_amount for an item.
-        
-        Args:
-            quantity: Item quantity
-            unit_price: Unit price
-            subtotal: Provided subtotal (optional)
-            tax_rate: Tax rate percentage
-            tax_amount: Provided tax amount (optional)
-            total_amount: Provided total amount (optional)
-            
-        Returns:
-            tuple: (subtotal, tax_amount, total_amount)
-        """
-        # Calculate subtotal
-        if subtotal is not None:
-            calculated_subtotal = subtotal
-        elif quantity is not None and unit_price is not None:
-            calculated_subtotal = quantity * unit_price
-        else:
-            calculated_subtotal = Decimal('0')
-        
-        # Calculate tax_amount
-        if tax_amount is not None:
-            calculated_tax_amount = tax_amount
-        elif tax_rate is not None and calculated_subtotal > 0:
-            calculated_tax_amount = calculated_subtotal * (tax_rate / Decimal('100'))
-        else:
-            calculated_tax_amount = Decimal('0')
-        
-        # Calculate total_amount
-        if total_amount is not None:
-            calculated_total = total_amount
-        else:
-            calculated_total = calculated_subtotal + calculated_tax_amount
-        
-        return calculated_subtotal, calculated_tax_amount, calculated_total
-
-    def _recalculate_invoice_total(self, invoice_id: int) -> None:
-        """
-        Recalculate and update invoice total_amount based on items.
-        
-        Args:
-            invoice_id: Invoice ID
-        """
-        try:
-            items = self.db.query(InvoiceItem).filter(
-                InvoiceItem.invoice_id == invoice_id
-            ).all()
-            
-            total = sum(item.total_amount for item in items)
-            
-            # Update invoice total
-            invoice = self.db.query(Invoice).filter(Invoice.id == invoice_id).first()
-            if invoice:
-                invoice.total_amount = total
-                self.db.commit()
-                logger.info(f"✅ Recalculated invoice {invoice_id} total: {total}")
-        except Exception as e:
-            logger.error(f"Error recalculating invoice total: {str(e)}")
-            raise
-
-    def get_by_invoice_id(self, invoice_id: int) -> InvoiceItemListResponse:
-        """
-        Get all items for an invoice.
-        
-        Args:
-            invoice_id: Invoice ID
-            
-        Returns:
-            InvoiceItemListResponse: List of items
-        """
-        try:
-            # Verify invoice exists
-            invoice = self.db.query(Invoice).filter(Invoice.id == invoice_id).first()
-            if not invoice:
-                raise ValueError(f"Invoice with id {invoice_id} not found")
-            
-            items = self.db.query(InvoiceItem).filter(
-                InvoiceItem.invoice_id == invoice_id
-            ).all()
-            
-            return InvoiceItemListResponse(
-                items=[InvoiceItemResponse.model_validate(item) for item in items],
-                total=len(items),
-                invoice_id=invoice_id
-            )
-            
-        except Exception as e:
-            logger.error(f"Error in get_by_invoice_id({invoice_id}): {str(e)}")
-            raise
-
-    def get_by_id(self, item_id: int) -> Optional[InvoiceItemResponse]:
-        """
-        Get invoice item by ID.
-        
-        Args:
-            item_id: Invoice item ID
-            
-        Returns:
-            InvoiceItemResponse or None if not found
-        """
-        try:
-            item = self.db.query(InvoiceItem).filter(
-                InvoiceItem.id == item_id
-            ).first()
-            
-            if item:
-                return InvoiceItemResponse.model_validate(item)
-            return None
-            
-        except Exception as e:
-            logger.error(f"Error in get_by_id({item_id}): {str(e)}")
-            raise
-
-    def create(self, invoice_id: int, request: InvoiceItemCreateRequest) -> InvoiceItemResponse:
-        """
-        Create new invoice item.
-        
-        Args:
-            invoice_id: Invoice ID
-            request: Invoice item creation data
-            
-        Returns:
-            InvoiceItemResponse: Created item
-            
-        Raises:
-            ValueError: If invoice doesn't exist
-        """
-        try:
-            # Verify invoice exists
-            invoice = self.db.query(Invoice).filter(Invoice.id == invoice_id).first()
-            if not invoice:
-                raise ValueError(f"Invoice with id {invoice_id} not found")
-            
-            # Calculate totals
-            subtotal, tax_amount, total_amount = self._calculate_totals(
-                request.quantity,
-                request.unit_price,
-                request.subtotal,
-                request.tax_rate,
-                request.tax_amount,
-                request.total_amount
-            )
-            
-            # Create item
-            item = InvoiceItem(
-                invoice_id=invoice_id,
-                description=request.description,
-                unit=request.unit,
-                quantity=request.quantity,
-                unit_price=request.unit_price,
-                subtotal=subtotal,
-                tax_rate=request.tax_rate,
-                tax_amount=tax_amount,
-                total_amount=total_amount
-            )
-            
-            self.db.add(item)
-            self.db.commit()
-            self.db.refresh(item)
-            
-            # Recalculate invoice total
-            self._recalculate_invoice_total(invoice_id)
-            
-            logger.info(f"✅ Created invoice item {item.id} for invoice {invoice_id}")
-            return InvoiceItemResponse.model_validate(item)
-            
-        except ValueError as e:
-            self.db.rollback()
-            raise
-        except Exception as e:
-            self.db.rollback()
-            logger.error(f"Error creating invoice item: {str(e)}")
-            raise
-
-    def update(self, item_id: int, request: InvoiceItemUpdateRequest) -> Optional[InvoiceItemResponse]:
-        """
-        Update existing invoice item.
-        
-        Args:
-            item_id: Invoice item ID to update
-            request: Update data
-            
-        Returns:
-            InvoiceItemResponse or None if not found
-        """
-        try:
-            # Find item
-            item = self.db.query(InvoiceItem).filter(
-                InvoiceItem.id == item_id
-            ).first()
-            
-            if not item:
-                return None
-            
-            # Get current values for calculation
-            quantity = request.quantity if request.quantity is not None else item.quantity
-            unit_price = request.unit_price if request.unit_price is not None else item.unit_price
-            subtotal = request.subtotal if request.subtotal is not None else item.subtotal
-            tax_rate = request.tax_rate if request.tax_rate is not None else item.tax_rate
-            tax_amount = request.tax_amount if request.tax_amount is not None else item.tax_amount
-            total_amount = request.total_amount if request.total_amount is not None else item.total_amount
-            
-            # Recalculate totals if needed
-            if any([
-                request.quantity is not None,
-                request.unit_price is not None,
-                request.subtotal is not None,
-                request.tax_rate is not None
-            ]):
-                subtotal, tax_amount, total_amount = self._calculate_totals(
-                    quantity, unit_price, subtotal, tax_rate, tax_amount, total_amount
-                )
-            
-            # Update fields
-            update_data = request.model_dump(exclude_unset=True)
-            for field, value in update_data.items():
-                setattr(item, field, value)
-            
-            # Update calculated fields
-            item.subtotal = subtotal
-            item.tax_amount = tax_amount
-            item.total_amount = total_amount
-            
-            self.db.commit()
-            self.db.refresh(item)
-            
-            # Recalculate invoice total
-            self._recalculate_invoice_total(item.invoice_id)
-            
-            logger.info(f"✅ Updated invoice item {item_id}")
-            return InvoiceItemResponse.model_validate(item)
-            
-        except Exception as e:
-            self.db.rollback()
-            logger.error(f"Error updating invoice item {item_id}: {str(e)}")
-            raise
-
-    def delete(self, item_id: int) -> bool:
-        """
-        Delete invoice item.
-        
-        Args:
-            item_id: Invoice item ID to delete
-            
-        Returns:
-            bool: True if deleted, False if not found
-        """
-        try:
-            item = self.db.query(InvoiceItem).filter(
-                InvoiceItem.id == item_id
-            ).first()
-            
-            if not item:
-                return False
-            
-            invoice_id = item.invoice_id
-            
-            # Delete item
-            self.db.delete(item)
-            self.db.commit()
-            
-            # Recalculate invoice total
-            self._recalculate_invoice_total(invoice_id)
-            
-            logger.info(f"🗑️  Deleted invoice item {item_id}")
-            return True
-            
-        except Exception as e:
-            self.db.rollback()
-            logger.error(f"Error deleting invoice item {item_id}: {str(e)}")
-            raise
-
+"""
+InvoiceItem service layer with business logic.
+
+This module demonstrates:
+- Service layer pattern (separation of concerns)
+- CRUD operations for invoice items
+- Automatic recalculation of invoice totals
+- Relationship validation
+"""
+
+import logging
+from typing import Optional, List, AsyncIterator, Collection
+from decimal import Decimal
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, delete, exists, func
+from sqlalchemy.exc import IntegrityError
+from app.database.types import to_decimal, to_money, round_to, CENTS, QUANTITY_STEP, RATE_STEP
+from app.models.invoice import Invoice, INVOICE_UPDATED_AT_NOW
+from app.services.invoice_service import EXPORT_BATCH_SIZE
+from app.models.invoice_item import (
+    InvoiceItem,
+    InvoiceItemCreateRequest,
+    InvoiceItemUpdateRequest,
+    InvoiceItemResponse,
+    InvoiceItemListResponse,
+    item_response_from_row,
+    item_responses_from_rows,
+    ITEM_RESPONSE_COLUMNS
+)
+
+logger = logging.getLogger("uvicorn")
+
+# Shared constants: no Decimal allocation per calculation
+_ZERO = Decimal(0)
+_PERCENT = Decimal(100)
+
+# MySQL error code for a CHECK constraint violation (IntegrityError.orig.args[0]);
+# 1452 is the invoice_id FK. SQLite only reports it in the message.
+_MYSQL_CHECK_VIOLATION = 3819
+
+
+class InvoiceItemCheckError(ValueError):
+    """Item values rejected by a CHECK constraint on invoice_items (400, not 404)."""
+
+
+def _is_check_violation(error: IntegrityError) -> bool:
+    args = getattr(error.orig, "args", ())
+    if args and args[0] == _MYSQL_CHECK_VIOLATION:
+        return True
+    return "CHECK constraint failed" in str(error.orig)
+
+
+class InvoiceItemService:
+    """
+    Business logic layer for InvoiceItem entity operations.
+    
+    This service handles:
+    - CRUD operations for invoice items
+    - Automatic recalculation of invoice totals
+    - Relationship validation
+    """
+
+    __slots__ = ("db",)
+
+    def __init__(self, db: AsyncSession):
+        """
+        Initialize service with database session.
+        
+        Args:
+            db: SQLAlchemy async database session
+        """
+        self.db = db
+
+    def _calculate_totals(
+        self,
+        quantity: Optional[Decimal],
+        unit_price: Optional[Decimal],
+        subtotal: Optional[Decimal],
+        tax_rate: Optional[Decimal],
+        tax_amount: Optional[Decimal],
+        total_amount: Optional[Decimal]
+    ) -> tuple[Decimal, Decimal, Decimal]:
+        """
+        Calculate subtotal, tax_amount, and total_amount for an item.
+        
+        Args:
+            quantity: Item quantity
+            unit_price: Unit price
+            subtotal: Provided subtotal (optional)
+            tax_rate: Tax rate percentage
+            tax_amount: Provided tax amount (optional)
+            total_amount: Provided total amount (optional)
+            
+        Returns:
+            tuple: (subtotal, tax_amount, total_amount), rounded to cents
+        """
+        # Each amount: the provided value, else computed from the others
+        if subtotal is None:
+            subtotal = quantity * unit_price if quantity is not None and unit_price is not None else _ZERO
+        if tax_amount is None:
+            tax_amount = subtotal * tax_rate / _PERCENT if tax_rate is not None else _ZERO
+        if total_amount is None:
+            total_amount = subtotal + tax_amount
+        
+        return to_money(subtotal), to_money(tax_amount), to_money(total_amount)
+
+    async def _adjust_invoice_total(self, invoice_id: int, delta: Decimal) -> bool:
+        """
+        Add an item change (+ created, - deleted) to invoice total_amount, in the caller's transaction.
+        
+        Args:
+            invoice_id: Invoice ID
+            delta: Amount to add (negative to subtract)
+            
+        Returns:
+            bool: False if the invoice doesn't exist (no row updated)
+        """
+        return await self._adjust_invoice_totals([invoice_id], delta) > 0
+
+    async def _adjust_invoice_totals(self, invoice_ids: Collection[int], delta) -> int:
+        """
+        Add a delta to total_amount of several invoices, in the caller's transaction.
+        
+        One UPDATE ... SET total_amount = total_amount + delta: O(1) per
+        mutation instead of re-summing every item. The UPDATE itself is
+        atomic, but the delta is only right if the item rows it comes from
+        can't change meanwhile: callers computing it from existing items
+        (update, delete, delete_many) must read them with SELECT ... FOR
+        UPDATE first. Nothing is committed here, so the item changes and
+        the new totals commit (or roll back) together.
+        
+        Args:
+            invoice_ids: Invoice IDs
+            delta: Decimal, or a scalar subquery correlated to Invoice for
+                per-invoice amounts (see delete_many)
+            
+        Returns:
+            int: Number of invoices updated (missing ids are skipped)
+        """
+        # Touch updated_at even when the total is unchanged: it is the
+        # ETag source of GET /invoices/{id}
+        result = await self.db.execute(
+            update(Invoice)
+            .where(Invoice.id.in_(invoice_ids))
+            .values(total_amount=Invoice.total_amount + delta, updated_at=INVOICE_UPDATED_AT_NOW)
+            .execution_options(synchronize_session=False)
+        )
+        # SQL expressions can't be synchronized in Python ("fetch" would add
+        # a SELECT on MySQL); expire copies already loaded in this session
+        # so the next query for them reloads the new total. Note db.get()
+        # returns such a copy without reloading: read total_amount/updated_at
+        # only after a SELECT or refresh().
+        for invoice_id in invoice_ids:
+            invoice = self.db.identity_map.get(self.db.identity_key(Invoice, invoice_id))
+            if invoice is not None:
+                self.db.expire(invoice, ["total_amount", "updated_at"])
+        return result.rowcount
+
+    async def _get_for_update(self, item_id: int) -> Optional[InvoiceItem]:
+        """
+        Load an item with SELECT ... FOR UPDATE (row locked until commit/rollback).
+        
+        populate_existing overwrites a copy already in the identity map, so
+        the values are the ones read under the lock.
+        """
+        result = await self.db.execute(
+            select(InvoiceItem)
+            .where(InvoiceItem.id == item_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        return result.scalars().first()
+
+    async def invoice_exists(self, invoice_id: int) -> bool:
+        """
+        Check whether an invoice exists (SELECT EXISTS, no row loaded).
+        
+        Args:
+            invoice_id: Invoice ID
+            
+        Returns:
+            bool: True if the invoice exists
+        """
+        result = await self.db.execute(select(exists().where(Invoice.id == invoice_id)))
+        return bool(result.scalar())
+
+    async def get_by_invoice_id(self, invoice_id: int) -> InvoiceItemListResponse:
+        """
+        Get all items for an invoice.
+        
+        Args:
+            invoice_id: Invoice ID
+            
+        Returns:
+            InvoiceItemListResponse: List of items
+        """
+        try:
+            # Read-only listing: select just the response columns (no ORM objects)
+            result = await self.db.execute(
+                select(*ITEM_RESPONSE_COLUMNS).where(InvoiceItem.invoice_id == invoice_id)
+            )
+            
+            # All rows in one TypeAdapter pass
+            items = item_responses_from_rows(result.all())
+            
+            # Items imply the invoice exists (FK); only an empty list needs
+            # the existence probe to tell "no items" from "no invoice"
+            if not items and not await self.invoice_exists(invoice_id):
+                raise ValueError(f"Invoice with id {invoice_id} not found")
+            return InvoiceItemListResponse.model_construct(
+                items=items,
+                total=len(items),
+                invoice_id=invoice_id
+            )
+            
+        except Exception as e:
+            logger.error("Error in get_by_invoice_id(%s): %s", invoice_id, e)
+            raise
+
+    async def iter_by_invoice_id(
+        self,
+        invoice_id: int,
+        batch_size: int = EXPORT_BATCH_SIZE
+    ) -> AsyncIterator[InvoiceItemResponse]:
+        """
+        Stream the items of a (large) invoice.
+        
+        Uses a server-side cursor (db.stream + yield_per): one batch of rows
+        is held in memory and built with one adapter pass at a time,
+        instead of the whole list. Doesn't check the invoice exists.
+        
+        Args:
+            invoice_id: Invoice ID
+            batch_size: Rows fetched per round trip
+            
+        Yields:
+            InvoiceItemResponse: Items in id order
+        """
+        result = await self.db.stream(
+            select(*ITEM_RESPONSE_COLUMNS)
+            .where(InvoiceItem.invoice_id == invoice_id)
+            .order_by(InvoiceItem.id)
+            .execution_options(yield_per=batch_size)
+        )
+        async for rows in result.partitions():
+            for item in item_responses_from_rows(rows):
+                yield item
+
+    async def get_by_id(self, item_id: int) -> Optional[InvoiceItemResponse]:
+        """
+        Get invoice item by ID.
+        
+        Args:
+            item_id: Invoice item ID
+            
+        Returns:
+            InvoiceItemResponse or None if not found
+        """
+        try:
+            item = await self.db.get(InvoiceItem, item_id)
+            
+            if item:
+                return item_response_from_row(item)
+            return None
+            
+        except Exception as e:
+            logger.error("Error in get_by_id(%s): %s", item_id, e)
+            raise
+
+    async def create(self, invoice_id: int, request: InvoiceItemCreateRequest) -> InvoiceItemResponse:
+        """
+        Create new invoice item.
+        
+        Args:
+            invoice_id: Invoice ID
+            request: Invoice item creation data
+            
+        Returns:
+            InvoiceItemResponse: Created item
+            
+        Raises:
+            ValueError: If invoice doesn't exist
+        """
+        try:
+            # No existence probe: a missing invoice fails the FK on INSERT,
+            # or (without FK enforcement, e.g. SQLite) updates no invoice row
+            
+            # Inputs rounded to the column scales: the response is built from
+            # this row as stored, without a refresh() SELECT
+            quantity = round_to(request.quantity, QUANTITY_STEP)
+            unit_price = round_to(request.unit_price, CENTS)
+            tax_rate = round_to(request.tax_rate, RATE_STEP)
+            
+            # Calculate totals
+            subtotal, tax_amount, total_amount = self._calculate_totals(
+                quantity,
+                unit_price,
+                request.subtotal,
+                tax_rate,
+                request.tax_amount,
+                request.total_amount
+            )
+            
+            # Create item
+            item = InvoiceItem(
+                invoice_id=invoice_id,
+                description=request.description,
+                unit=request.unit,
+                quantity=quantity,
+                unit_price=unit_price,
+                subtotal=subtotal,
+                tax_rate=tax_rate,
+                tax_amount=tax_amount,
+                total_amount=total_amount
+            )
+            
+            self.db.add(item)
+            await self.db.flush()  # Assigns item.id
+            
+            # Add the item to the invoice total (same transaction)
+            if not await self._adjust_invoice_total(invoice_id, total_amount):
+                raise ValueError(f"Invoice with id {invoice_id} not found")
+            await self.db.commit()
+            
+            logger.info("✅ Created invoice item %s for invoice %s", item.id, invoice_id)
+            return InvoiceItemResponse.model_validate(item)
+            
+        except ValueError as e:
+            await self.db.rollback()
+            raise
+        except IntegrityError as e:
+            # invoice_items has the invoice_id FK and the INVOICE_ITEM_CHECKS
+            await self.db.rollback()
+            if _is_check_violation(e):
+                raise InvoiceItemCheckError(
+                    "Invalid item values: quantity and unit_price must be >= 0, tax_rate between 0 and 100"
+                ) from e
+            raise ValueError(f"Invoice with id {invoice_id} not found") from e
+        except Exception as e:
+            await self.db.rollback()
+            logger.error("Error creating invoice item: %s", e)
+            raise
+
+    async def create_many(
+        self,
+        invoice_id: int,
+        requests: List[InvoiceItemCreateRequest]
+    ) -> InvoiceItemListResponse:
+        """
+        Create several items of one invoice in a single transaction.
+        
+        Totals are computed in Python, all rows go in one executemany
+        INSERT and the invoice total is adjusted once, instead of an
+        INSERT + total update + commit per item.
+        
+        Args:
+            invoice_id: Invoice ID
+            requests: Invoice item creation data
+            
+        Returns:
+            InvoiceItemListResponse: All items of the invoice after the insert
+            
+        Raises:
+            ValueError: If invoice doesn't exist
+        """
+        try:
+            rows = []
+            items_total = _ZERO
+            for request in requests:
+                # Same rounding as create(): totals computed from stored inputs
+                quantity = round_to(request.quantity, QUANTITY_STEP)
+                unit_price = round_to(request.unit_price, CENTS)
+                tax_rate = round_to(request.tax_rate, RATE_STEP)
+                subtotal, tax_amount, total_amount = self._calculate_totals(
+                    quantity,
+                    unit_price,
+                    request.subtotal,
+                    tax_rate,
+                    request.tax_amount,
+                    request.total_amount
+                )
+                items_total += total_amount
+                rows.append({
+                    "invoice_id": invoice_id,
+                    "description": request.description,
+                    "unit": request.unit,
+                    "quantity": quantity,
+                    "unit_price": unit_price,
+                    "subtotal": subtotal,
+                    "tax_rate": tax_rate,
+                    "tax_amount": tax_amount,
+                    "total_amount": total_amount
+                })
+            
+            # ORM bulk INSERT (executemany): no InvoiceItem objects, no id fetch per row
+            await self.db.execute(insert(InvoiceItem), rows)
+            
+            if not await self._adjust_invoice_total(invoice_id, items_total):
+                raise ValueError(f"Invoice with id {invoice_id} not found")
+            await self.db.commit()
+            
+            logger.info("✅ Created %s invoice items for invoice %s", len(rows), invoice_id)
+            return await self.get_by_invoice_id(invoice_id)
+            
+        except ValueError as e:
+            await self.db.rollback()
+            raise
+        except IntegrityError as e:
+            # invoice_items has the invoice_id FK and the INVOICE_ITEM_CHECKS
+            await self.db.rollback()
+            if _is_check_violation(e):
+                raise InvoiceItemCheckError(
+                    "Invalid item values: quantity and unit_price must be >= 0, tax_rate between 0 and 100"
+                ) from e
+            raise ValueError(f"Invoice with id {invoice_id} not found") from e
+        except Exception as e:
+            await self.db.rollback()
+            logger.error("Error creating invoice items: %s", e)
+            raise
+
+    async def update(self, item_id: int, request: InvoiceItemUpdateRequest) -> Optional[InvoiceItemResponse]:
+        """
+        Update existing invoice item.
+        
+        Args:
+            item_id: Invoice item ID to update
+            request: Update data
+            
+        Returns:
+            InvoiceItemResponse or None if not found
+        """
+        try:
+            # Lock the row (FOR UPDATE) and read its current values: a
+            # concurrent update of the same item waits, so the total delta
+            # below is computed from the committed value, not a stale copy
+            item = await self._get_for_update(item_id)
+            
+            if not item:
+                await self.db.commit()  # End the transaction (nothing written)
+                return None
+            old_total = to_decimal(item.total_amount)
+            
+            # Get current values for calculation (request inputs rounded to
+            # the column scales, so no refresh() is needed after commit)
+            quantity = round_to(request.quantity, QUANTITY_STEP) if request.quantity is not None else to_decimal(item.quantity)
+            unit_price = round_to(request.unit_price, CENTS) if request.unit_price is not None else to_decimal(item.unit_price)
+            subtotal = request.subtotal if request.subtotal is not None else to_decimal(item.subtotal)
+            tax_rate = round_to(request.tax_rate, RATE_STEP) if request.tax_rate is not None else to_decimal(item.tax_rate)
+            tax_amount = request.tax_amount if request.tax_amount is not None else to_decimal(item.tax_amount)
+            total_amount = request.total_amount if request.total_amount is not None else to_decimal(item.total_amount)
+            
+            # Recalculate totals if needed
+            if (
+                request.quantity is not None
+                or request.unit_price is not None
+                or request.subtotal is not None
+                or request.tax_rate is not None
+            ):
+                subtotal, tax_amount, total_amount = self._calculate_totals(
+                    quantity, unit_price, subtotal, tax_rate, tax_amount, total_amount
+                )
+            
+            # Update fields sent in the request (explicit nulls included, like
+            # model_dump(exclude_unset=True) without building the dict)
+            fields_set = request.model_fields_set
+            if "description" in fields_set:
+                item.description = request.description
+            if "unit" in fields_set:
+                item.unit = request.unit
+            if "quantity" in fields_set:
+                item.quantity = round_to(request.quantity, QUANTITY_STEP)
+            if "unit_price" in fields_set:
+                item.unit_price = round_to(request.unit_price, CENTS)
+            if "tax_rate" in fields_set:
+                item.tax_rate = round_to(request.tax_rate, RATE_STEP)
+            
+            # Update calculated fields (also covers subtotal/tax_amount/total_amount from the request)
+            item.subtotal = round_to(subtotal, CENTS)
+            item.tax_amount = round_to(tax_amount, CENTS)
+            item.total_amount = round_to(total_amount, CENTS)
+            
+            # No net change (empty body or same values): skip the UPDATE, the
+            # invoice total update and the commit
+            if not self.db.is_modified(item):
+                # Nothing flushed: the commit only ends the transaction,
+                # releasing the row lock (a rollback would expire the session)
+                await self.db.commit()
+                return InvoiceItemResponse.model_validate(item)
+            
+            await self.db.flush()
+            
+            # Apply the item's total change to the invoice (same transaction)
+            await self._adjust_invoice_total(item.invoice_id, item.total_amount - old_total)
+            await self.db.commit()
+            
+            logger.info("✅ Updated invoice item %s", item_id)
+            return InvoiceItemResponse.model_validate(item)
+            
+        except Exception as e:
+            await self.db.rollback()
+            logger.error("Error updating invoice item %s: %s", item_id, e)
+            raise
+
+    async def delete(self, item_id: int) -> bool:
+        """
+        Delete invoice item.
+        
+        Args:
+            item_id: Invoice item ID to delete
+            
+        Returns:
+            bool: True if deleted, False if not found
+        """
+        try:
+            # Lock the row: a concurrent delete of the same item waits, then
+            # finds nothing, instead of subtracting its total a second time
+            item = await self._get_for_update(item_id)
+            
+            if not item:
+                await self.db.commit()  # End the transaction (nothing written)
+                return False
+            
+            invoice_id = item.invoice_id
+            item_total = to_decimal(item.total_amount)
+            
+            result = await self.db.execute(
+                delete(InvoiceItem)
+                .where(InvoiceItem.id == item_id)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 0:
+                await self.db.rollback()
+                return False
+            self.db.expunge(item)
+            
+            # Subtract the item from the invoice total (same transaction)
+            await self._adjust_invoice_total(invoice_id, -item_total)
+            await self.db.commit()
+            
+            logger.info("🗑️  Deleted invoice item %s", item_id)
+            return True
+            
+        except Exception as e:
+            await self.db.rollback()
+            logger.error("Error deleting invoice item %s: %s", item_id, e)
+            raise
+
+    async def delete_many(self, item_ids: List[int]) -> int:
+        """
+        Delete several items (of one or more invoices) in a single transaction.
+        
+        The parent invoice ids are read first (MySQL has no DELETE ...
+        RETURNING), then one UPDATE subtracting each invoice's deleted items
+        and one DELETE: three statements and one commit whatever the number
+        of items, instead of a SELECT + DELETE + total update + commit each.
+        
+        Args:
+            item_ids: Invoice item IDs to delete (unknown ids are ignored)
+            
+        Returns:
+            int: Number of items deleted
+        """
+        try:
+            # Lock the items (FOR UPDATE): a concurrent delete of the same ids
+            # waits, then finds them gone instead of subtracting them twice
+            result = await self.db.execute(
+                select(InvoiceItem.invoice_id)
+                .where(InvoiceItem.id.in_(item_ids))
+                .with_for_update()
+            )
+            invoice_ids = list(set(result.scalars().all()))
+            
+            if not invoice_ids:
+                await self.db.commit()  # End the transaction (nothing written)
+                return 0
+            
+            # Subtract each invoice's deleted items from its total, before
+            # the DELETE removes them (same transaction)
+            deleted_total = (
+                select(func.coalesce(func.sum(InvoiceItem.total_amount), 0))
+                .where(InvoiceItem.invoice_id == Invoice.id, InvoiceItem.id.in_(item_ids))
+                .correlate(Invoice)
+                .scalar_subquery()
+            )
+            await self._adjust_invoice_totals(invoice_ids, -deleted_total)
+            
+            result = await self.db.execute(
+                delete(InvoiceItem).where(InvoiceItem.id.in_(item_ids))
+            )
+            deleted = result.rowcount
+            await self.db.commit()
+            
+            logger.info("🗑️  Deleted %s invoice items from %s invoices", deleted, len(invoice_ids))
+            return deleted
+            
+        except Exception as e:
+            await self.db.rollback()
+            logger.error("Error deleting invoice items: %s", e)
+            raise
@@ -1,522 +1,732 @@
-"""
-Invoice service layer with business logic.
-
-This module demonstrates:
-- Service layer pattern (separation of concerns)
-- CRUD operations
-- Pagination
-- Search/filtering
-- Error handling
-- Transaction management
-- Relationship handling with invoice items
-"""
-
-import logging
-from typing import Optional
-from decimal import Decimal
-from datetime import datetime, date
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, func, desc
-from app.models.invoice import (
-    Invoice,
-    InvoiceCreateRequest,
-    InvoiceUpdateRequest,
-    InvoiceCreateWithItemsRequest,
-    InvoiceResponse,
-    InvoiceListResponse,
-    InvoiceStatsResponse,
-    InvoiceItemCreateNested
-)
-from app.models.invoice_item import InvoiceItem
-
-logger = logging.getLogger("uvicorn")
-
-
-class InvoiceService:
-    """
-    Business logic layer for Invoice entity operations.
-    
-    This service handles:
-    - CRUD operations
-    - Business rules validation
-    - Data transformation
-    - Transaction management
-    - Invoice items relationship
-    """
-
-    def __init__(self, db: Session):
-        """
-        Initialize service with database session.
-        
-        Args:
-            db: SQLAlchemy database session
-        """
-        self.db = db
-
-    def _calculate_item_totals(self, item: InvoiceItemCreateNested) -> tuple[Decimal, Decimal, Decimal]:
-        """
-        Calculate subtotal, tax_amount, and total_amount for an item.
-        
-        Args:
-            item: Invoice item data
-            
-        Returns:
-            tuple: (subtotal, tax_amount, total_amount)
-        """
-        # Calculate subtotal
-        if item.subtotal is not None:
-            subtotal = item.subtotal
-        elif item.quantity is not None and item.unit_price is not None:
-            subtotal = item.quantity * item.unit_price
-        else:
-            subtotal = Decimal('0')
-        
-        # Calculate tax_amount
-        if item.tax_amount is not None:
-            tax_amount = item.tax_amount
-        elif item.tax_rate is not None and subtotal > 0:
-            tax_amount = subtotal * (item.tax_rate / Decimal('100'))
-        else:
-            tax_amount = Decimal('0')
-        
-        # Calculate total_amount
-        if item.total_amount is not None:
-            total_amount = item.total_amount
-        else:
-            total_amount = subtotal + tax_amount
-        
-        return subtotal, tax_amount, total_amount
-
-    def _recalculate_invoice_total(self, invoice_id: int) -> Decimal:
-        """
-        Recalculate total_amount of an invoice based on its items.
-        
-        Args:
-            invoice_id: Invoice ID
-            
-        Returns:
-            Decimal: New total amount
-        """
-        items = self.db.query(InvoiceItem).filter(
-            InvoiceItem.invoice_id == invoice_id
-        ).all()
-        
-        total = sum(item.total_amount for item in items)
-        
-        # Update invoice total
-        invoice = self.db.query(Invoice).filter(Invoice.id == invoice_id).first()
-        if invoice:
-            invoice.total_amount = total
-            self.db.commit()
-        
-        return total
-
-    def get_all(
-        self,
-        page: int = 1,
-        limit: int = 50,
-        search: Optional[str] = None,
-        paid: Optional[bool] = None,
-        loaded_in_liquidation: Optional[bool] = None,
-        provider_nit: Optional[str] = None,
-        client_nit: Optional[str] = None,
-        reservation_number: Optional[str] = None,
-        issue_date_from: Optional[datetime] = None,
-        issue_date_to: Optional[datetime] = None
-    ) -> InvoiceListResponse:
-        """
-        Get paginated list of invoices with filtering.
-        
-        Args:
-            page: Page number (1-indexed)
-            limit: Items per page
-            search: Search term for invoice_number, provider_name, client_name
-            paid: Filter by paid status
-            loaded_in_liquidation: Filter by loaded_in_liquidation status
-            provider_nit: Filter by provider NIT
-            client_nit: Filter by client NIT
-            reservation_number: Filter by reservation number
-            issue_date_from: Filter by issue date from
-            issue_date_to: Filter by issue date to
-            
-        Returns:
-            InvoiceListResponse: Paginated list with metadata
-        """
-        try:
-            # Base query
-            query = self.db.query(Invoice)
-            
-            # Apply paid filter
-            if paid is not None:
-                query = query.filter(Invoice.paid == paid)
-            
-            # Apply loaded_in_liquidation filter
-            if loaded_in_liquidation is not None:
-                query = query.filter(Invoice.loaded_in_liquidation == loaded_in_liquidation)
-            
-            # Apply provider_nit filter
-            if provider_nit:
-                query = query.filter(Invoice.provider_nit == provider_nit)
-            
-            # Apply client_nit filter
-            if client_nit:
-                query = query.filter(Invoice.client_nit == client_nit)
-            
-            # Apply reservation_number filter
-            if reservation_number:
-                query = query.filter(Invoice.reservation_number == reservation_number)
-            
-            # Apply date range filters
-            if issue_date_from:
-                query = query.filter(Invoice.issue_date >= issue_date_from)
-            if issue_date_to:
-                query = query.filter(Invoice.issue_date <= issue_date_to)
-            
-            # Apply search filter
-            if search:
-                search_pattern = f"%{search}%"
-                # Use LIKE for MySQL compatibility (case-insensitive search)
-                query = query.filter(
-                    or_(
-                        Invoice.invoice_number.like(search_pattern),
-                        Invoice.provider_name.like(search_pattern),
-                        Invoice.client_name.like(search_pattern),
-                        Invoice.cufe.like(search_pattern)
-                    )
-                )
-            
-            # Count total
-            total = query.count()
-            
-            # Calculate pages
-            pages = (total + limit - 1) // limit if total > 0 else 0
-            
-            # Apply pagination and ordering
-            offset = (page - 1) * limit
-            invoices = query.order_by(desc(Invoice.issue_date)).offset(offset).limit(limit).all()
-            
-            return InvoiceListResponse(
-                invoices=[InvoiceResponse.model_validate(inv) for inv in invoices],
-                total=total,
-                page=page,
-                limit=limit,
-                pages=pages
-            )
-            
-        except Exception as e:
-            logger.error(f"Error in get_all: {str(e)}")
-            raise
-
-    def get_by_id(self, invoice_id: int, include_items: bool = True) -> Optional[InvoiceResponse]:
-        """
-        Get invoice by ID.
-        
-        Args:
-            invoice_id: Invoice ID
-            include_items: Whether to include invoice items in response
-            
-        Returns:
-            InvoiceResponse or None if not found
-        """
-        try:
-            invoice = self.db.query(Invoice).filter(
-                Invoice.id == invoice_id
-            ).first()
-            
-            if invoice:
-                response = InvoiceResponse.model_validate(invoice)
-                if include_items:
-                    # Load items
-                    from app.models.invoice_item import InvoiceItemResponse
-                    items = self.db.query(InvoiceItem).filter(
-                        InvoiceItem.invoice_id == invoice_id
-                    ).all()
-                    response.items = [InvoiceItemResponse.model_validate(item) for item in items]
-                return response
-            return None
-            
-        except Exception as e:
-            logger.error(f"Error in get_by_id({invoice_id}): {str(e)}")
-            raise
-
-    def create(self, request: InvoiceCreateRequest) -> InvoiceResponse:
-        """
-        Create new invoice (without items).
-        
-        Args:
-            request: Invoice creation data
-            
-        Returns:
-            InvoiceResponse: Created invoice
-        """
-        try:
-            # Validate dates
-            if request.departure_date and request.arrival_date:
-                if request.departure_date < request.arrival_date:
-                    raise ValueError("departure_date must be >= arrival_date")
-            
-            # Create new invoice
-            invoice = Invoice(
-                invoice_number=request.invoice_number,
-                cufe=request.cufe,
-                provider_name=request.provider_name,
-                provider_nit=request.provider_nit,
-                client_name=request.client_name,
-                client_nit=request.client_nit,
-                client_address=request.client_address,
-                client_email=request.client_email,
-                issue_date=request.issue_date,
-                authorization_date=request.authorization_date,
-                guest_name=request.guest_name,
-                cashier_id=request.cashier_id,
-                arrival_date=request.arrival_date,
-                departure_date=request.departure_date,
-                reservation_number=request.reservation_number,
-                total_amount=request.total_amount,
-                payment_method=request.payment_method,
-                payment_terms=request.payment_terms,
-                bank_account=request.bank_account,
-                additional_info=request.additional_info,
-                loaded_in_liquidation=request.loaded_in_liquidation,
-                paid=request.paid,
-                reviewed_by=request.reviewed_by
-            )
-            
-            self.db.add(invoice)
-            self.db.commit()
-            self.db.refresh(invoice)
-            
-            logger.info(f"✅ Created invoice {invoice.id}")
-            return InvoiceResponse.model_validate(invoice)
-            
-        except ValueError as e:
-            self.db.rollback()
-            raise
-        except Exception as e:
-            self.db.rollback()
-            logger.error(f"Error creating invoice: {str(e)}")
-            raise
-
-    def create_with_items(self, request: InvoiceCreateWithItemsRequest) -> InvoiceResponse:
-        """
-        Create new invoice with nested items.
-        
-        Args:
-            request: Invoice creation data with items
-            
-        Returns:
-            InvoiceResponse: Created invoice with items
-            
-        Raises:
-            ValueError: If total_amount doesn't match sum of items
-        """
-        try:
-            # Validate dates
-            if request.departure_date and request.arrival_date:
-                if request.departure_date < request.arrival_date:
-                    raise ValueError("departure_date must be >= arrival_date")
-            
-            # Calculate total from items
-            items_total = Decimal('0')
-            for item in request.items:
-                _, _, item_total = self._calculate_item_totals(item)
-                items_total += item_total
-            
-            # Use provided total_amount or calculate from items
-            if request.total_amount is not None:
-                total_amount = request.total_amount
-                # Validate that provided total matches calculated total (allow small difference for rounding)
-                if abs(total_amount - items_total) > Decimal('0.01'):
-                    raise ValueError(f"total_amount ({total_amount}) doesn't match sum of items ({items_total})")
-            else:
-                total_amount = items_total
-            
-            # Create invoice
-            invoice = Invoice(
-                invoice_number=request.invoice_number,
-                cufe=request.cufe,
-                provider_name=request.provider_name,
-                provider_nit=request.provider_nit,
-                client_name=request.client_name,
-                client_nit=request.client_nit,
-                client_address=request.client_address,
-                client_email=request.client_email,
-                issue_date=request.issue_date,
-                authorization_date=request.authorization_date,
-                guest_name=request.guest_name,
-                cashier_id=request.cashier_id,
-                arrival_date=request.arrival_date,
-                departure_date=request.departure_date,
-                reservation_number=request.reservation_number,
-                total_amount=total_amount,
-                payment_method=request.payment_method,
-                payment_terms=request.payment_terms,
-                bank_account=request.bank_account,
-                additional_info=request.additional_info,
-                loaded_in_liquidation=request.loaded_in_liquidation,
-                paid=request.paid,
-                reviewed_by=request.reviewed_by
-            )
-            
-            self.db.add(invoice)
-            self.db.flush()  # Get invoice.id without committing
-            
-            # Create items
-            for item_data in request.items:
-                subtotal, tax_amount, item_total = self._calculate_item_totals(item_data)
-                
-                item = InvoiceItem(
-                    invoice_id=invoice.id,
-                    description=item_data.description,
-                    unit=item_data.unit,
-                    quantity=item_data.quantity,
-                    unit_price=item_data.unit_price,
-                    subtotal=subtotal,
-                    tax_rate=item_data.tax_rate,
-                    tax_amount=tax_amount,
-                    total_amount=item_total
-                )
-                self.db.add(item)
-            
-            self.db.commit()
-            self.db.refresh(invoice)
-            
-            logger.info(f"✅ Created invoice {invoice.id} with {len(request.items)} items")
-            
-            # Return invoice with items
-            response = InvoiceResponse.model_validate(invoice)
-            from app.models.invoice_item import InvoiceItemResponse
-            items = self.db.query(InvoiceItem).filter(InvoiceItem.invoice_id == invoice.id).all()
-            response.items = [InvoiceItemResponse.model_validate(item) for item in items]
-            return response
-            
-        except ValueError as e:
-            self.db.rollback()
-            raise
-        except Exception as e:
-            self.db.rollback()
-            logger.error(f"Error creating invoice with items: {str(e)}")
-            raise
-
-    def update(self, invoice_id: int, request: InvoiceUpdateRequest) -> Optional[InvoiceResponse]:
-        """
-        Update existing invoice.
-        
-        Args:
-            invoice_id: Invoice ID to update
-            request: Update data
-            
-        Returns:
-            InvoiceResponse or None if not found
-            
-        Raises:
-            ValueError: If dates are invalid
-        """
-        try:
-            # Find invoice
-            invoice = self.db.query(Invoice).filter(
-                Invoice.id == invoice_id
-            ).first()
-            
-            if not invoice:
-                return None
-            
-            # Validate dates
-            arrival_date = request.arrival_date if request.arrival_date else invoice.arrival_date
-            departure_date = request.departure_date if request.departure_date else invoice.departure_date
-            if departure_date and arrival_date:
-                if departure_date < arrival_date:
-                    raise ValueError("departure_date must be >= arrival_date")
-            
-            # Update fields
-            update_data = request.model_dump(exclude_unset=True)
-            for field, value in update_data.items():
-                setattr(invoice, field, value)
-            
-            self.db.commit()
-            self.db.refresh(invoice)
-            
-            logger.info(f"✅ Updated invoice {invoice_id}")
-            return InvoiceResponse.model_validate(invoice)
-            
-        except ValueError as e:
-            self.db.rollback()
-            raise
-        except Exception as e:
-            self.db.rollback()
-            logger.error(f"Error updating invoice {invoice_id}: {str(e)}")
-            raise
-
-    def delete(self, invoice_id: int) -> bool:
-        """
-        Delete invoice (hard delete - will cascade delete items).
-        
-        Args:
-            invoice_id: Invoice ID to delete
-            
-        Returns:
-            bool: True if deleted, False if not found
-        """
-        try:
-            invoice = self.db.query(Invoice).filter(
-                Invoice.id == invoice_id
-            ).first()
-            
-            if not invoice:
-                return False
-            
-            # Hard delete (items will be deleted by CASCADE)
-            self.db.delete(invoice)
-            self.db.commit()
-            
-            logger.info(f"🗑️  Deleted invoice {invoice_id}")
-            return True
-            
-        except Exception as e:
-            self.db.rollback()
-            logger.error(f"Error deleting invoice {invoice_id}: {str(e)}")
-            raise
-
-    def get_stats(self) -> InvoiceStatsResponse:
-        """
-        Get statistics about invoices.
-        
-        Returns:
-            InvoiceStatsResponse: Statistics data
-        """
-        try:
-            # Total count
-            total = self.db.query(Invoice).count()
-            
-            # Paid/unpaid count
-            paid = self.db.query(Invoice).filter(Invoice.paid == True).count()
-            unpaid = self.db.query(Invoice).filter(Invoice.paid == False).count()
-            
-            # Loaded in liquidation count
-            loaded_in_liquidation = self.db.query(Invoice).filter(
-                Invoice.loaded_in_liquidation == True
-            ).count()
-            
-            # Total amounts
-            total_amount_result = self.db.query(func.sum(Invoice.total_amount)).scalar() or Decimal('0')
-            paid_amount_result = self.db.query(func.sum(Invoice.total_amount)).filter(
-                Invoice.paid == True
-            ).scalar() or Decimal('0')
-            unpaid_amount_result = self.db.query(func.sum(Invoice.total_amount)).filter(
-                Invoice.paid == False
-            ).scalar() or Decimal('0')
-            
-            return InvoiceStatsResponse(
-                total=total,
-                paid=paid,
-                unpaid=unpaid,
-                loaded_in_liquidation=loaded_in_liquidation,
-                total_amount=total_amount_result,
-                paid_amount=paid_amount_result,
-                unpaid_amount=unpaid_amount_result
-            )
-            
-        except Exception as e:
-            logger.error(f"Error getting stats: {str(e)}")
-            raise
-
+"""
+Invoice service layer with business logic.
+
+This module demonstrates:
+- Service layer pattern (separation of concerns)
+- CRUD operations
+- Pagination
+- Search/filtering
+- Error handling
+- Transaction management
+- Relationship handling with invoice items
+"""
+
+import base64
+import binascii
+import logging
+import re
+from typing import Optional, AsyncIterator, Tuple
+from decimal import Decimal
+from datetime import datetime, date
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, lazyload, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import select, insert, update, delete, or_, and_, func, desc, case
+from sqlalchemy.dialects.mysql import match as mysql_match
+from sqlalchemy.exc import IntegrityError
+from app.database.types import to_money, CENTS
+from app.models.invoice import (
+    Invoice,
+    InvoiceCreateRequest,
+    InvoiceUpdateRequest,
+    InvoiceCreateWithItemsRequest,
+    InvoiceResponse,
+    InvoiceListResponse,
+    InvoiceStatsResponse,
+    InvoiceItemCreateNested,
+    invoice_response_from_row,
+    invoice_responses_from_orm
+)
+from app.models.invoice_item import InvoiceItem
+
+logger = logging.getLogger("uvicorn")
+
+# Rows fetched per round trip when streaming large exports
+EXPORT_BATCH_SIZE = 1000
+
+# Free-text search (MySQL): shortest word the FULLTEXT index holds
+# (innodb_ft_min_token_size) and length from which a term is taken as a CUFE
+FULLTEXT_MIN_TOKEN_SIZE = 3
+CUFE_SEARCH_MIN_LENGTH = 40
+_SEARCH_WORD = re.compile(r"\w+")
+
+# Shared constants: no Decimal allocation per calculation
+_ZERO = Decimal(0)
+_PERCENT = Decimal(100)
+
+# MySQL duplicate-key error code (IntegrityError.orig.args[0]); SQLite only
+# reports it in the message
+_MYSQL_DUPLICATE_KEY = 1062
+
+
+def _is_duplicate_cufe(error: IntegrityError) -> bool:
+    """Whether an IntegrityError is a duplicate on the unique idx_invoice_cufe."""
+    args = getattr(error.orig, "args", ())
+    if args and args[0] == _MYSQL_DUPLICATE_KEY:
+        return "idx_invoice_cufe" in str(args[-1])
+    return "UNIQUE constraint failed: invoices.cufe" in str(error.orig)
+
+
+def encode_cursor(issue_date: datetime, invoice_id: int) -> str:
+    """Encode a list position (last row's issue_date, id) as an opaque base64url cursor."""
+    raw = f"{issue_date.isoformat()}|{invoice_id}".encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor built by encode_cursor.
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        issue_date, invoice_id = raw.split("|")
+        return datetime.fromisoformat(issue_date), int(invoice_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor") from None
+
+
+class InvoiceService:
+    """
+    Business logic layer for Invoice entity operations.
+    
+    This service handles:
+    - CRUD operations
+    - Business rules validation
+    - Data transformation
+    - Transaction management
+    - Invoice items relationship
+    """
+
+    __slots__ = ("db",)
+
+    def __init__(self, db: AsyncSession):
+        """
+        Initialize service with database session.
+        
+        Args:
+            db: SQLAlchemy async database session
+        """
+        self.db = db
+
+    def _calculate_item_totals(self, item: InvoiceItemCreateNested) -> tuple[Decimal, Decimal, Decimal]:
+        """
+        Calculate subtotal, tax_amount, and total_amount for an item.
+        
+        Args:
+            item: Invoice item data
+            
+        Returns:
+            tuple: (subtotal, tax_amount, total_amount), rounded to cents
+        """
+        quantity, unit_price, tax_rate = item.quantity, item.unit_price, item.tax_rate
+        subtotal, tax_amount, total_amount = item.subtotal, item.tax_amount, item.total_amount
+        
+        # Each amount: the provided value, else computed from the others
+        if subtotal is None:
+            subtotal = quantity * unit_price if quantity is not None and unit_price is not None else _ZERO
+        if tax_amount is None:
+            tax_amount = subtotal * tax_rate / _PERCENT if tax_rate is not None else _ZERO
+        if total_amount is None:
+            total_amount = subtotal + tax_amount
+        
+        return to_money(subtotal), to_money(tax_amount), to_money(total_amount)
+
+    def _search_condition(self, search: str):
+        """
+        Build the WHERE condition for the list's free-text search.
+        
+        On MySQL every word (3+ characters, InnoDB's default minimum token
+        size) must start a word of invoice_number, provider_name or
+        client_name, through the idx_invoice_search FULLTEXT index
+        (MATCH ... AGAINST in boolean mode) instead of a full scan.
+        Searches with only short words use a prefix LIKE on invoice_number
+        instead. Any term also matches a cufe prefix (idx_invoice_cufe);
+        CUFE-like terms (one long token, longer than FULLTEXT tokens) only
+        search cufe.
+        
+        Other databases (SQLite in tests) keep the substring LIKE search.
+        """
+        if self.db.bind.dialect.name != "mysql":
+            search_pattern = f"%{search}%"
+            return or_(
+                Invoice.invoice_number.like(search_pattern),
+                Invoice.provider_name.like(search_pattern),
+                Invoice.client_name.like(search_pattern),
+                Invoice.cufe.like(search_pattern)
+            )
+        
+        search = search.strip()
+        prefix_pattern = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        if len(search) >= CUFE_SEARCH_MIN_LENGTH and not any(c.isspace() for c in search):
+            return Invoice.cufe.like(prefix_pattern)
+        
+        # Words only: boolean-mode operators in the input are dropped
+        words = [word for word in _SEARCH_WORD.findall(search) if len(word) >= FULLTEXT_MIN_TOKEN_SIZE]
+        if not words:
+            return or_(Invoice.invoice_number.like(prefix_pattern), Invoice.cufe.like(prefix_pattern))
+        return or_(
+            mysql_match(
+                Invoice.invoice_number,
+                Invoice.provider_name,
+                Invoice.client_name,
+                against=" ".join(f"+{word}*" for word in words)
+            ).in_boolean_mode(),
+            Invoice.cufe.like(prefix_pattern)
+        )
+
+    async def get_all(
+        self,
+        page: int = 1,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        include_total: Optional[bool] = None,
+        search: Optional[str] = None,
+        paid: Optional[bool] = None,
+        loaded_in_liquidation: Optional[bool] = None,
+        provider_nit: Optional[str] = None,
+        client_nit: Optional[str] = None,
+        reservation_number: Optional[str] = None,
+        issue_date_from: Optional[datetime] = None,
+        issue_date_to: Optional[datetime] = None
+    ) -> InvoiceListResponse:
+        """
+        Get paginated list of invoices with filtering.
+        
+        Pages are ordered by (issue_date DESC, id DESC). With a cursor the
+        page starts right after that position (index range seek, same cost
+        at any depth); otherwise page selects it with OFFSET.
+        
+        Args:
+            page: Page number (1-indexed), ignored (and returned as None)
+                when cursor is given
+            limit: Items per page
+            cursor: next_cursor of the previous page (keyset pagination)
+            include_total: Run the COUNT for total/pages; defaults to True
+                for page-based requests and False with a cursor
+            search: Search term for invoice_number, provider_name, client_name
+            paid: Filter by paid status
+            loaded_in_liquidation: Filter by loaded_in_liquidation status
+            provider_nit: Filter by provider NIT
+            client_nit: Filter by client NIT
+            reservation_number: Filter by reservation number
+            issue_date_from: Filter by issue date from
+            issue_date_to: Filter by issue date to
+            
+        Returns:
+            InvoiceListResponse: Paginated list with metadata
+            
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        try:
+            # Base query
+            query = select(Invoice)
+            
+            # Apply paid filter
+            if paid is not None:
+                query = query.filter(Invoice.paid == paid)
+            
+            # Apply loaded_in_liquidation filter
+            if loaded_in_liquidation is not None:
+                query = query.filter(Invoice.loaded_in_liquidation == loaded_in_liquidation)
+            
+            # Apply provider_nit filter
+            if provider_nit:
+                query = query.filter(Invoice.provider_nit == provider_nit)
+            
+            # Apply client_nit filter
+            if client_nit:
+                query = query.filter(Invoice.client_nit == client_nit)
+            
+            # Apply reservation_number filter
+            if reservation_number:
+                query = query.filter(Invoice.reservation_number == reservation_number)
+            
+            # Apply date range filters
+            if issue_date_from:
+                query = query.filter(Invoice.issue_date >= issue_date_from)
+            if issue_date_to:
+                query = query.filter(Invoice.issue_date <= issue_date_to)
+            
+            # Apply search filter
+            if search:
+                query = query.filter(self._search_condition(search))
+            
+            # Count total (a second pass over the filters: skipped unless asked
+            # for; next_cursor already tells whether there is a next page)
+            if include_total is None:
+                include_total = cursor is None
+            total = pages = None
+            if include_total:
+                total = (await self.db.execute(
+                    select(func.count()).select_from(query.subquery())
+                )).scalar_one()
+                pages = (total + limit - 1) // limit if total > 0 else 0
+            
+            # Apply pagination: seek past the cursor position, or skip whole pages
+            if cursor:
+                cursor_date, cursor_id = decode_cursor(cursor)
+                query = query.filter(or_(
+                    Invoice.issue_date < cursor_date,
+                    and_(Invoice.issue_date == cursor_date, Invoice.id < cursor_id)
+                ))
+            else:
+                query = query.offset((page - 1) * limit)
+            
+            # id breaks issue_date ties so every row has one position; one
+            # extra row tells whether there is a next page
+            result = await self.db.execute(
+                query.options(selectinload(Invoice.items))
+                .order_by(desc(Invoice.issue_date), desc(Invoice.id))
+                .limit(limit + 1)
+            )
+            invoices = result.scalars().all()
+            
+            next_cursor = None
+            if len(invoices) > limit:
+                invoices = invoices[:limit]
+                last = invoices[-1]
+                next_cursor = encode_cursor(last.issue_date, last.id)
+            
+            # Trusted DB rows: the page in one validator call, the envelope constructed
+            return InvoiceListResponse.model_construct(
+                invoices=invoice_responses_from_orm(invoices),
+                total=total,
+                page=None if cursor else page,
+                limit=limit,
+                pages=pages,
+                next_cursor=next_cursor
+            )
+            
+        except Exception as e:
+            logger.error("Error in get_all: %s", e)
+            raise
+
+    async def iter_invoices(
+        self,
+        issue_date_from: Optional[datetime] = None,
+        issue_date_to: Optional[datetime] = None,
+        batch_size: int = EXPORT_BATCH_SIZE
+    ) -> AsyncIterator[Invoice]:
+        """
+        Stream invoices (with items) for large exports, e.g. an accounting period dump.
+        
+        Reads keyset pages (WHERE (issue_date, id) > last row ORDER BY
+        issue_date, id LIMIT batch_size), each fully buffered, plus one
+        SELECT ... IN for that page's items: only one batch is held in
+        memory at a time instead of the whole table. No server-side cursor:
+        on aiomysql an unbuffered cursor left open while the items query
+        runs on the same connection is silently drained, ending the export
+        after the first batch.
+        
+        Args:
+            issue_date_from: Filter by issue date from
+            issue_date_to: Filter by issue date to
+            batch_size: Invoices fetched per round trip
+            
+        Yields:
+            Invoice: ORM rows, oldest first
+        """
+        query = (
+            select(Invoice)
+            .options(selectinload(Invoice.items))
+            .order_by(Invoice.issue_date, Invoice.id)
+            .limit(batch_size)
+        )
+        if issue_date_from:
+            query = query.filter(Invoice.issue_date >= issue_date_from)
+        if issue_date_to:
+            query = query.filter(Invoice.issue_date <= issue_date_to)
+        
+        page_query = query
+        while True:
+            invoices = (await self.db.execute(page_query)).scalars().all()
+            for invoice in invoices:
+                yield invoice
+            if len(invoices) < batch_size:
+                return
+            last = invoices[-1]
+            page_query = query.filter(or_(
+                Invoice.issue_date > last.issue_date,
+                and_(Invoice.issue_date == last.issue_date, Invoice.id > last.id)
+            ))
+
+    async def get_updated_at(self, invoice_id: int) -> Optional[datetime]:
+        """
+        Get only the invoice's updated_at (ETag source for conditional GETs).
+        
+        Item mutations touch the parent invoice, so this also changes when
+        its items do.
+        
+        Args:
+            invoice_id: Invoice ID
+            
+        Returns:
+            datetime or None if not found
+        """
+        result = await self.db.execute(
+            select(Invoice.updated_at).where(Invoice.id == invoice_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def get_by_id(self, invoice_id: int, include_items: bool = True) -> Optional[InvoiceResponse]:
+        """
+        Get invoice by ID.
+        
+        Args:
+            invoice_id: Invoice ID
+            include_items: Whether to include invoice items in response
+            
+        Returns:
+            InvoiceResponse or None if not found
+        """
+        try:
+            # With items: 2 statements (invoice + one SELECT ... IN for its
+            # items) whatever the item count. Without: skip the eager load
+            # the relationship would otherwise run by default (lazy="selectin")
+            items_loader = selectinload(Invoice.items) if include_items else lazyload(Invoice.items)
+            result = await self.db.execute(
+                select(Invoice)
+                .options(items_loader)
+                .where(Invoice.id == invoice_id)
+            )
+            invoice = result.scalars().first()
+            
+            if invoice:
+                return invoice_response_from_row(invoice, include_items=include_items)
+            return None
+            
+        except Exception as e:
+            logger.error("Error in get_by_id(%s): %s", invoice_id, e)
+            raise
+
+    async def create(self, request: InvoiceCreateRequest) -> InvoiceResponse:
+        """
+        Create new invoice (without items).
+        
+        Args:
+            request: Invoice creation data
+            
+        Returns:
+            InvoiceResponse: Created invoice
+        """
+        try:
+            # Validate dates
+            if request.departure_date and request.arrival_date:
+                if request.departure_date < request.arrival_date:
+                    raise ValueError("departure_date must be >= arrival_date")
+            
+            # Create new invoice
+            invoice = Invoice(
+                invoice_number=request.invoice_number,
+                cufe=request.cufe,
+                provider_name=request.provider_name,
+                provider_nit=request.provider_nit,
+                client_name=request.client_name,
+                client_nit=request.client_nit,
+                client_address=request.client_address,
+                client_email=request.client_email,
+                issue_date=request.issue_date,
+                authorization_date=request.authorization_date,
+                guest_name=request.guest_name,
+                cashier_id=request.cashier_id,
+                arrival_date=request.arrival_date,
+                departure_date=request.departure_date,
+                reservation_number=request.reservation_number,
+                total_amount=request.total_amount,
+                payment_method=request.payment_method,
+                payment_terms=request.payment_terms,
+                bank_account=request.bank_account,
+                additional_info=request.additional_info,
+                loaded_in_liquidation=request.loaded_in_liquidation,
+                paid=request.paid,
+                reviewed_by=request.reviewed_by
+            )
+            
+            self.db.add(invoice)
+            await self.db.commit()
+            # Only the server defaults (and total_amount as the column reads
+            # it) are reloaded, in one SELECT; a new invoice has no items, so
+            # mark the collection loaded instead of querying it
+            await self.db.refresh(invoice, ["total_amount", "created_at", "updated_at"])
+            set_committed_value(invoice, "items", [])
+            
+            logger.info("✅ Created invoice %s", invoice.id)
+            return InvoiceResponse.model_validate(invoice)
+            
+        except ValueError as e:
+            await self.db.rollback()
+            raise
+        except IntegrityError as e:
+            await self.db.rollback()
+            if not _is_duplicate_cufe(e):
+                logger.error("Error creating invoice: %s", e)
+                raise
+            raise ValueError("An invoice with this cufe already exists") from e
+        except Exception as e:
+            await self.db.rollback()
+            logger.error("Error creating invoice: %s", e)
+            raise
+
+    async def create_with_items(self, request: InvoiceCreateWithItemsRequest) -> InvoiceResponse:
+        """
+        Create new invoice with nested items.
+        
+        Args:
+            request: Invoice creation data with items
+            
+        Returns:
+            InvoiceResponse: Created invoice with items
+            
+        Raises:
+            ValueError: If total_amount doesn't match sum of items
+        """
+        try:
+            # Validate dates
+            if request.departure_date and request.arrival_date:
+                if request.departure_date < request.arrival_date:
+                    raise ValueError("departure_date must be >= arrival_date")
+            
+            # Calculate each item's amounts once: they give the invoice total
+            # here and the item rows below
+            item_totals = [self._calculate_item_totals(item) for item in request.items]
+            items_total = sum([total for _, _, total in item_totals], _ZERO)
+            
+            # Use provided total_amount or calculate from items
+            if request.total_amount is not None:
+                total_amount = request.total_amount
+                # Validate that provided total matches calculated total (allow small difference for rounding)
+                if abs(total_amount - items_total) > CENTS:
+                    raise ValueError(f"total_amount ({total_amount}) doesn't match sum of items ({items_total})")
+            else:
+                total_amount = items_total
+            
+            # Create invoice
+            invoice = Invoice(
+                invoice_number=request.invoice_number,
+                cufe=request.cufe,
+                provider_name=request.provider_name,
+                provider_nit=request.provider_nit,
+                client_name=request.client_name,
+                client_nit=request.client_nit,
+                client_address=request.client_address,
+                client_email=request.client_email,
+                issue_date=request.issue_date,
+                authorization_date=request.authorization_date,
+                guest_name=request.guest_name,
+                cashier_id=request.cashier_id,
+                arrival_date=request.arrival_date,
+                departure_date=request.departure_date,
+                reservation_number=request.reservation_number,
+                total_amount=total_amount,
+                payment_method=request.payment_method,
+                payment_terms=request.payment_terms,
+                bank_account=request.bank_account,
+                additional_info=request.additional_info,
+                loaded_in_liquidation=request.loaded_in_liquidation,
+                paid=request.paid,
+                reviewed_by=request.reviewed_by
+            )
+            
+            self.db.add(invoice)
+            await self.db.flush()  # Get invoice.id without committing
+            
+            # All items in one executemany INSERT (multi-row on MySQL), no
+            # InvoiceItem objects built
+            invoice_id = invoice.id
+            item_rows = [
+                {
+                    "invoice_id": invoice_id,
+                    "description": item_data.description,
+                    "unit": item_data.unit,
+                    "quantity": item_data.quantity,
+                    "unit_price": item_data.unit_price,
+                    "subtotal": subtotal,
+                    "tax_rate": item_data.tax_rate,
+                    "tax_amount": tax_amount,
+                    "total_amount": item_total
+                }
+                for item_data, (subtotal, tax_amount, item_total) in zip(request.items, item_totals)
+            ]
+            await self.db.execute(insert(InvoiceItem), item_rows)
+            
+            await self.db.commit()
+            # MySQL has no INSERT ... RETURNING for the item ids or the
+            # server-default timestamps: read the invoice and its items back
+            # in one joined SELECT (refresh() would take one per table)
+            result = await self.db.execute(
+                select(Invoice)
+                .options(joinedload(Invoice.items))
+                .where(Invoice.id == invoice_id)
+                .execution_options(populate_existing=True)
+            )
+            invoice = result.unique().scalars().one()
+            
+            logger.info("✅ Created invoice %s with %s items", invoice.id, len(request.items))
+            return InvoiceResponse.model_validate(invoice)
+            
+        except ValueError as e:
+            await self.db.rollback()
+            raise
+        except IntegrityError as e:
+            await self.db.rollback()
+            if not _is_duplicate_cufe(e):
+                logger.error("Error creating invoice with items: %s", e)
+                raise
+            raise ValueError("An invoice with this cufe already exists") from e
+        except Exception as e:
+            await self.db.rollback()
+            logger.error("Error creating invoice with items: %s", e)
+            raise
+
+    async def update(self, invoice_id: int, request: InvoiceUpdateRequest) -> Optional[InvoiceResponse]:
+        """
+        Update existing invoice.
+        
+        Args:
+            invoice_id: Invoice ID to update
+            request: Update data
+            
+        Returns:
+            InvoiceResponse or None if not found
+            
+        Raises:
+            ValueError: If dates are invalid
+        """
+        try:
+            update_data = request.model_dump(exclude_unset=True)
+            if not update_data:
+                return await self.get_by_id(invoice_id)
+            
+            # One UPDATE, no SELECT first: its matched-row count tells whether
+            # the invoice exists (the MySQL dialects connect with FOUND_ROWS)
+            stmt = update(Invoice).where(Invoice.id == invoice_id).values(**update_data)
+            
+            # Validate dates: both sent -> checked here; only one sent -> the
+            # stored counterpart is checked by the UPDATE's WHERE clause
+            arrival_date = update_data.get("arrival_date")
+            departure_date = update_data.get("departure_date")
+            if "arrival_date" in update_data and "departure_date" in update_data:
+                if departure_date and arrival_date and departure_date < arrival_date:
+                    raise ValueError("departure_date must be >= arrival_date")
+            elif departure_date is not None:
+                stmt = stmt.where(or_(Invoice.arrival_date.is_(None), Invoice.arrival_date <= departure_date))
+            elif arrival_date is not None:
+                stmt = stmt.where(or_(Invoice.departure_date.is_(None), Invoice.departure_date >= arrival_date))
+            
+            result = await self.db.execute(stmt.execution_options(synchronize_session=False))
+            if result.rowcount == 0:
+                # Rare path: tell a missing invoice from a rejected date
+                found = await self.db.scalar(select(Invoice.id).where(Invoice.id == invoice_id))
+                await self.db.rollback()
+                if found is None:
+                    return None
+                raise ValueError("departure_date must be >= arrival_date")
+            
+            await self.db.commit()
+            
+            # Read back what the database set (updated_at ON UPDATE, total_amount
+            # as the column reads it); populate_existing overwrites any copy
+            # already in the identity map
+            result = await self.db.execute(
+                select(Invoice)
+                .options(selectinload(Invoice.items))
+                .where(Invoice.id == invoice_id)
+                .execution_options(populate_existing=True)
+            )
+            invoice = result.scalars().one()
+            
+            logger.info("✅ Updated invoice %s", invoice_id)
+            return invoice_response_from_row(invoice)
+            
+        except ValueError as e:
+            await self.db.rollback()
+            raise
+        except IntegrityError as e:
+            await self.db.rollback()
+            if not _is_duplicate_cufe(e):
+                logger.error("Error updating invoice %s: %s", invoice_id, e)
+                raise
+            raise ValueError("An invoice with this cufe already exists") from e
+        except Exception as e:
+            await self.db.rollback()
+            logger.error("Error updating invoice %s: %s", invoice_id, e)
+            raise
+
+    async def delete(self, invoice_id: int) -> bool:
+        """
+        Delete invoice (hard delete - will cascade delete items).
+        
+        Args:
+            invoice_id: Invoice ID to delete
+            
+        Returns:
+            bool: True if deleted, False if not found
+        """
+        try:
+            # One DELETE, no SELECT of the invoice and its items first: the
+            # items go with it by the FOREIGN KEY ... ON DELETE CASCADE
+            result = await self.db.execute(delete(Invoice).where(Invoice.id == invoice_id))
+            if result.rowcount == 0:
+                await self.db.rollback()
+                return False
+            await self.db.commit()
+            
+            logger.info("🗑️  Deleted invoice %s", invoice_id)
+            return True
+            
+        except Exception as e:
+            await self.db.rollback()
+            logger.error("Error deleting invoice %s: %s", invoice_id, e)
+            raise
+
+    async def get_stats(self) -> InvoiceStatsResponse:
+        """
+        Get statistics about invoices.
+        
+        Returns:
+            InvoiceStatsResponse: Statistics data
+        """
+        try:
+            # Single pass over invoices (covered by idx_invoice_liq_paid):
+            # conditional SUMs instead of one COUNT/SUM query per figure
+            row = (await self.db.execute(
+                select(
+                    func.count(),
+                    func.coalesce(func.sum(case((Invoice.paid == True, 1), else_=0)), 0),
+                    func.coalesce(func.sum(case((Invoice.paid == False, 1), else_=0)), 0),
+                    func.coalesce(func.sum(case((Invoice.loaded_in_liquidation == True, 1), else_=0)), 0),
+                    func.coalesce(func.sum(Invoice.total_amount), 0),
+                    func.coalesce(func.sum(case((Invoice.paid == True, Invoice.total_amount), else_=0)), 0),
+                    func.coalesce(func.sum(case((Invoice.paid == False, Invoice.total_amount), else_=0)), 0)
+                ).select_from(Invoice)
+            )).one()
+            (
+                total,
+                paid,
+                unpaid,
+                loaded_in_liquidation,
+                total_amount_result,
+                paid_amount_result,
+                unpaid_amount_result
+            ) = row
+            
+            # Aggregates straight from the DB: construct without validation.
+            # MySQL returns SUM() of integers as DECIMAL, so cast the counts.
+            return InvoiceStatsResponse.model_construct(
+                total=int(total),
+                paid=int(paid),
+                unpaid=int(unpaid),
+                loaded_in_liquidation=int(loaded_in_liquidation),
+                total_amount=total_amount_result,
+                paid_amount=paid_amount_result,
+                unpaid_amount=unpaid_amount_result
+            )
+            
+        except Exception as e:
+            logger.error("Error getting stats: %s", e)
+            raise
+
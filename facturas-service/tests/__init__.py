@@ -1,4 +1,4 @@
-"""
-Tests package for facturas service.
-"""
-
+"""
+Tests package for facturas service.
+"""
+
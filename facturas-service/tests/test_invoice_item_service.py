@@ -1,105 +1,323 @@
-"""
-Tests for InvoiceItemService business logic.
-
-Tests:
-- CRUD operations
-- Automatic total recalculation
-- Relationship validation
-"""
-
-import pytest
-from decimal import Decimal
-from sqlalchemy.orm import Session
-from app.services.invoice_item_service import InvoiceItemService
-from app.models.invoice_item import InvoiceItemCreateRequest, InvoiceItemUpdateRequest
-
-
-@pytest.mark.unit
-def test_create_invoice_item(db_session: Session, sample_invoice, sample_invoice_item_data):
-    """Test creating an invoice item."""
-    service = InvoiceItemService(db_session)
-    
-    request = InvoiceItemCreateRequest(**sample_invoice_item_data)
-    result = service.create(sample_invoice.id, request)
-    
-    assert result.id is not None
-    assert result.invoice_id == sample_invoice.id
-    assert result.description == sample_invoice_item_data["description"]
-
-
-@pytest.mark.unit
-def test_create_item_recalculates_invoice_total(db_session: Session, sample_invoice, sample_invoice_item_data):
-    """Test that creating an item recalculates invoice total."""
-    service = InvoiceItemService(db_session)
-    from app.services.invoice_service import InvoiceService
-    
-    # Get initial total
-    invoice_service = InvoiceService(db_session)
-    initial_invoice = invoice_service.get_by_id(sample_invoice.id)
-    initial_total = initial_invoice.total_amount
-    
-    # Create item
-    request = InvoiceItemCreateRequest(**sample_invoice_item_data)
-    service.create(sample_invoice.id, request)
-    
-    # Verify invoice total was updated
-    updated_invoice = invoice_service.get_by_id(sample_invoice.id)
-    assert updated_invoice.total_amount == initial_total + sample_invoice_item_data["total_amount"]
-
-
-@pytest.mark.unit
-def test_get_items_by_invoice_id(db_session: Session, sample_invoice, sample_invoice_item):
-    """Test getting items by invoice ID."""
-    service = InvoiceItemService(db_session)
-    
-    result = service.get_by_invoice_id(sample_invoice.id)
-    
-    assert result.total >= 1
-    assert len(result.items) >= 1
-    assert result.invoice_id == sample_invoice.id
-
-
-@pytest.mark.unit
-def test_update_invoice_item(db_session: Session, sample_invoice_item):
-    """Test updating an invoice item."""
-    service = InvoiceItemService(db_session)
-    
-    update_request = InvoiceItemUpdateRequest(quantity=Decimal("3"))
-    result = service.update(sample_invoice_item.id, update_request)
-    
-    assert result is not None
-    assert result.quantity == Decimal("3")
-
-
-@pytest.mark.unit
-def test_delete_invoice_item(db_session: Session, sample_invoice_item):
-    """Test deleting an invoice item."""
-    service = InvoiceItemService(db_session)
-    
-    deleted = service.delete(sample_invoice_item.id)
-    
-    assert deleted is True
-    
-    # Verify it's deleted
-    result = service.get_by_id(sample_invoice_item.id)
-    assert result is None
-
-
-@pytest.mark.unit
-def test_delete_item_recalculates_invoice_total(db_session: Session, sample_invoice, sample_invoice_item):
-    """Test that deleting an item recalculates invoice total."""
-    service = InvoiceItemService(db_session)
-    from app.services.invoice_service import InvoiceService
-    
-    # Get initial total
-    invoice_service = InvoiceService(db_session)
-    initial_invoice = invoice_service.get_by_id(sample_invoice.id)
-    initial_total = initial_invoice.total_amount
-    
-    # Delete item
-    service.delete(sample_invoice_item.id)
-    
-    # Verify invoice total was updated
-    updated_invoice = invoice_service.get_by_id(sample_invoice.id)
-    assert updated_invoice.total_amount == initial_total - sample_invoice_item.total_amount
-
+"""
+Tests for InvoiceItemService business logic.
+
+Tests:
+- CRUD operations
+- Automatic total recalculation
+- Relationship validation
+"""
+
+import pytest
+from decimal import Decimal
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.invoice_item_service import InvoiceItemService
+from app.models.invoice_item import InvoiceItemCreateRequest, InvoiceItemUpdateRequest, InvoiceItemResponse
+
+
+@pytest.mark.unit
+async def test_create_invoice_item(db_session: AsyncSession, sample_invoice, sample_invoice_item_data):
+    """Test creating an invoice item."""
+    service = InvoiceItemService(db_session)
+    
+    request = InvoiceItemCreateRequest(**sample_invoice_item_data)
+    result = await service.create(sample_invoice.id, request)
+    
+    assert result.id is not None
+    assert result.invoice_id == sample_invoice.id
+    assert result.description == sample_invoice_item_data["description"]
+
+
+@pytest.mark.unit
+async def test_create_item_recalculates_invoice_total(db_session: AsyncSession, sample_invoice, sample_invoice_item_data):
+    """Test that creating an item recalculates invoice total."""
+    service = InvoiceItemService(db_session)
+    from app.services.invoice_service import InvoiceService
+    
+    # Get initial total
+    invoice_service = InvoiceService(db_session)
+    initial_invoice = await invoice_service.get_by_id(sample_invoice.id)
+    initial_total = initial_invoice.total_amount
+    
+    # Create item
+    request = InvoiceItemCreateRequest(**sample_invoice_item_data)
+    await service.create(sample_invoice.id, request)
+    
+    # Verify invoice total was updated
+    updated_invoice = await invoice_service.get_by_id(sample_invoice.id)
+    assert updated_invoice.total_amount == initial_total + sample_invoice_item_data["total_amount"]
+
+
+@pytest.mark.unit
+async def test_create_item_response_matches_stored_row(db_session: AsyncSession, sample_invoice, sample_invoice_item_data):
+    """Test the create response (built without refresh) equals the row read back."""
+    service = InvoiceItemService(db_session)
+    
+    data = {**sample_invoice_item_data, "quantity": Decimal("1.23456"), "unit_price": Decimal("99.999")}
+    data.pop("total_amount")
+    request = InvoiceItemCreateRequest(**data, total_amount=Decimal("123.456"))
+    created = await service.create(sample_invoice.id, request)
+    
+    db_session.expunge_all()
+    stored = await service.get_by_id(created.id)
+    assert created.model_dump() == stored.model_dump()
+
+
+@pytest.mark.unit
+async def test_create_many_items(db_session: AsyncSession, sample_invoice, sample_invoice_item_data):
+    """Test creating several items at once adds them to the invoice total once."""
+    service = InvoiceItemService(db_session)
+    from app.services.invoice_service import InvoiceService
+    initial_total = sample_invoice.total_amount
+    
+    requests = [
+        InvoiceItemCreateRequest(**sample_invoice_item_data),
+        InvoiceItemCreateRequest(**{**sample_invoice_item_data, "description": "Desayuno"})
+    ]
+    result = await service.create_many(sample_invoice.id, requests)
+    
+    assert result.total == 2
+    assert {item.description for item in result.items} == {"Habitación estándar", "Desayuno"}
+    
+    invoice = await InvoiceService(db_session).get_by_id(sample_invoice.id)
+    assert invoice.total_amount == initial_total + 2 * sample_invoice_item_data["total_amount"]
+    
+    with pytest.raises(ValueError, match="not found"):
+        await service.create_many(99999, requests)
+
+
+@pytest.mark.unit
+def test_calculate_totals_rounds_to_cents(db_session: AsyncSession):
+    """Test computed amounts are rounded to cents like the NUMERIC(19, 2) columns."""
+    service = InvoiceItemService(db_session)
+    
+    subtotal, tax_amount, total_amount = service._calculate_totals(
+        Decimal("3"), Decimal("33.333"), None, Decimal("19"), None, None
+    )
+    
+    assert subtotal == Decimal("100.00")
+    assert tax_amount == Decimal("19.00")
+    assert total_amount == Decimal("119.00")
+    assert total_amount.as_tuple().exponent == -2
+
+
+@pytest.mark.unit
+async def test_item_check_constraints(db_session: AsyncSession, sample_invoice):
+    """Test the database rejects out-of-range quantity/tax_rate written around the service."""
+    from sqlalchemy.exc import IntegrityError
+    from app.models.invoice_item import InvoiceItem
+    
+    invoice_id = sample_invoice.id  # the rollback expires the fixture
+    for values in ({"quantity": Decimal("-1")}, {"tax_rate": Decimal("101")}):
+        db_session.add(InvoiceItem(
+            invoice_id=invoice_id, description="Inválido", total_amount=Decimal("1"), **values
+        ))
+        with pytest.raises(IntegrityError):
+            await db_session.flush()
+        await db_session.rollback()
+
+
+@pytest.mark.unit
+async def test_create_item_invoice_not_found(db_session: AsyncSession, sample_invoice_item_data):
+    """Test creating an item for a missing invoice raises and inserts nothing."""
+    service = InvoiceItemService(db_session)
+    
+    request = InvoiceItemCreateRequest(**sample_invoice_item_data)
+    with pytest.raises(ValueError, match="not found"):
+        await service.create(99999, request)
+    
+    assert await service.get_by_id(1) is None
+
+
+@pytest.mark.unit
+async def test_create_item_check_violation(db_session: AsyncSession, sample_invoice, sample_invoice_item_data):
+    """Test a CHECK constraint violation is reported as invalid values, not a missing invoice."""
+    from app.services.invoice_item_service import InvoiceItemCheckError
+    
+    service = InvoiceItemService(db_session)
+    invoice_id = sample_invoice.id
+    
+    # model_construct skips the request's ge=0 validation, so only the CHECK rejects it
+    request = InvoiceItemCreateRequest.model_construct(**{**sample_invoice_item_data, "quantity": Decimal("-1")})
+    with pytest.raises(InvoiceItemCheckError):
+        await service.create(invoice_id, request)
+    with pytest.raises(InvoiceItemCheckError):
+        await service.create_many(invoice_id, [request])
+    
+    assert (await service.get_by_invoice_id(invoice_id)).total == 0
+
+
+@pytest.mark.unit
+async def test_get_items_by_invoice_id_empty_vs_missing(db_session: AsyncSession, sample_invoice):
+    """Test an invoice without items lists nothing, a missing invoice raises."""
+    service = InvoiceItemService(db_session)
+    
+    result = await service.get_by_invoice_id(sample_invoice.id)
+    assert result.total == 0
+    assert result.items == []
+    
+    with pytest.raises(ValueError, match="not found"):
+        await service.get_by_invoice_id(99999)
+
+
+@pytest.mark.unit
+async def test_get_items_by_invoice_id(db_session: AsyncSession, sample_invoice, sample_invoice_item):
+    """Test getting items by invoice ID."""
+    service = InvoiceItemService(db_session)
+    
+    result = await service.get_by_invoice_id(sample_invoice.id)
+    
+    assert result.total >= 1
+    assert len(result.items) >= 1
+    assert result.invoice_id == sample_invoice.id
+
+
+@pytest.mark.unit
+async def test_get_items_by_invoice_id_matches_orm_response(db_session: AsyncSession, sample_invoice, sample_invoice_item):
+    """Test the column-only listing serializes like a response validated from the ORM row."""
+    service = InvoiceItemService(db_session)
+    
+    result = await service.get_by_invoice_id(sample_invoice.id)
+    
+    expected = InvoiceItemResponse.model_validate(sample_invoice_item)
+    assert result.items[0].model_dump_json() == expected.model_dump_json()
+
+
+@pytest.mark.unit
+async def test_update_invoice_item(db_session: AsyncSession, sample_invoice_item):
+    """Test updating an invoice item."""
+    service = InvoiceItemService(db_session)
+    
+    update_request = InvoiceItemUpdateRequest(quantity=Decimal("3"))
+    result = await service.update(sample_invoice_item.id, update_request)
+    
+    assert result is not None
+    assert result.quantity == Decimal("3")
+
+
+@pytest.mark.unit
+async def test_delete_invoice_item(db_session: AsyncSession, sample_invoice_item):
+    """Test deleting an invoice item."""
+    service = InvoiceItemService(db_session)
+    
+    deleted = await service.delete(sample_invoice_item.id)
+    
+    assert deleted is True
+    
+    # Verify it's deleted
+    result = await service.get_by_id(sample_invoice_item.id)
+    assert result is None
+
+
+@pytest.mark.unit
+async def test_delete_many_items(db_session: AsyncSession, sample_invoice, sample_invoice_item_data):
+    """Test deleting several items at once subtracts them from the invoice total."""
+    service = InvoiceItemService(db_session)
+    from app.services.invoice_service import InvoiceService
+    initial_total = sample_invoice.total_amount
+    
+    requests = [
+        InvoiceItemCreateRequest(**sample_invoice_item_data),
+        InvoiceItemCreateRequest(**{**sample_invoice_item_data, "description": "Desayuno"}),
+        InvoiceItemCreateRequest(**{**sample_invoice_item_data, "description": "Cena"})
+    ]
+    created = await service.create_many(sample_invoice.id, requests)
+    ids = [item.id for item in created.items]
+    
+    deleted = await service.delete_many([ids[0], ids[1], 99999])
+    
+    assert deleted == 2
+    remaining = await service.get_by_invoice_id(sample_invoice.id)
+    assert [item.id for item in remaining.items] == [ids[2]]
+    
+    invoice = await InvoiceService(db_session).get_by_id(sample_invoice.id)
+    assert invoice.total_amount == initial_total + sample_invoice_item_data["total_amount"]
+    
+    assert await service.delete_many([99999]) == 0
+
+
+@pytest.mark.unit
+async def test_update_item_adjusts_invoice_total(db_session: AsyncSession, sample_invoice, sample_invoice_item):
+    """Test an item update adds only the change of its total to the invoice total."""
+    service = InvoiceItemService(db_session)
+    from app.services.invoice_service import InvoiceService
+    
+    invoice_service = InvoiceService(db_session)
+    initial_total = (await invoice_service.get_by_id(sample_invoice.id)).total_amount
+    old_item_total = sample_invoice_item.total_amount
+    
+    await service.update(sample_invoice_item.id, InvoiceItemUpdateRequest(total_amount=Decimal("400000.00")))
+    
+    updated_invoice = await invoice_service.get_by_id(sample_invoice.id)
+    assert updated_invoice.total_amount == initial_total + Decimal("400000") - old_item_total
+
+
+@pytest.mark.unit
+async def test_item_writes_lock_the_row(db_session: AsyncSession, sample_invoice, sample_invoice_item, monkeypatch):
+    """Test update/delete read the item FOR UPDATE and a repeated delete subtracts once."""
+    from sqlalchemy.dialects import mysql
+    from app.services.invoice_service import InvoiceService
+    
+    service = InvoiceItemService(db_session)
+    invoice_service = InvoiceService(db_session)
+    invoice_id = sample_invoice.id
+    item_id = sample_invoice_item.id
+    initial_total = (await invoice_service.get_by_id(invoice_id)).total_amount
+    item_total = sample_invoice_item.total_amount
+    
+    statements = []
+    original = db_session.execute
+    
+    async def capture(statement, *args, **kwargs):
+        statements.append(str(statement.compile(dialect=mysql.dialect())))
+        return await original(statement, *args, **kwargs)
+    
+    monkeypatch.setattr(db_session, "execute", capture)
+    assert await service.delete(item_id) is True
+    assert await service.delete(item_id) is False
+    monkeypatch.undo()
+    
+    assert statements[0].endswith("FOR UPDATE")
+    invoice = await invoice_service.get_by_id(invoice_id)
+    assert invoice.total_amount == initial_total - item_total
+
+
+@pytest.mark.unit
+async def test_update_item_noop_skips_write(db_session: AsyncSession, sample_invoice_item, monkeypatch):
+    """Test an update that changes nothing returns the item without writing."""
+    service = InvoiceItemService(db_session)
+    
+    async def fail(self, invoice_id, delta):
+        raise AssertionError("no-op update must not update the invoice total")
+    
+    monkeypatch.setattr(InvoiceItemService, "_adjust_invoice_total", fail)
+    request = InvoiceItemUpdateRequest(
+        description=sample_invoice_item.description,
+        total_amount=Decimal("357000.00")
+    )
+    result = await service.update(sample_invoice_item.id, request)
+    
+    assert result.id == sample_invoice_item.id
+    assert result.total_amount == 357000
+    
+    result = await service.update(sample_invoice_item.id, InvoiceItemUpdateRequest())
+    assert result.id == sample_invoice_item.id
+
+
+@pytest.mark.unit
+async def test_delete_item_recalculates_invoice_total(db_session: AsyncSession, sample_invoice, sample_invoice_item):
+    """Test that deleting an item recalculates invoice total."""
+    service = InvoiceItemService(db_session)
+    from app.services.invoice_service import InvoiceService
+    
+    # Get initial total
+    invoice_service = InvoiceService(db_session)
+    initial_invoice = await invoice_service.get_by_id(sample_invoice.id)
+    initial_total = initial_invoice.total_amount
+    
+    # Delete item
+    await service.delete(sample_invoice_item.id)
+    
+    # Verify invoice total was updated
+    updated_invoice = await invoice_service.get_by_id(sample_invoice.id)
+    assert updated_invoice.total_amount == initial_total - sample_invoice_item.total_amount
+
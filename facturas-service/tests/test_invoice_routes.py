@@ -1,118 +1,319 @@
-"""
-Tests for invoice API endpoints.
-
-Tests:
-- HTTP endpoints
-- Request validation
-- Response formats
-- Error handling
-"""
-
-import pytest
-from datetime import datetime
-from decimal import Decimal
-
-
-@pytest.mark.integration
-def test_get_invoices(client):
-    """Test GET /api/v1/invoices endpoint."""
-    response = client.get("/api/v1/invoices")
-    
-    assert response.status_code == 200
-    data = response.json()
-    assert "invoices" in data
-    assert "total" in data
-    assert "page" in data
-    assert "limit" in data
-
-
-@pytest.mark.integration
-def test_create_invoice(client, sample_invoice_data):
-    """Test POST /api/v1/invoices endpoint."""
-    # Convert datetime to ISO format string
-    invoice_data = sample_invoice_data.copy()
-    invoice_data["issue_date"] = invoice_data["issue_date"].isoformat()
-    
-    response = client.post("/api/v1/invoices", json=invoice_data)
-    
-    assert response.status_code == 201
-    data = response.json()
-    assert data["invoice_number"] == invoice_data["invoice_number"]
-    assert "id" in data
-
-
-@pytest.mark.integration
-def test_get_invoice_by_id(client, sample_invoice):
-    """Test GET /api/v1/invoices/{id} endpoint."""
-    response = client.get(f"/api/v1/invoices/{sample_invoice.id}")
-    
-    assert response.status_code == 200
-    data = response.json()
-    assert data["id"] == sample_invoice.id
-    assert data["invoice_number"] == sample_invoice.invoice_number
-
-
-@pytest.mark.integration
-def test_update_invoice(client, sample_invoice):
-    """Test PUT /api/v1/invoices/{id} endpoint."""
-    update_data = {"paid": True}
-    
-    response = client.put(f"/api/v1/invoices/{sample_invoice.id}", json=update_data)
-    
-    assert response.status_code == 200
-    data = response.json()
-    assert data["paid"] is True
-
-
-@pytest.mark.integration
-def test_delete_invoice(client, sample_invoice):
-    """Test DELETE /api/v1/invoices/{id} endpoint."""
-    response = client.delete(f"/api/v1/invoices/{sample_invoice.id}")
-    
-    assert response.status_code == 204
-
-
-@pytest.mark.integration
-def test_create_invoice_with_items(client, sample_invoice_data):
-    """Test POST /api/v1/invoices/with-items endpoint."""
-    invoice_data = sample_invoice_data.copy()
-    invoice_data["issue_date"] = invoice_data["issue_date"].isoformat()
-    invoice_data["items"] = [
-        {
-            "description": "Habitación estándar",
-            "quantity": 2,
-            "unit_price": 150000.00,
-            "tax_rate": 19,
-            "total_amount": 357000.00
-        }
-    ]
-    
-    response = client.post("/api/v1/invoices/with-items", json=invoice_data)
-    
-    assert response.status_code == 201
-    data = response.json()
-    assert "id" in data
-    assert "items" in data
-    assert len(data["items"]) == 1
-
-
-@pytest.mark.integration
-def test_get_invoice_stats(client):
-    """Test GET /api/v1/invoices/stats endpoint."""
-    response = client.get("/api/v1/invoices/stats")
-    
-    assert response.status_code == 200
-    data = response.json()
-    assert "total" in data
-    assert "paid" in data
-    assert "unpaid" in data
-    assert "total_amount" in data
-
-
-@pytest.mark.integration
-def test_get_invoice_not_found(client):
-    """Test GET /api/v1/invoices/{id} with non-existent ID."""
-    response = client.get("/api/v1/invoices/99999")
-    
-    assert response.status_code == 404
-
+"""
+Tests for invoice API endpoints.
+
+Tests:
+- HTTP endpoints
+- Request validation
+- Response formats
+- Error handling
+"""
+
+import pytest
+from datetime import datetime
+from decimal import Decimal
+
+
+@pytest.mark.integration
+def test_get_invoices(client):
+    """Test GET /api/v1/invoices endpoint."""
+    response = client.get("/api/v1/invoices")
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert "invoices" in data
+    assert "total" in data
+    assert "page" in data
+    assert "limit" in data
+
+
+@pytest.mark.integration
+def test_get_invoices_query_filters(client, sample_invoice):
+    """Test GET /api/v1/invoices filters and validates query parameters."""
+    response = client.get("/api/v1/invoices", params={"paid": "false", "limit": 10, "provider_nit": sample_invoice.provider_nit})
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["limit"] == 10
+    assert data["total"] == 1
+    
+    assert client.get("/api/v1/invoices", params={"limit": 500}).status_code == 422
+
+
+@pytest.mark.integration
+def test_create_invoice(client, sample_invoice_data):
+    """Test POST /api/v1/invoices endpoint."""
+    # Convert datetime to ISO format string
+    invoice_data = sample_invoice_data.copy()
+    invoice_data["issue_date"] = invoice_data["issue_date"].isoformat()
+    invoice_data["total_amount"] = float(invoice_data["total_amount"])
+    
+    response = client.post("/api/v1/invoices", json=invoice_data)
+    
+    assert response.status_code == 201
+    data = response.json()
+    assert data["invoice_number"] == invoice_data["invoice_number"]
+    assert "id" in data
+
+
+@pytest.mark.integration
+def test_create_invoice_invalid_email(client, sample_invoice_data):
+    """Test POST /api/v1/invoices rejects a malformed client_email."""
+    invoice_data = sample_invoice_data.copy()
+    invoice_data["issue_date"] = invoice_data["issue_date"].isoformat()
+    invoice_data["total_amount"] = float(invoice_data["total_amount"])
+    invoice_data["client_email"] = "not-an-email"
+    
+    response = client.post("/api/v1/invoices", json=invoice_data)
+    
+    assert response.status_code == 422
+
+
+@pytest.mark.integration
+def test_get_invoice_by_id(client, sample_invoice):
+    """Test GET /api/v1/invoices/{id} endpoint."""
+    response = client.get(f"/api/v1/invoices/{sample_invoice.id}")
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["id"] == sample_invoice.id
+    assert data["invoice_number"] == sample_invoice.invoice_number
+
+
+@pytest.mark.integration
+def test_get_invoice_etag_not_modified(client, sample_invoice):
+    """Test GET /api/v1/invoices/{id} returns an ETag and 304 when it matches."""
+    response = client.get(f"/api/v1/invoices/{sample_invoice.id}")
+    etag = response.headers["etag"]
+    
+    cached = client.get(f"/api/v1/invoices/{sample_invoice.id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+    
+    # include_items changes the body, so it changes the ETag
+    without_items = client.get(
+        f"/api/v1/invoices/{sample_invoice.id}",
+        params={"include_items": "false"},
+        headers={"If-None-Match": etag}
+    )
+    assert without_items.status_code == 200
+    assert without_items.headers["etag"] != etag
+
+
+@pytest.mark.integration
+def test_update_invoice(client, sample_invoice):
+    """Test PUT /api/v1/invoices/{id} endpoint."""
+    update_data = {"paid": True}
+    
+    response = client.put(f"/api/v1/invoices/{sample_invoice.id}", json=update_data)
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["paid"] is True
+
+
+@pytest.mark.integration
+def test_delete_invoice(client, sample_invoice):
+    """Test DELETE /api/v1/invoices/{id} endpoint."""
+    response = client.delete(f"/api/v1/invoices/{sample_invoice.id}")
+    
+    assert response.status_code == 204
+
+
+@pytest.mark.integration
+def test_create_invoice_with_items(client, sample_invoice_data):
+    """Test POST /api/v1/invoices/with-items endpoint."""
+    invoice_data = sample_invoice_data.copy()
+    invoice_data["issue_date"] = invoice_data["issue_date"].isoformat()
+    # Total is calculated from the items
+    invoice_data.pop("total_amount")
+    invoice_data["items"] = [
+        {
+            "description": "Habitación estándar",
+            "quantity": 2,
+            "unit_price": 150000.00,
+            "tax_rate": 19,
+            "total_amount": 357000.00
+        }
+    ]
+    
+    response = client.post("/api/v1/invoices/with-items", json=invoice_data)
+    
+    assert response.status_code == 201
+    data = response.json()
+    assert "id" in data
+    assert "items" in data
+    assert len(data["items"]) == 1
+
+
+@pytest.mark.integration
+def test_create_invoice_with_items_idempotency_key(client, sample_invoice_data):
+    """Test a retried POST with the same Idempotency-Key replays the first response."""
+    import uuid
+    
+    invoice_data = sample_invoice_data.copy()
+    invoice_data["issue_date"] = invoice_data["issue_date"].isoformat()
+    invoice_data.pop("total_amount")
+    invoice_data["items"] = [
+        {
+            "description": "Habitación estándar",
+            "quantity": 2,
+            "unit_price": 150000.00,
+            "tax_rate": 19,
+            "total_amount": 357000.00
+        }
+    ]
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    
+    first = client.post("/api/v1/invoices/with-items", json=invoice_data, headers=headers)
+    retry = client.post("/api/v1/invoices/with-items", json=invoice_data, headers=headers)
+    
+    assert first.status_code == retry.status_code == 201
+    assert retry.content == first.content
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert client.get("/api/v1/invoices").json()["total"] == 1
+    
+    invoice_data["invoice_number"] = "FAC-OTHER"
+    conflict = client.post("/api/v1/invoices/with-items", json=invoice_data, headers=headers)
+    assert conflict.status_code == 422
+
+
+@pytest.mark.integration
+async def test_idempotency_key_concurrent_requests_run_once():
+    """Test a retry sent while the first request is running waits and replays it."""
+    import asyncio
+    import httpx
+    from fastapi import APIRouter, FastAPI, HTTPException
+    from app.routes.idempotency import IdempotentRoute
+    
+    calls = []
+    release = asyncio.Event()
+    router = APIRouter(route_class=IdempotentRoute)
+    
+    @router.post("/ops", status_code=201)
+    async def create_op(payload: dict):
+        calls.append(payload)
+        await release.wait()
+        if payload.get("fail"):
+            raise HTTPException(status_code=500, detail="boom")
+        return {"n": len(calls)}
+    
+    app = FastAPI()
+    app.include_router(router)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        async def post(key, payload):
+            return await http.post("/ops", json=payload, headers={"Idempotency-Key": key})
+        
+        first = asyncio.create_task(post("k1", {"a": 1}))
+        retry = asyncio.create_task(post("k1", {"a": 1}))
+        other_body = asyncio.create_task(post("k1", {"a": 2}))
+        await asyncio.sleep(0.05)
+        assert (await other_body).status_code == 422
+        release.set()
+        first, retry = await first, await retry
+        assert first.status_code == retry.status_code == 201
+        assert retry.content == first.content
+        assert retry.headers["idempotent-replayed"] == "true"
+        assert len(calls) == 1
+        
+        # A failed first request is not replayed: the waiter runs the handler itself
+        release.clear()
+        failing = asyncio.create_task(post("k2", {"fail": True}))
+        waiter = asyncio.create_task(post("k2", {"fail": True}))
+        await asyncio.sleep(0.05)
+        release.set()
+        assert (await failing).status_code == 500
+        assert (await waiter).status_code == 500
+        assert len(calls) == 3
+
+
+@pytest.mark.integration
+def test_get_invoice_stats(client):
+    """Test GET /api/v1/invoices/stats endpoint."""
+    response = client.get("/api/v1/invoices/stats")
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert "total" in data
+    assert "paid" in data
+    assert "unpaid" in data
+    assert "total_amount" in data
+
+
+@pytest.mark.integration
+def test_export_invoices_ndjson(client, sample_invoice_item):
+    """Test GET /api/v1/invoices/export streams one JSON invoice per line."""
+    import json
+    
+    response = client.get("/api/v1/invoices/export")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = response.content.splitlines()
+    assert len(lines) == 1
+    invoice = json.loads(lines[0])
+    assert invoice["id"] == sample_invoice_item.invoice_id
+    assert len(invoice["items"]) == 1
+
+
+@pytest.mark.integration
+def test_get_invoice_not_found(client):
+    """Test GET /api/v1/invoices/{id} with non-existent ID."""
+    response = client.get("/api/v1/invoices/99999")
+    
+    assert response.status_code == 404
+
+
+@pytest.mark.integration
+def test_create_invoice_duplicate_cufe_returns_400(client, sample_invoice_data):
+    """Test a service ValueError is mapped to 400 by the router."""
+    invoice_data = sample_invoice_data.copy()
+    invoice_data["issue_date"] = invoice_data["issue_date"].isoformat()
+    invoice_data["total_amount"] = float(invoice_data["total_amount"])
+    
+    assert client.post("/api/v1/invoices", json=invoice_data).status_code == 201
+    response = client.post("/api/v1/invoices", json=invoice_data)
+    
+    assert response.status_code == 400
+    assert "cufe" in response.json()["detail"]
+
+
+@pytest.mark.integration
+def test_unexpected_error_returns_500(client, monkeypatch):
+    """Test an unexpected service error is logged and mapped to a generic 500."""
+    from app.services.invoice_service import InvoiceService
+    
+    async def boom(self):
+        raise RuntimeError("boom")
+    
+    monkeypatch.setattr(InvoiceService, "get_stats", boom)
+    response = client.get("/api/v1/invoices/stats")
+    
+    assert response.status_code == 500
+    assert response.json()["detail"] == "Error interno del servidor"
+
+
+@pytest.mark.unit
+def test_idempotency_cache_ttl_and_lru(monkeypatch):
+    """Test stored responses expire after the TTL and the oldest key is evicted past maxsize."""
+    from types import SimpleNamespace
+    from fastapi import Response
+    from app.routes import idempotency
+    from app.routes.idempotency import IdempotencyCache
+    
+    now = [1000.0]
+    monkeypatch.setattr(idempotency, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    cache = IdempotencyCache(ttl=10, maxsize=2)
+    response = Response(content=b"{}", status_code=201, media_type="application/json")
+    
+    cache.set("a", b"h", response)
+    cache.set("b", b"h", response)
+    assert cache.get("a").status_code == 201  # "a" is now the most recent
+    cache.set("c", b"h", response)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    
+    now[0] += 10
+    assert cache.get("a") is None
+    assert cache.get("c") is None
@@ -1,138 +1,541 @@
-"""
-Tests for InvoiceService business logic.
-
-Tests:
-- CRUD operations
-- Business validations
-- Calculations
-- Statistics
-"""
-
-import pytest
-from datetime import datetime
-from decimal import Decimal
-from sqlalchemy.orm import Session
-from app.services.invoice_service import InvoiceService
-from app.models.invoice import InvoiceCreateRequest, InvoiceUpdateRequest, InvoiceCreateWithItemsRequest
-
-
-@pytest.mark.unit
-def test_create_invoice(db_session: Session, sample_invoice_data):
-    """Test creating an invoice."""
-    service = InvoiceService(db_session)
-    
-    request = InvoiceCreateRequest(**sample_invoice_data)
-    result = service.create(request)
-    
-    assert result.id is not None
-    assert result.invoice_number == sample_invoice_data["invoice_number"]
-    assert result.total_amount == sample_invoice_data["total_amount"]
-
-
-@pytest.mark.unit
-def test_create_invoice_with_items(db_session: Session, sample_invoice_data):
-    """Test creating an invoice with nested items."""
-    service = InvoiceService(db_session)
-    
-    # Create request with items
-    items_data = [
-        {
-            "description": "Habitación estándar",
-            "quantity": Decimal("2"),
-            "unit_price": Decimal("150000.00"),
-            "tax_rate": Decimal("19"),
-            "total_amount": Decimal("357000.00")
-        }
-    ]
-    
-    request_data = sample_invoice_data.copy()
-    request_data["items"] = items_data
-    request = InvoiceCreateWithItemsRequest(**request_data)
-    
-    result = service.create_with_items(request)
-    
-    assert result.id is not None
-    assert len(result.items) == 1
-    assert result.items[0].description == "Habitación estándar"
-
-
-@pytest.mark.unit
-def test_get_invoice_by_id(db_session: Session, sample_invoice):
-    """Test getting invoice by ID."""
-    service = InvoiceService(db_session)
-    
-    result = service.get_by_id(sample_invoice.id)
-    
-    assert result is not None
-    assert result.id == sample_invoice.id
-    assert result.invoice_number == sample_invoice.invoice_number
-
-
-@pytest.mark.unit
-def test_get_all_invoices(db_session: Session, sample_invoice):
-    """Test getting all invoices with pagination."""
-    service = InvoiceService(db_session)
-    
-    result = service.get_all(page=1, limit=10)
-    
-    assert result.total >= 1
-    assert len(result.invoices) >= 1
-    assert result.page == 1
-    assert result.limit == 10
-
-
-@pytest.mark.unit
-def test_update_invoice(db_session: Session, sample_invoice):
-    """Test updating an invoice."""
-    service = InvoiceService(db_session)
-    
-    update_request = InvoiceUpdateRequest(paid=True)
-    result = service.update(sample_invoice.id, update_request)
-    
-    assert result is not None
-    assert result.paid is True
-
-
-@pytest.mark.unit
-def test_delete_invoice(db_session: Session, sample_invoice):
-    """Test deleting an invoice."""
-    service = InvoiceService(db_session)
-    
-    deleted = service.delete(sample_invoice.id)
-    
-    assert deleted is True
-    
-    # Verify it's deleted
-    result = service.get_by_id(sample_invoice.id)
-    assert result is None
-
-
-@pytest.mark.unit
-def test_get_stats(db_session: Session, sample_invoice):
-    """Test getting invoice statistics."""
-    service = InvoiceService(db_session)
-    
-    stats = service.get_stats()
-    
-    assert stats.total >= 1
-    assert stats.paid >= 0
-    assert stats.unpaid >= 1
-    assert stats.total_amount >= Decimal("0")
-
-
-@pytest.mark.unit
-def test_validate_departure_date_after_arrival_date(db_session: Session, sample_invoice_data):
-    """Test validation: departure_date must be >= arrival_date."""
-    service = InvoiceService(db_session)
-    
-    from datetime import date
-    
-    request_data = sample_invoice_data.copy()
-    request_data["arrival_date"] = date(2025, 1, 20)
-    request_data["departure_date"] = date(2025, 1, 15)  # Before arrival
-    
-    request = InvoiceCreateRequest(**request_data)
-    
-    with pytest.raises(ValueError, match="departure_date must be >= arrival_date"):
-        service.create(request)
-
+"""
+Tests for InvoiceService business logic.
+
+Tests:
+- CRUD operations
+- Business validations
+- Calculations
+- Statistics
+"""
+
+import pytest
+from datetime import datetime, date
+from decimal import Decimal
+from sqlalchemy import event, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.invoice_service import InvoiceService
+from app.models.invoice_item import InvoiceItem
+from app.models.invoice import InvoiceCreateRequest, InvoiceUpdateRequest, InvoiceCreateWithItemsRequest, InvoiceResponse
+
+
+@pytest.mark.unit
+async def test_create_invoice(db_session: AsyncSession, sample_invoice_data):
+    """Test creating an invoice."""
+    service = InvoiceService(db_session)
+    
+    request = InvoiceCreateRequest(**sample_invoice_data)
+    result = await service.create(request)
+    
+    assert result.id is not None
+    assert result.invoice_number == sample_invoice_data["invoice_number"]
+    assert result.total_amount == sample_invoice_data["total_amount"]
+
+
+@pytest.mark.unit
+async def test_create_invoice_with_items(db_session: AsyncSession, sample_invoice_data):
+    """Test creating an invoice with nested items."""
+    service = InvoiceService(db_session)
+    
+    # Create request with items
+    items_data = [
+        {
+            "description": "Habitación estándar",
+            "quantity": Decimal("2"),
+            "unit_price": Decimal("150000.00"),
+            "tax_rate": Decimal("19"),
+            "total_amount": Decimal("357000.00")
+        }
+    ]
+    
+    request_data = sample_invoice_data.copy()
+    # Total is calculated from the items
+    request_data.pop("total_amount")
+    request_data["items"] = items_data
+    request = InvoiceCreateWithItemsRequest(**request_data)
+    
+    result = await service.create_with_items(request)
+    
+    assert result.id is not None
+    assert len(result.items) == 1
+    assert result.items[0].description == "Habitación estándar"
+
+
+@pytest.mark.unit
+async def test_get_invoice_by_id(db_session: AsyncSession, sample_invoice):
+    """Test getting invoice by ID."""
+    service = InvoiceService(db_session)
+    
+    result = await service.get_by_id(sample_invoice.id)
+    
+    assert result is not None
+    assert result.id == sample_invoice.id
+    assert result.invoice_number == sample_invoice.invoice_number
+
+
+@pytest.mark.unit
+async def test_get_by_id_matches_validated_response(db_session: AsyncSession, sample_invoice_data):
+    """Test the constructed (unvalidated) read response serializes like model_validate."""
+    service = InvoiceService(db_session)
+    invoice_data = {**sample_invoice_data, "total_amount": None}
+    created = await service.create_with_items(InvoiceCreateWithItemsRequest(
+        **invoice_data,
+        items=[{"description": "Noche", "quantity": 2, "unit_price": 100, "tax_rate": 19, "total_amount": 238}]
+    ))
+    
+    result = await service.get_by_id(created.id)
+    
+    assert result.model_dump_json() == InvoiceResponse.model_validate(result.model_dump()).model_dump_json()
+    assert len(result.items) == 1
+    
+    without_items = await service.get_by_id(created.id, include_items=False)
+    assert without_items.items is None
+
+
+@pytest.mark.unit
+async def test_get_by_id_statement_count(db_session: AsyncSession, sample_invoice_data):
+    """Test get_by_id loads items in one extra statement, and none without items."""
+    service = InvoiceService(db_session)
+    created = await service.create_with_items(InvoiceCreateWithItemsRequest(
+        **{**sample_invoice_data, "total_amount": None},
+        items=[{"description": f"Noche {i}", "total_amount": 100} for i in range(3)]
+    ))
+    
+    statements = []
+    
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    sync_engine = db_session.bind.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", count_statement)
+    try:
+        db_session.expunge_all()
+        with_items = await service.get_by_id(created.id)
+        with_items_statements = len(statements)
+        
+        db_session.expunge_all()
+        statements.clear()
+        without_items = await service.get_by_id(created.id, include_items=False)
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", count_statement)
+    
+    assert len(with_items.items) == 3
+    # Invoice + one SELECT ... IN for its items
+    assert with_items_statements == 2
+    assert without_items.items is None
+    assert len(statements) == 1
+
+
+@pytest.mark.unit
+async def test_create_with_items_statement_count(db_session: AsyncSession, sample_invoice_data):
+    """Test nested items go in one INSERT: the statement count doesn't grow with the items."""
+    service = InvoiceService(db_session)
+    
+    statements = []
+    
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    sync_engine = db_session.bind.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", count_statement)
+    try:
+        created = await service.create_with_items(InvoiceCreateWithItemsRequest(
+            **{**sample_invoice_data, "total_amount": None},
+            items=[{"description": f"Noche {i}", "total_amount": 100} for i in range(10)]
+        ))
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", count_statement)
+    
+    assert [item.description for item in created.items] == [f"Noche {i}" for i in range(10)]
+    assert all(item.id is not None for item in created.items)
+    # INSERT invoice + INSERT items + joined read-back (invoice and items)
+    assert len(statements) == 3
+
+
+@pytest.mark.unit
+async def test_get_all_invoices(db_session: AsyncSession, sample_invoice):
+    """Test getting all invoices with pagination."""
+    service = InvoiceService(db_session)
+    
+    result = await service.get_all(page=1, limit=10)
+    
+    assert result.total >= 1
+    assert len(result.invoices) >= 1
+    assert result.page == 1
+    assert result.limit == 10
+
+
+@pytest.mark.unit
+async def test_get_all_invoices_filters(db_session: AsyncSession, sample_invoice_data):
+    """Test each list filter narrows the page (and its total) to the matching invoices."""
+    service = InvoiceService(db_session)
+    
+    for i in range(3):
+        request_data = sample_invoice_data.copy()
+        request_data["invoice_number"] = f"FAC-FIL-{i}"
+        request_data["cufe"] = f"CUFE-FIL-{i}"
+        request_data["provider_nit"] = f"900-{i}"
+        request_data["client_nit"] = f"800-{i}"
+        request_data["reservation_number"] = f"RES-{i}"
+        request_data["issue_date"] = datetime(2025, 2, 1 + i)
+        request_data["loaded_in_liquidation"] = i == 0
+        await service.create(InvoiceCreateRequest(**request_data))
+    
+    async def numbers(**filters):
+        result = await service.get_all(limit=10, **filters)
+        assert result.total == len(result.invoices)
+        return sorted(invoice.invoice_number for invoice in result.invoices)
+    
+    assert await numbers(loaded_in_liquidation=True) == ["FAC-FIL-0"]
+    assert await numbers(provider_nit="900-1") == ["FAC-FIL-1"]
+    assert await numbers(client_nit="800-2") == ["FAC-FIL-2"]
+    assert await numbers(reservation_number="RES-1") == ["FAC-FIL-1"]
+    assert await numbers(issue_date_from=datetime(2025, 2, 2), issue_date_to=datetime(2025, 2, 2, 23)) == ["FAC-FIL-1"]
+    assert await numbers(search="FIL-2") == ["FAC-FIL-2"]
+    assert await numbers(search="CUFE-FIL") == ["FAC-FIL-0", "FAC-FIL-1", "FAC-FIL-2"]
+
+
+@pytest.mark.unit
+async def test_get_all_invoices_loads_items_without_n_plus_one(db_session: AsyncSession, sample_invoice_data):
+    """Test that listing N invoices with items issues a constant number of queries."""
+    service = InvoiceService(db_session)
+    
+    for i in range(3):
+        request_data = sample_invoice_data.copy()
+        request_data.pop("total_amount")
+        request_data["invoice_number"] = f"FAC-N1-{i}"
+        request_data["cufe"] = f"CUFE-N1-{i}"
+        request_data["items"] = [
+            {"description": "Habitación", "quantity": Decimal("1"), "unit_price": Decimal("100.00"), "total_amount": Decimal("100.00")}
+        ]
+        await service.create_with_items(InvoiceCreateWithItemsRequest(**request_data))
+    db_session.expunge_all()
+    
+    statements = []
+    
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    sync_engine = db_session.bind.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", count_statement)
+    try:
+        result = await service.get_all(page=1, limit=10)
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", count_statement)
+    
+    assert len(result.invoices) == 3
+    assert all(len(inv.items) == 1 for inv in result.invoices)
+    # COUNT + invoices page + one SELECT ... IN for all items
+    assert len(statements) == 3
+
+
+@pytest.mark.unit
+async def test_get_all_cursor_pagination(db_session: AsyncSession, sample_invoice_data):
+    """Test walking the list with next_cursor returns every invoice once, in order."""
+    service = InvoiceService(db_session)
+    
+    # Two invoices share each issue_date: id must break the tie
+    for i in range(5):
+        request_data = sample_invoice_data.copy()
+        request_data["invoice_number"] = f"FAC-CUR-{i}"
+        request_data["cufe"] = f"CUFE-CUR-{i}"
+        request_data["issue_date"] = datetime(2025, 1, 10 + i // 2)
+        await service.create(InvoiceCreateRequest(**request_data))
+    
+    first = await service.get_all(page=1, limit=2)
+    seen = [invoice.invoice_number for invoice in first.invoices]
+    cursor = first.next_cursor
+    while cursor:
+        result = await service.get_all(limit=2, cursor=cursor)
+        seen += [invoice.invoice_number for invoice in result.invoices]
+        cursor = result.next_cursor
+    
+    assert seen == [f"FAC-CUR-{i}" for i in (4, 3, 2, 1, 0)]
+    
+    # Same rows as the OFFSET pages
+    offset_page = await service.get_all(page=2, limit=2)
+    cursor_page = await service.get_all(limit=2, cursor=first.next_cursor)
+    assert [i.id for i in offset_page.invoices] == [i.id for i in cursor_page.invoices]
+    
+    # Cursor pages skip the COUNT unless asked for
+    assert cursor_page.total is None and cursor_page.pages is None
+    assert first.page == 1 and cursor_page.page is None
+    counted = await service.get_all(limit=2, cursor=first.next_cursor, include_total=True)
+    assert (counted.total, counted.pages) == (5, 3)
+    assert (await service.get_all(page=1, limit=2, include_total=False)).total is None
+    
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        await service.get_all(cursor="not-a-cursor")
+
+
+@pytest.mark.unit
+def test_search_condition_mysql():
+    """Test the MySQL search uses the FULLTEXT index, prefix LIKE for short terms, and always a cufe prefix."""
+    from types import SimpleNamespace
+    from sqlalchemy.dialects import mysql
+    
+    session = SimpleNamespace(bind=SimpleNamespace(dialect=mysql.dialect()))
+    service = InvoiceService(session)
+    
+    def sql(search):
+        return str(service._search_condition(search).compile(dialect=mysql.dialect()))
+    
+    assert sql("Hotel +(Ejemplo)") == (
+        "MATCH (invoices.invoice_number, invoices.provider_name, invoices.client_name) "
+        "AGAINST (%s IN BOOLEAN MODE) OR invoices.cufe LIKE %s"
+    )
+    match, cufe = service._search_condition("Hotel +(Ejemplo)").clauses
+    assert match.right.value == "+Hotel* +Ejemplo*"
+    assert cufe.right.value == "Hotel +(Ejemplo)%"
+    assert sql("CUFE-abc").endswith("OR invoices.cufe LIKE %s")
+    assert sql("a" * 96) == "invoices.cufe LIKE %s"
+    assert sql("F1") == "invoices.invoice_number LIKE %s OR invoices.cufe LIKE %s"
+
+
+@pytest.mark.unit
+def test_updated_at_keeps_microseconds_on_mysql():
+    """Test updated_at (the ETag source) is DATETIME(6) and written with NOW(6) on MySQL."""
+    from sqlalchemy import update
+    from sqlalchemy.dialects import mysql
+    from sqlalchemy.schema import CreateTable
+    from app.models.invoice import Invoice, INVOICE_UPDATED_AT_NOW
+    
+    ddl = str(CreateTable(Invoice.__table__).compile(dialect=mysql.dialect()))
+    column = next(line for line in ddl.splitlines() if "updated_at" in line)
+    assert "DATETIME(6)" in column and "DEFAULT now(6)" in column
+    
+    stmt = update(Invoice).values(updated_at=INVOICE_UPDATED_AT_NOW)
+    assert "updated_at=now(6)" in str(stmt.compile(dialect=mysql.dialect()))
+
+
+@pytest.mark.unit
+async def test_iter_invoices_streams_all_rows(db_session: AsyncSession, sample_invoice_data):
+    """Test streaming invoices in batches for exports."""
+    service = InvoiceService(db_session)
+    
+    for i in range(5):
+        request_data = sample_invoice_data.copy()
+        request_data["invoice_number"] = f"FAC-EXP-{i}"
+        request_data["cufe"] = f"CUFE-EXP-{i}"
+        await service.create(InvoiceCreateRequest(**request_data))
+    
+    numbers = [invoice.invoice_number async for invoice in service.iter_invoices(batch_size=2)]
+    
+    assert sorted(numbers) == [f"FAC-EXP-{i}" for i in range(5)]
+
+
+@pytest.mark.unit
+async def test_iter_invoices_pages_with_items(db_session: AsyncSession, sample_invoice_data):
+    """Test an export spanning several batches keeps the order and each batch's items."""
+    service = InvoiceService(db_session)
+    
+    # Same issue_date on some rows: the keyset continues on id
+    for i in range(5):
+        await service.create_with_items(InvoiceCreateWithItemsRequest(
+            **{
+                **sample_invoice_data,
+                "invoice_number": f"FAC-PAGE-{i}",
+                "cufe": f"CUFE-PAGE-{i}",
+                "issue_date": datetime(2024, 1, 1 + i // 2),
+                "total_amount": None
+            },
+            items=[{"description": f"Noche {i}", "total_amount": 100}]
+        ))
+    db_session.expunge_all()
+    
+    statements = []
+    
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    sync_engine = db_session.bind.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", count_statement)
+    try:
+        exported = [invoice async for invoice in service.iter_invoices(batch_size=2)]
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", count_statement)
+    
+    assert [invoice.invoice_number for invoice in exported] == [f"FAC-PAGE-{i}" for i in range(5)]
+    assert [[item.description for item in invoice.items] for invoice in exported] == [
+        [f"Noche {i}"] for i in range(5)
+    ]
+    # 3 pages (2 + 2 + 1 invoices), each with its items query
+    assert len(statements) == 6
+
+
+@pytest.mark.unit
+async def test_update_invoice(db_session: AsyncSession, sample_invoice):
+    """Test updating an invoice."""
+    service = InvoiceService(db_session)
+    
+    update_request = InvoiceUpdateRequest(paid=True)
+    result = await service.update(sample_invoice.id, update_request)
+    
+    assert result is not None
+    assert result.paid is True
+
+
+@pytest.mark.unit
+async def test_delete_invoice(db_session: AsyncSession, sample_invoice):
+    """Test deleting an invoice."""
+    service = InvoiceService(db_session)
+    
+    deleted = await service.delete(sample_invoice.id)
+    
+    assert deleted is True
+    
+    # Verify it's deleted
+    result = await service.get_by_id(sample_invoice.id)
+    assert result is None
+
+
+@pytest.mark.unit
+async def test_delete_invoice_cascades_items(db_session: AsyncSession, sample_invoice_item):
+    """Test delete is a single DELETE and the items go by ON DELETE CASCADE."""
+    service = InvoiceService(db_session)
+    invoice_id = sample_invoice_item.invoice_id
+    
+    statements = []
+    
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    sync_engine = db_session.bind.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", count_statement)
+    try:
+        deleted = await service.delete(invoice_id)
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", count_statement)
+    
+    assert deleted is True
+    assert len(statements) == 1
+    remaining = await db_session.scalar(
+        select(func.count()).select_from(InvoiceItem).where(InvoiceItem.invoice_id == invoice_id)
+    )
+    assert remaining == 0
+    assert await service.delete(invoice_id) is False
+
+
+@pytest.mark.unit
+async def test_update_invoice_checks_stored_dates(db_session: AsyncSession, sample_invoice):
+    """Test a single date is validated against the stored one, and a missing invoice is None."""
+    service = InvoiceService(db_session)
+    invoice_id = sample_invoice.id  # the rejected update rolls back and expires the fixture
+    
+    await service.update(invoice_id, InvoiceUpdateRequest(arrival_date=date(2024, 3, 10)))
+    with pytest.raises(ValueError):
+        await service.update(invoice_id, InvoiceUpdateRequest(departure_date=date(2024, 3, 5)))
+    
+    result = await service.update(invoice_id, InvoiceUpdateRequest(departure_date=date(2024, 3, 12)))
+    assert result.arrival_date == date(2024, 3, 10)
+    assert result.departure_date == date(2024, 3, 12)
+    assert await service.update(999999, InvoiceUpdateRequest(paid=True)) is None
+
+
+@pytest.mark.unit
+async def test_get_stats(db_session: AsyncSession, sample_invoice):
+    """Test getting invoice statistics."""
+    service = InvoiceService(db_session)
+    
+    stats = await service.get_stats()
+    
+    assert stats.total >= 1
+    assert stats.paid >= 0
+    assert stats.unpaid >= 1
+    assert stats.total_amount >= Decimal("0")
+
+
+@pytest.mark.unit
+async def test_get_stats_single_query(db_session: AsyncSession, sample_invoice_data):
+    """Test statistics figures computed in a single aggregated query."""
+    service = InvoiceService(db_session)
+    
+    for i, (paid, loaded, amount) in enumerate([
+        (True, True, Decimal("100.00")),
+        (False, False, Decimal("250.00")),
+        (False, True, Decimal("50.00")),
+    ]):
+        request_data = sample_invoice_data.copy()
+        request_data.update(
+            invoice_number=f"FAC-ST-{i}", cufe=f"CUFE-ST-{i}",
+            paid=paid, loaded_in_liquidation=loaded, total_amount=amount
+        )
+        await service.create(InvoiceCreateRequest(**request_data))
+    
+    statements = []
+    
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    sync_engine = db_session.bind.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", count_statement)
+    try:
+        stats = await service.get_stats()
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", count_statement)
+    
+    assert len(statements) == 1
+    assert (stats.total, stats.paid, stats.unpaid, stats.loaded_in_liquidation) == (3, 1, 2, 2)
+    assert stats.total_amount == Decimal("400.00")
+    assert stats.paid_amount == Decimal("100.00")
+    assert stats.unpaid_amount == Decimal("300.00")
+
+
+@pytest.mark.unit
+async def test_validate_departure_date_after_arrival_date(db_session: AsyncSession, sample_invoice_data):
+    """Test validation: departure_date must be >= arrival_date."""
+    service = InvoiceService(db_session)
+    
+    from datetime import date
+    
+    request_data = sample_invoice_data.copy()
+    request_data["arrival_date"] = date(2025, 1, 20)
+    request_data["departure_date"] = date(2025, 1, 15)  # Before arrival
+    
+    request = InvoiceCreateRequest(**request_data)
+    
+    with pytest.raises(ValueError, match="departure_date must be >= arrival_date"):
+        await service.create(request)
+
+
+
+@pytest.mark.unit
+async def test_create_invoice_duplicate_cufe(db_session: AsyncSession, sample_invoice, sample_invoice_data):
+    """Test validation: cufe is unique."""
+    service = InvoiceService(db_session)
+    
+    request_data = sample_invoice_data.copy()
+    request_data["invoice_number"] = "FAC-TEST-002"
+    
+    with pytest.raises(ValueError, match="cufe already exists"):
+        await service.create(InvoiceCreateRequest(**request_data))
+
+
+@pytest.mark.unit
+async def test_update_invoice_null_is_not_a_duplicate_cufe(db_session: AsyncSession, sample_invoice):
+    """Test an explicit null for a NOT NULL column is rejected, never reported as a duplicate cufe."""
+    from pydantic import ValidationError
+    from sqlalchemy.exc import IntegrityError
+    
+    for field in ("paid", "invoice_number"):
+        with pytest.raises(ValidationError):
+            InvoiceUpdateRequest(**{field: None})
+    
+    # Bypassing validation, the NOT NULL violation surfaces as itself
+    service = InvoiceService(db_session)
+    with pytest.raises(IntegrityError):
+        await service.update(sample_invoice.id, InvoiceUpdateRequest.model_construct(paid=None))
+
+
+@pytest.mark.unit
+def test_is_duplicate_cufe():
+    """Test only duplicates on idx_invoice_cufe are taken as a repeated cufe."""
+    from types import SimpleNamespace
+    from sqlalchemy.exc import IntegrityError
+    from app.services.invoice_service import _is_duplicate_cufe
+    
+    def error(*args):
+        return IntegrityError("INSERT", {}, SimpleNamespace(args=args))
+    
+    assert _is_duplicate_cufe(error(1062, "Duplicate entry 'X' for key 'invoices.idx_invoice_cufe'"))
+    assert not _is_duplicate_cufe(error(1062, "Duplicate entry '1' for key 'invoices.PRIMARY'"))
+    assert not _is_duplicate_cufe(error(1048, "Column 'paid' cannot be null"))